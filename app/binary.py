@@ -0,0 +1,299 @@
+"""
+Binary fee protocol over TCP, for internal callers that do not need JSON and HTTP.
+
+A client opens a connection and sends the 4 byte preface PREFACE, followed by any number of fixed size request frames.
+The server sends one response frame for each request frame, in the same order. A unary call sends one request and
+waits for its response. A streaming call keeps sending requests while the responses stream back, without waiting for
+them. All integers are little-endian.
+
+Request frame (40 bytes):
+    uint32  request ID, returned in the response
+    int64   cart value in cents
+    int64   delivery distance in meters
+    int64   number of items
+    int64   order time in microseconds since 1970-01-01T00:00:00Z
+    int32   UTC offset of the order time in seconds, rush hours are checked against the wall-clock time at this offset
+
+Response frame (16 bytes):
+    uint32  request ID
+    uint32  status, STATUS_OK or STATUS_INVALID_ORDER (a value is not positive or the time is out of range)
+    int64   delivery fee in cents, 0 if the order is invalid
+
+Fees are calculated with the same fee schedule and quote cache as the fee calculation endpoint.
+"""
+import asyncio
+import struct
+from collections import deque
+from contextlib import suppress
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import AsyncIterator, Deque, Iterable, List, Optional, Tuple
+
+from app import metrics
+from app.schedule import get_fee_schedule
+from app.tables import price
+
+PREFACE: bytes = b"WFC2"
+"""
+First bytes sent by the client on a new connection, the server closes connections that do not start with it.
+"""
+
+STATUS_OK: int = 0
+STATUS_INVALID_ORDER: int = 1
+
+REQUEST = struct.Struct("<Iqqqqi")
+RESPONSE = struct.Struct("<IIq")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+_SECOND = timedelta(seconds=1)
+_MAX_VALUE = 2 ** 63 - 1
+
+STREAM_CHUNK: int = 256
+"""
+Number of orders sent with one write in a streaming call.
+"""
+
+STREAM_CHUNKS_IN_FLIGHT: int = 4
+"""
+Number of chunks a streaming call sends before reading the responses of the first one.
+"""
+
+_READ_SIZE = 64 * 1_024
+
+
+class InvalidOrderError(ValueError):
+    """
+    The server rejected the order, a value was not positive or the time was out of range.
+    """
+
+
+def encode_time(order_time: datetime) -> Tuple[int, int]:
+    """
+    :return: Order time in microseconds since the epoch and its UTC offset in seconds, naive times are in UTC
+    """
+    if order_time.tzinfo is None:
+        order_time = order_time.replace(tzinfo=timezone.utc)
+    return (order_time - _EPOCH) // _MICROSECOND, order_time.utcoffset() // _SECOND
+
+
+@lru_cache(maxsize=128)
+def _local_epoch(offset: int) -> datetime:
+    """
+    Raises ValueError if the offset is not less than a day.
+
+    :return: The epoch as an aware datetime in the timezone of the UTC offset in seconds
+    """
+    return _EPOCH.astimezone(timezone(timedelta(seconds=offset)))
+
+
+def decode_time(microseconds: int, offset: int) -> datetime:
+    """
+    Raises ValueError or OverflowError if the time or the offset is out of range.
+
+    :return: Order time with the wall-clock time and timezone it was sent with
+    """
+    return _local_epoch(offset) + timedelta(microseconds=microseconds)
+
+
+def encode_request(request_id: int, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> bytes:
+    """
+    Values too large for the frame are sent as the largest value, which has the same fee.
+
+    :return: Request frame
+    """
+    return REQUEST.pack(
+        request_id,
+        min(cart_value, _MAX_VALUE),
+        min(delivery_distance, _MAX_VALUE),
+        min(number_of_items, _MAX_VALUE),
+        *encode_time(order_time),
+    )
+
+
+def calculate_responses(requests: memoryview) -> bytearray:
+    """
+    Calculates the fees of request frames.
+
+    :return: Response frames, one for each request frame
+    """
+    schedule = get_fee_schedule()
+    responses = bytearray()
+    for request_id, cart_value, delivery_distance, number_of_items, microseconds, offset in REQUEST.iter_unpack(requests):
+        try:
+            if cart_value <= 0 or delivery_distance <= 0 or number_of_items <= 0:
+                raise ValueError
+            order_time = decode_time(microseconds, offset)
+        except (ValueError, OverflowError):
+            responses += RESPONSE.pack(request_id, STATUS_INVALID_ORDER, 0)
+            if metrics.enabled:
+                metrics.validation_failures.inc()
+            continue
+
+        fee = price(schedule, cart_value, delivery_distance, number_of_items, order_time)
+        responses += RESPONSE.pack(request_id, STATUS_OK, fee)
+        if metrics.enabled:
+            metrics.observe_fee(schedule, cart_value, delivery_distance, number_of_items, order_time, fee)
+
+    return responses
+
+
+class FeeProtocol(asyncio.Protocol):
+    """
+    Server side of a binary fee protocol connection. All complete request frames of a read are calculated together
+    and their responses are written with one write.
+    """
+
+    def __init__(self):
+        self.transport: Optional[asyncio.Transport] = None
+        self.buffer = bytearray()
+        self.started = False
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self.buffer += data
+        if not self.started:
+            if len(self.buffer) < len(PREFACE):
+                return
+            if self.buffer[:len(PREFACE)] != PREFACE:
+                self.transport.close()
+                return
+            del self.buffer[:len(PREFACE)]
+            self.started = True
+
+        size = len(self.buffer) - len(self.buffer) % REQUEST.size
+        if size:
+            with memoryview(self.buffer) as buffer:
+                responses = calculate_responses(buffer[:size])
+            del self.buffer[:size]
+            self.transport.write(responses)
+
+    def pause_writing(self):
+        # Stop reading requests from clients that do not read their responses.
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.transport.resume_reading()
+
+
+async def start_server(host: str, port: int) -> asyncio.AbstractServer:
+    """
+    Starts serving the binary fee protocol. Every worker process can listen on the same port.
+
+    :return: Listening server
+    """
+    return await asyncio.get_running_loop().create_server(FeeProtocol, host, port, reuse_port=True)
+
+
+class FeeClient:
+    """
+    Client of the binary fee protocol. Calls can be made concurrently on the same connection.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        # Number of requests and the future of each call in flight, in the order they were sent.
+        self._pending: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._next_id = 0
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect(cls, host: str, port: int) -> "FeeClient":
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(PREFACE)
+        return cls(reader, writer)
+
+    async def close(self):
+        self._receiver.cancel()
+        with suppress(asyncio.CancelledError):
+            await self._receiver
+        self._writer.close()
+        with suppress(ConnectionError):
+            await self._writer.wait_closed()
+
+    async def _receive(self):
+        buffer = bytearray()
+        responses: List[Tuple[int, int]] = []
+        try:
+            while True:
+                data = await self._reader.read(_READ_SIZE)
+                if not data:
+                    raise ConnectionError("connection closed by the server")
+                buffer += data
+                size = len(buffer) - len(buffer) % RESPONSE.size
+                for _, status, fee in RESPONSE.iter_unpack(buffer[:size]):
+                    responses.append((status, fee))
+                    count, future = self._pending[0]
+                    if len(responses) < count:
+                        continue
+                    self._pending.popleft()
+                    if not future.done():
+                        future.set_result(responses)
+                    responses = []
+                del buffer[:size]
+        except asyncio.CancelledError:
+            self._fail_pending(ConnectionError("Fee client was closed"))
+            raise
+        except ConnectionError as e:
+            self._fail_pending(ConnectionError(f"Connection to the fee server was closed: {e}"))
+
+    def _fail_pending(self, error: Exception):
+        while self._pending:
+            _, future = self._pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+    def _send(self, orders: List[Tuple[int, int, int, datetime]]) -> asyncio.Future:
+        """
+        Sends the orders with one write.
+
+        :return: Future of the status and fee of each order
+        """
+        if self._receiver.done():
+            raise ConnectionError("Connection to the fee server was closed")
+        frames = []
+        for order in orders:
+            frames.append(encode_request(self._next_id, *order))
+            self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+        self._writer.write(b"".join(frames))
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((len(frames), future))
+        return future
+
+    async def calculate(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> int:
+        """
+        Unary call.
+
+        :return: Total fee for the delivery, in cents
+        """
+        [(status, fee)] = await self._send([(cart_value, delivery_distance, number_of_items, order_time)])
+        if status != STATUS_OK:
+            raise InvalidOrderError("Invalid order")
+        return fee
+
+    async def stream(self, orders: Iterable[Tuple[int, int, int, datetime]]) -> AsyncIterator[int]:
+        """
+        Streaming call: sends the orders (cart value, delivery distance, number of items and order time) in chunks of
+        STREAM_CHUNK orders, with up to STREAM_CHUNKS_IN_FLIGHT chunks sent before their responses are read, and
+        yields the fees in order. Stops with InvalidOrderError at the first invalid order.
+        """
+        in_flight: Deque[asyncio.Future] = deque()
+        orders = iter(orders)
+        while True:
+            while len(in_flight) < STREAM_CHUNKS_IN_FLIGHT:
+                chunk = list(islice(orders, STREAM_CHUNK))
+                if not chunk:
+                    break
+                in_flight.append(self._send(chunk))
+                await self._writer.drain()
+            if not in_flight:
+                return
+
+            for status, fee in await in_flight.popleft():
+                if status != STATUS_OK:
+                    raise InvalidOrderError("Invalid order")
+                yield fee
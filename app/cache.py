@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from app import constants
+from app.schedule import FeeSchedule
+
+
+class QuoteCache:
+    """
+    Bounded LRU cache for fee quotes. Quotes are keyed with FeeSchedule.quote_key, so orders that differ only in
+    values that do not affect the fee (e.g. the exact order time outside rush hours) share the same cache entry.
+
+    Cached quotes expire after the TTL, and the whole cache is cleared when it is used with a different fee schedule
+    than the one the quotes were calculated with.
+    """
+
+    def __init__(self, maxsize: int = constants.QUOTE_CACHE_SIZE, ttl: float = constants.QUOTE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._schedule: Optional[FeeSchedule] = None
+        self._quotes: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    def clear(self):
+        """
+        Removes all cached quotes and resets the hit and miss counters.
+        """
+        with self._lock:
+            self._quotes.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        """
+        :return: Cache hits, misses, maximum size and current size
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "maxsize": self.maxsize,
+            "currsize": len(self._quotes),
+        }
+
+    def calculate(
+        self,
+        schedule: FeeSchedule,
+        cart_value: int,
+        delivery_distance: int,
+        number_of_items: int,
+        order_time: datetime,
+    ) -> int:
+        """
+        Returns the cached fee for the order, or calculates it with the schedule and caches it.
+
+        :return: Total fee for the delivery, in cents
+        """
+        if self.maxsize <= 0 or cart_value >= schedule.free_delivery_threshold:
+            return schedule.calculate(cart_value, delivery_distance, number_of_items, order_time)
+
+        key = schedule.quote_key(cart_value, delivery_distance, number_of_items, order_time)
+        now = time.monotonic()
+
+        with self._lock:
+            if schedule is not self._schedule:
+                self._quotes.clear()
+                self._schedule = schedule
+
+            entry = self._quotes.get(key)
+            if entry is not None and entry[1] > now:
+                self._quotes.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        fee = schedule.calculate(cart_value, delivery_distance, number_of_items, order_time)
+
+        with self._lock:
+            self.misses += 1
+            if schedule is self._schedule:
+                self._quotes[key] = (fee, now + self.ttl)
+                self._quotes.move_to_end(key)
+                if len(self._quotes) > self.maxsize:
+                    self._quotes.popitem(last=False)
+
+        return fee
+
+
+def _endpoint_quote_cache() -> QuoteCache:
+    """
+    :return: Shared quote cache if SHARED_QUOTE_CACHE_PATH is set, otherwise an in-process quote cache
+    """
+    if constants.SHARED_QUOTE_CACHE_PATH:
+        # Imported only when used, as the shared cache needs NumPy, which would add to the application startup time.
+        from app.shared_cache import SharedQuoteCache
+        return SharedQuoteCache(constants.SHARED_QUOTE_CACHE_PATH)
+
+    return QuoteCache()
+
+
+quote_cache: QuoteCache = _endpoint_quote_cache()
+"""
+Quote cache used by the fee calculation endpoint, shared by the worker processes if SHARED_QUOTE_CACHE_PATH is set.
+"""
@@ -0,0 +1,61 @@
+"""
+Coalescing of identical concurrent requests (single-flight).
+
+While a result is being computed for a key, callers that ask for the same key wait for that computation and get its
+result, or its exception, instead of computing it again. A cancelled caller only stops waiting, the computation goes on
+for the other callers.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time. Counts the computations (leaders) and the callers that waited
+    for another caller's computation (coalesced).
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._flights: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Computes the result for the key, or waits for the computation already running for it.
+        The computation runs in its own task and every caller waits for it through asyncio.shield, so a cancelled
+        caller, the one that started the computation included, does not cancel it for the others.
+
+        :return: Result of the computation for the key
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+        else:
+            self.leaders += 1
+            flight = asyncio.ensure_future(compute())
+            self._flights[key] = flight
+            flight.add_done_callback(lambda task: self._finish(key, task))
+
+        return await asyncio.shield(flight)
+
+    def _finish(self, key: Hashable, flight: asyncio.Task):
+        """
+        Removes the finished computation, so that later callers compute the result again.
+        """
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieves the exception, which is not logged as never retrieved when every caller was cancelled.
+        if not flight.cancelled():
+            flight.exception()
+
+
+request_flights: SingleFlight = SingleFlight()
+"""
+Fee calculation requests in flight, when COALESCE_REQUESTS is enabled.
+"""
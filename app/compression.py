@@ -0,0 +1,174 @@
+"""
+Negotiated response compression.
+
+Responses are compressed with the content coding that the client prefers in its Accept-Encoding header, among zstd
+(if the zstandard package is installed) and gzip. With equal preference zstd is used, as it is both faster and smaller.
+Responses smaller than COMPRESSION_MINIMUM_SIZE bytes, like single fee responses, are sent as they are.
+
+Streamed responses (e.g. the NDJSON stream endpoint) are compressed chunk by chunk, and every chunk is flushed, so that
+the client can decode each chunk of results as soon as it arrives.
+"""
+import importlib.util
+import zlib
+from functools import lru_cache
+from typing import Callable, List, Optional, Tuple
+
+from app import constants
+
+ZSTD_AVAILABLE: bool = importlib.util.find_spec("zstandard") is not None
+"""
+zstd compression is available, the zstandard package is installed.
+"""
+
+SUPPORTED_ENCODINGS: Tuple[str, ...] = ("zstd", "gzip") if ZSTD_AVAILABLE else ("gzip",)
+"""
+Supported content codings, in order of preference.
+"""
+
+
+@lru_cache(maxsize=256)
+def negotiate(accept_encoding: bytes) -> Optional[str]:
+    """
+    Chooses the content coding for an Accept-Encoding header value, e.g. b"gzip, deflate, br, zstd;q=0.9".
+    The values are cached, as clients send the same few values.
+
+    :return: Most preferred supported content coding, or None if the client does not accept any of them
+    """
+    qualities = {}
+    for item in accept_encoding.decode("latin-1").lower().split(","):
+        coding, *parameters = (part.strip() for part in item.split(";"))
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding] = quality
+
+    default = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in SUPPORTED_ENCODINGS:
+        quality = qualities.get(coding, default)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class Compressor:
+    """
+    Streaming compressor of one response.
+    """
+
+    def __init__(self, encoding: str):
+        if encoding == "zstd":
+            import zstandard
+            self._compressor = zstandard.ZstdCompressor(level=constants.COMPRESSION_ZSTD_LEVEL).compressobj()
+            self._flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        else:
+            # wbits 31 writes the gzip header and trailer.
+            self._compressor = zlib.compressobj(constants.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+            self._flush_mode = zlib.Z_SYNC_FLUSH
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        :return: Compressed data, flushed so that the client can decode all data given so far
+        """
+        return self._compressor.compress(data) + self._compressor.flush(self._flush_mode)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        """
+        :return: Compressed data and the end of the compressed stream
+        """
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses responses with the content coding negotiated from the Accept-Encoding header.
+    Requests that do not accept a supported coding pass through without any other overhead.
+    """
+
+    def __init__(self, app, minimum_size: int = constants.COMPRESSION_MINIMUM_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for name, value in scope["headers"]:
+                if name == b"accept-encoding":
+                    encoding = negotiate(value)
+                    if encoding is not None:
+                        await self.app(scope, receive, _CompressingSend(send, encoding, self.minimum_size))
+                        return
+                    break
+
+        await self.app(scope, receive, send)
+
+
+class _CompressingSend:
+    """
+    Send channel of one response that compresses the response body. The response start message is held back until
+    the first body message, which tells whether the response is large enough to compress.
+    """
+
+    def __init__(self, send: Callable, encoding: str, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start: Optional[dict] = None
+        self.compressor: Optional[Compressor] = None
+        self.passthrough = False
+
+    def _headers(self, content_length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = [(name, value) for name, value in self.start["headers"] if name not in (b"content-length", b"vary")]
+        vary = [value for name, value in self.start["headers"] if name == b"vary"]
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b", ".join(vary + [b"Accept-Encoding"])))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        return headers
+
+    async def __call__(self, message: dict):
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            if any(name == b"content-encoding" for name, _ in message.get("headers", ())):
+                # Already encoded by the endpoint.
+                self.passthrough = True
+                await self.send(message)
+            else:
+                self.start = message
+            return
+        if message_type != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.compressor is None:
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self.send(self.start)
+                await self.send(message)
+                return
+
+            self.compressor = Compressor(self.encoding)
+            if not more_body:
+                body = self.compressor.finish(body)
+                await self.send({**self.start, "headers": self._headers(len(body))})
+                await self.send({"type": "http.response.body", "body": body})
+                return
+
+            await self.send({**self.start, "headers": self._headers(None)})
+
+        if more_body:
+            if body:
+                await self.send({"type": "http.response.body", "body": self.compressor.compress(body), "more_body": True})
+        else:
+            await self.send({"type": "http.response.body", "body": self.compressor.finish(body)})
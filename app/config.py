@@ -0,0 +1,156 @@
+"""
+Fee configuration loaded from a JSON file, so the fee rules can be changed without restarting the workers.
+
+The file has the same values as the fee constants, with lowercase names, e.g. {"base_delivery_fee": 250}.
+Values missing from the file default to the constants. Every worker polls the file for changes and swaps
+the active fee schedule when it changes, so all workers pick up a new configuration within the poll interval.
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Annotated, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+
+from app import constants
+from app.rush import RushCalendar, RushWindow
+from app.schedule import FeeSchedule, set_fee_schedule
+
+logger = logging.getLogger(__name__)
+
+ConfigValue = Annotated[int, Field(ge=0, le=constants.MAX_CONFIG_VALUE)]
+PositiveConfigValue = Annotated[int, Field(ge=1, le=constants.MAX_CONFIG_VALUE)]
+
+
+class FeeConfig(BaseModel):
+    """
+    Fee rule values, validated before they are compiled into a FeeSchedule.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    base_delivery_fee: ConfigValue = constants.BASE_DELIVERY_FEE
+    base_delivery_fee_distance: ConfigValue = constants.BASE_DELIVERY_FEE_DISTANCE
+    # The step fees must be positive, so that the fee keeps growing with the distance and the number of items.
+    additional_fee: PositiveConfigValue = constants.ADDITIONAL_FEE
+    additional_fee_distance: PositiveConfigValue = constants.ADDITIONAL_FEE_DISTANCE
+    additional_item_limit: PositiveConfigValue = constants.ADDITIONAL_ITEM_LIMIT
+    additional_item_surcharge: PositiveConfigValue = constants.ADDITIONAL_ITEM_SURCHARGE
+    max_fee: int = Field(constants.MAX_FEE, ge=0, le=constants.MAX_CONFIG_FEE)
+    rush_multiplier_bps: int = Field(
+        constants.RUSH_MULTIPLIER_BPS, ge=constants.MIN_CONFIG_RUSH_MULTIPLIER_BPS, le=constants.MAX_CONFIG_RUSH_MULTIPLIER_BPS,
+    )
+    rush_delivery_day: int = Field(constants.RUSH_DELIVERY_DAY, ge=0, le=6)
+    rush_delivery_start: int = Field(constants.RUSH_DELIVERY_START, ge=0, le=23)
+    rush_delivery_end: int = Field(constants.RUSH_DELIVERY_END, ge=0, le=23)
+    free_delivery_threshold: ConfigValue = constants.FREE_DELIVERY_THRESHOLD
+    small_order_threshold: ConfigValue = constants.SMALL_ORDER_THRESHOLD
+    bulk_fee_threshold: ConfigValue = constants.BULK_FEE_THRESHOLD
+    bulk_fee: ConfigValue = constants.BULK_FEE
+    rush_windows: Optional[List[RushWindow]] = None
+    """
+    Rush hour windows, e.g. [{"weekday": 4, "start": "15:00", "end": "19:00", "multiplier_bps": 12000,
+    "timezone": "Europe/Helsinki"}]. When given, they replace the single rush hour window above.
+    """
+
+    @field_validator("rush_windows")
+    @classmethod
+    def check_rush_windows(cls, value: Optional[List[RushWindow]]) -> Optional[List[RushWindow]]:
+        if value is not None:
+            RushCalendar(value)
+
+        return value
+
+    @classmethod
+    def from_schedule(cls, schedule: FeeSchedule) -> "FeeConfig":
+        """
+        :return: Configuration values of the fee schedule
+        """
+        values = {name: getattr(schedule, name) for name in cls.model_fields if hasattr(schedule, name)}
+        values["rush_windows"] = list(schedule.rush_windows) if schedule.rush_windows is not None else None
+        return cls(**values, rush_delivery_start=schedule.rush_start.hour, rush_delivery_end=schedule.rush_end.hour)
+
+    def schedule(self) -> FeeSchedule:
+        """
+        :return: Fee schedule compiled from the configuration
+        """
+        return FeeSchedule(**self.model_dump(exclude={"rush_windows"}), rush_windows=self.rush_windows)
+
+
+def load_fee_config(path: str) -> FeeSchedule:
+    """
+    Reads and validates a fee configuration file.
+    Raises OSError if the file cannot be read and ValueError if it is not a valid configuration.
+
+    :return: Fee schedule compiled from the configuration file
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+
+    try:
+        return FeeConfig.model_validate_json(content).schedule()
+    except ValidationError as e:
+        raise ValueError(f"Invalid fee configuration in {path}: {e}") from e
+
+
+def save_fee_config(path: str, config: FeeConfig):
+    """
+    Writes the configuration file atomically: the new file is written next to it and renamed over it, so the
+    workers polling the file never read a partially written configuration.
+    """
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as file:
+        json.dump(config.model_dump(mode="json"), file, indent=2)
+    os.replace(temporary_path, path)
+
+
+class ConfigWatcher:
+    """
+    Reloads the fee configuration file into the active fee schedule whenever the file changes.
+    """
+
+    def __init__(self, path: str, interval: float = constants.FEE_CONFIG_POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._version: Optional[Tuple[int, int, int]] = None
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Loads the configuration file if it has changed since the last load. An invalid file is logged and ignored,
+        and the current fee schedule stays active.
+
+        :return: True if a new fee schedule was activated
+        """
+        try:
+            # save_fee_config replaces the file, so a new inode also tells changes apart that share a timestamp.
+            stat = os.stat(self.path)
+            version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if not force and version == self._version:
+                return False
+
+            self._version = version
+            set_fee_schedule(load_fee_config(self.path))
+        except (OSError, ValueError) as e:
+            logger.error("Fee configuration not loaded: %s", e)
+            return False
+
+        logger.info("Fee configuration loaded from %s", self.path)
+        return True
+
+    async def watch(self):
+        """
+        Polls the configuration file for changes until cancelled. Errors are logged and polling continues.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            # An unexpected error with one file must not stop picking up the next one.
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Fee configuration not loaded from %s", self.path)
+
+
+config_watcher: Optional[ConfigWatcher] = ConfigWatcher(constants.FEE_CONFIG_PATH) if constants.FEE_CONFIG_PATH else None
+"""
+Watcher for the configured fee configuration file, None if no file is configured.
+"""
@@ -5,12 +5,112 @@ This is to make sure the API and all tests work normally even if some values are
 All fees are in represented in euro cents (e.g., value 200 = 2€).
 All distances are represented in meters.
 """
+import os
 
 CALCULATE_ENDPOINT: str = "/feecalc"
 """
 API endpoint string for calculating delivery fee.
 """
 
+BATCH_CALCULATE_ENDPOINT: str = "/feecalc/batch"
+"""
+API endpoint string for calculating delivery fees for a list of orders in a single request.
+"""
+
+MAX_BATCH_SIZE: int = 10_000
+"""
+Maximum number of orders accepted in a single batch request.
+"""
+
+BATCH_THREADPOOL_THRESHOLD: int = 100
+"""
+Batches with more orders than this are calculated in the threadpool, smaller batches directly on the event loop.
+"""
+
+STREAM_CALCULATE_ENDPOINT: str = "/feecalc/stream"
+"""
+API endpoint string for calculating delivery fees for a stream of newline-delimited JSON orders.
+"""
+
+BREAKDOWN_PARAMETER: str = "breakdown"
+"""
+Query parameter of the CALCULATE_ENDPOINT that adds the fee components to the response, e.g. /feecalc?breakdown=true.
+"""
+
+MATRIX_CALCULATE_ENDPOINT: str = "/feecalc/matrix"
+"""
+API endpoint string for calculating delivery fees of one or more carts across a list of delivery distances.
+"""
+
+MAX_MATRIX_CARTS: int = 100
+"""
+Maximum number of carts in a single fee matrix request.
+"""
+
+MAX_MATRIX_DISTANCES: int = 10_000
+"""
+Maximum number of delivery distances in a single fee matrix request.
+"""
+
+LOCATION_CALCULATE_ENDPOINT: str = "/feecalc/location"
+"""
+API endpoint string for calculating delivery fee from the customer and venue coordinates, or a venue ID.
+"""
+
+NEARBY_CALCULATE_ENDPOINT: str = "/feecalc/nearby"
+"""
+API endpoint string for calculating delivery fees of a cart from all venues within a radius of the customer.
+"""
+
+MAX_NEARBY_RADIUS: int = 50_000
+"""
+Maximum radius of a nearby venues request.
+"""
+
+EARTH_RADIUS: float = 6_371_008.8
+"""
+Mean radius of the Earth, used for the great-circle (haversine) delivery distances.
+"""
+
+VENUE_FILE_PATH: str = os.environ.get("VENUE_FILE_PATH", "")
+"""
+Path of the venue file (see app/venues.py), set with the VENUE_FILE_PATH environment variable. The file is
+memory-mapped, so all worker processes share one copy of it. Venue ID and nearby venue requests need a venue file.
+"""
+
+VENUE_GRID_DEGREES: float = 0.05
+"""
+Cell size of the venue grid index in degrees of latitude and longitude (0.05 degrees of latitude is about 5.6 km).
+"""
+
+CONFIG_ENDPOINT: str = "/config"
+"""
+API endpoint string for reading and replacing the fee configuration.
+"""
+
+CONFIG_TOKEN: str = os.environ.get("CONFIG_TOKEN", "")
+"""
+Bearer token that requests replacing the fee configuration through the API must send in the Authorization header,
+set with the CONFIG_TOKEN environment variable. Replacing the configuration through the API is disabled when it is not
+set. Client addresses are not used for this, as behind a reverse proxy every request comes from the proxy. Changes
+also need FEE_CONFIG_PATH, as they are written to the file for every worker to pick up.
+"""
+
+METRICS_ENDPOINT: str = "/metrics"
+"""
+API endpoint string for the Prometheus metrics.
+"""
+
+HEALTH_ENDPOINT: str = "/health"
+"""
+API endpoint string for readiness and health checks. Does not run any fee calculation.
+"""
+
+MAX_STREAM_LINE_LENGTH: int = 64 * 1_024
+"""
+Maximum length of a single order line in bytes in the streaming endpoint. Longer lines are reported as errors.
+"""
+
 BASE_DELIVERY_FEE: int = 200
 """
 Base delivery fee for an order. Minimum fee charged unless free delivery applies.
@@ -47,9 +147,20 @@ MAX_FEE: int = 1_500
 Maximum fee that can be charged for the delivery.
 """
 
-RUSH_MULTIPLIER: float = 1.2
+BASIS_POINTS: int = 10_000
+"""
+Basis points in one, the unit of the rush hour multiplier.
+"""
+
+RUSH_MULTIPLIER_BPS: int = 12_000
+"""
+Multiplier used for the delivery fee when order is delivered during rush hour period, in basis points (12_000 is 1.2).
+The multiplied fee is calculated with integers and rounded half up to whole cents, so fees are always exact integers.
+"""
+
+RUSH_MULTIPLIER: float = RUSH_MULTIPLIER_BPS / BASIS_POINTS
 """
-Multiplier used for the delivery fee when order is delivered during rush hour period.
+Rush hour multiplier as a decimal number, for display. Fees are calculated with RUSH_MULTIPLIER_BPS.
 """
 
 RUSH_DELIVERY_DAY: int = 4
@@ -87,3 +198,163 @@ BULK_FEE: int = 120
 """
 Bulk fee value, charged only once per order if applicable.
 """
+
+QUOTE_CACHE_SIZE: int = 0
+"""
+Maximum number of fee quotes kept in the in-process quote cache, 0 disables the cache.
+With the fee rules as plain arithmetic, a cache lookup costs about as much as calculating the fee,
+so the cache is only worth enabling when the fee calculation gets more expensive.
+"""
+
+QUOTE_CACHE_TTL: float = 300.0
+"""
+Time in seconds for which a cached fee quote is used before it is calculated again.
+"""
+
+FEE_LOOKUP_TABLES: bool = False
+"""
+Calculate fees with precomputed lookup tables (app/tables.py) instead of the fee schedule arithmetic.
+The tables are built at startup and whenever a new fee schedule is activated.
+"""
+
+MAX_LOOKUP_TABLE_SIZE: int = 1_000_000
+"""
+Maximum number of entries in each fee lookup table. Fee schedules that need larger tables are calculated without them.
+"""
+
+METRICS_ENABLED: bool = True
+"""
+Record fee calculation metrics (request latency, validation failures and fee rule hits) for the metrics endpoint.
+"""
+
+FEE_CONFIG_PATH: str = os.environ.get("FEE_CONFIG_PATH", "")
+"""
+Path of the JSON fee configuration file (see app/config.py), set with the FEE_CONFIG_PATH environment variable.
+When set, the fee rules are loaded from the file at startup and reloaded whenever the file changes,
+with the constants above as defaults for values missing from the file.
+"""
+
+FEE_CONFIG_POLL_INTERVAL: float = 0.05
+"""
+Interval in seconds at which each worker checks the fee configuration file for changes. A check is one stat call,
+so every worker picks up a change within 50 milliseconds at a negligible cost.
+"""
+
+MAX_CONFIG_FEE: int = 100_000
+"""
+Largest maximum fee accepted in a fee configuration.
+"""
+
+MIN_CONFIG_RUSH_MULTIPLIER_BPS: int = 5_000
+"""
+Smallest rush hour multiplier accepted in a fee configuration, in basis points. Together with MAX_CONFIG_FEE, this
+bounds the saturation fee (see FeeSchedule.saturation_fee) to 2 * MAX_CONFIG_FEE.
+"""
+
+MAX_CONFIG_RUSH_MULTIPLIER_BPS: int = 100_000
+"""
+Largest rush hour multiplier accepted in a fee configuration, in basis points.
+"""
+
+MAX_CONFIG_VALUE: int = 2 ** 40
+"""
+Largest fee, distance, item count or cart value threshold accepted in a fee configuration, so that fee calculations
+with the configured values stay within int64 in the vectorized engine.
+"""
+
+DOCS_ENABLED: bool = os.environ.get("DOCS_ENABLED", "1") != "0"
+"""
+Serve the API documentation (/docs, /redoc and /openapi.json). Set the DOCS_ENABLED environment variable to 0
+to turn the documentation off in production.
+"""
+
+PROFILE_SAMPLE_RATE: float = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+"""
+Fraction of fee calculation requests that are profiled (see app/profiling.py), set with the PROFILE_SAMPLE_RATE
+environment variable, e.g. 0.001 profiles one request in a thousand. 0 turns sampling off.
+"""
+
+PROFILE_HEADER: str = "x-profile"
+"""
+Request header that profiles a fee calculation request, when enabled with PROFILE_HEADER_ENABLED.
+"""
+
+PROFILE_HEADER_ENABLED: bool = os.environ.get("PROFILE_HEADER_ENABLED", "0") != "0"
+"""
+Profile requests that have the PROFILE_HEADER header. Set the PROFILE_HEADER_ENABLED environment variable to 1
+to turn it on, it is off by default so that clients cannot make the server profile requests.
+"""
+
+PROFILE_SERVER_TIMING: bool = os.environ.get("PROFILE_SERVER_TIMING", "1") != "0"
+"""
+Return the stage timings of profiled requests in the Server-Timing response header.
+"""
+
+PROFILE_DIR: str = os.environ.get("PROFILE_DIR", "")
+"""
+Directory for profiler traces of profiled requests, set with the PROFILE_DIR environment variable.
+No traces are recorded when it is not set.
+"""
+
+PROFILE_ENGINE: str = os.environ.get("PROFILE_ENGINE", "cprofile")
+"""
+Profiler for the traces, cprofile (pstats files, e.g. for snakeviz) or pyinstrument (HTML reports, requires
+the pyinstrument package).
+"""
+
+SHARED_QUOTE_CACHE_PATH: str = os.environ.get("SHARED_QUOTE_CACHE_PATH", "")
+"""
+Path of the quote cache file shared by all worker processes on the node (see app/shared_cache.py), set with the
+SHARED_QUOTE_CACHE_PATH environment variable, e.g. /dev/shm/feecalc-quotes. When set, the fee calculation endpoint
+uses the shared cache instead of the in-process quote cache. Both a hit and a miss cost more than calculating the fee
+with the current fee rules (see README), so only set it when the fee calculation is more expensive than that.
+"""
+
+SHARED_QUOTE_CACHE_SLOTS: int = 65_536
+"""
+Number of quotes the shared quote cache holds, 64 bytes each. Must be 4 times a power of two.
+"""
+
+COALESCE_REQUESTS: bool = os.environ.get("COALESCE_REQUESTS", "0") != "0"
+"""
+Coalesce concurrent fee calculation requests for the same quote (see app/coalesce.py): requests that arrive while the
+fee for the same quote key is being calculated get the same result instead of calculating it again. Every request is
+still parsed and validated. Set the COALESCE_REQUESTS environment variable to 1 to turn it on. It only saves CPU time
+when the fee calculation is more expensive than computing the quote key (e.g. with a slow dependency), and costs one
+extra event loop iteration of latency per calculated quote.
+"""
+
+BINARY_PORT: int = int(os.environ.get("BINARY_PORT", "0"))
+"""
+TCP port of the binary fee protocol (see app/binary.py) for internal callers, set with the BINARY_PORT environment
+variable. Every worker process listens on the port (SO_REUSEPORT). 0 turns the binary protocol off.
+"""
+
+BINARY_HOST: str = os.environ.get("BINARY_HOST", "127.0.0.1")
+"""
+Bind address of the binary fee protocol, set with the BINARY_HOST environment variable.
+"""
+
+COMPRESSION_ENABLED: bool = os.environ.get("COMPRESSION_ENABLED", "1") != "0"
+"""
+Compress responses for clients that accept it (see app/compression.py), with zstd if the zstandard package is
+installed and gzip otherwise. Set the COMPRESSION_ENABLED environment variable to 0 to turn compression off, e.g. when
+a proxy in front of the API compresses the responses.
+"""
+
+COMPRESSION_MINIMUM_SIZE: int = 1_024
+"""
+Responses smaller than this (in bytes) are not compressed, e.g. single fee responses. Compressing them would cost
+more CPU time than sending the few bytes it saves. Streamed responses are always compressed.
+"""
+
+COMPRESSION_GZIP_LEVEL: int = 3
+"""
+gzip compression level, 1 (fastest) to 9 (smallest). Fee results compress to within 15 % of the size at the zlib
+default level 6 with a third of the CPU time (see benchmark/compression.py).
+"""
+
+COMPRESSION_ZSTD_LEVEL: int = 3
+"""
+zstd compression level.
+"""
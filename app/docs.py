@@ -1,12 +1,60 @@
+"""
+OpenAPI documentation of the API routes: response descriptions, request bodies and examples.
+
+Only imported when the OpenAPI schema is first generated (see document_routes), so building the documentation does
+not slow down the application startup.
+"""
+import json
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
 from app import constants
+from app.order import Order
+
+breakdown_example = {
+    "delivery_fee": 710,
+    "breakdown": {
+        "free_delivery": False,
+        "distance_fee": 500,
+        "item_surcharge": 0,
+        "small_order_surcharge": 210,
+        "bulk_fee": 0,
+        "rush_multiplier_bps": 0,
+        "rush_fee": 0,
+        "max_fee_applied": False,
+        "max_fee_reduction": 0,
+    },
+}
 
 responses = {
     200: {
         "description": "Calculated delivery fee, in euro cents.",
         "content": {
             "application/json": {
-                "example": {
-                    "delivery_fee": 250,
+                "examples": {
+                    "fee": {
+                        "summary": "Delivery fee",
+                        "value": {
+                            "delivery_fee": 250,
+                        },
+                    },
+                    "breakdown": {
+                        "summary": f"Delivery fee with {constants.BREAKDOWN_PARAMETER}=true",
+                        "description": "The components add up to the delivery fee: distance_fee + item_surcharge + "
+                                       "small_order_surcharge + bulk_fee + rush_fee - max_fee_reduction.",
+                        "value": breakdown_example,
+                    },
+                },
+            },
+        },
+    },
+    422: {
+        "description": "Validation Error",
+        "content": {
+            "application/json": {
+                "schema": {
+                    "$ref": "#/components/schemas/HTTPValidationError",
                 },
             },
         },
@@ -55,3 +103,299 @@ examples = {
         },
     },
 }
+
+order_body = {
+    "parameters": [
+        {
+            "name": constants.BREAKDOWN_PARAMETER,
+            "in": "query",
+            "required": False,
+            "description": "Add the components of the fee to the response, e.g. for receipts.",
+            "schema": {
+                "type": "boolean",
+                "default": False,
+            },
+        },
+    ],
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {
+                "schema": Order.model_json_schema(),
+                "examples": examples,
+            },
+        },
+    },
+}
+
+batch_responses = {
+    200: {
+        "description": "Calculated delivery fees, in euro cents, in the same order as the request. "
+                       "Orders that fail validation have the validation errors in place of the fee.",
+        "content": {
+            "application/json": {
+                "example": {
+                    "results": [
+                        {
+                            "delivery_fee": 710,
+                        },
+                        {
+                            "detail": [
+                                {
+                                    "type": "greater_than",
+                                    "loc": [
+                                        "cart_value",
+                                    ],
+                                    "msg": "Input should be greater than 0",
+                                    "input": 0,
+                                    "ctx": {
+                                        "gt": 0,
+                                    },
+                                },
+                            ],
+                        },
+                    ],
+                },
+            },
+        },
+    },
+}
+
+batch_examples = {
+    "batch": {
+        "summary": "Batch of orders",
+        "description": f"Calculate delivery fees for up to {constants.MAX_BATCH_SIZE} orders in a single request.",
+        "value": [
+            examples["wolt_example"]["value"],
+            examples["free"]["value"],
+            {
+                "cart_value": 0,
+                "delivery_distance": constants.BASE_DELIVERY_FEE_DISTANCE,
+                "number_of_items": constants.ADDITIONAL_ITEM_LIMIT,
+                "time": "2024-01-21T13:00:00Z",
+            },
+        ],
+    },
+}
+
+stream_body = {
+    "requestBody": {
+        "required": True,
+        "description": "Orders as newline-delimited JSON, one order per line. Empty lines are skipped.",
+        "content": {
+            "application/x-ndjson": {
+                "schema": {
+                    "type": "string",
+                },
+                "example": "\n".join(json.dumps(example) for example in batch_examples["batch"]["value"]),
+            },
+        },
+    },
+}
+
+stream_responses = {
+    200: {
+        "description": "Calculated delivery fees as newline-delimited JSON, one line for each order line in the request. "
+                       "Orders that fail validation have the validation errors in place of the fee.",
+        "content": {
+            "application/x-ndjson": {
+                "example": "\n".join(json.dumps(result) for result in batch_responses[200]["content"]["application/json"]["example"]["results"]),
+            },
+        },
+    },
+}
+
+batch_body = {
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "examples": batch_examples,
+            },
+        },
+    },
+}
+
+matrix_examples = {
+    "cart": {
+        "summary": "One cart, many venues",
+        "description": "Delivery fees of one cart from venues at different distances, "
+                       f"up to {constants.MAX_MATRIX_DISTANCES} distances.",
+        "value": {
+            "cart": {
+                "cart_value": 790,
+                "number_of_items": 4,
+                "time": "2024-01-15T13:00:00Z",
+            },
+            "delivery_distances": [500, 2235, 10_000],
+        },
+    },
+    "carts": {
+        "summary": "Many carts, many venues",
+        "description": f"Delivery fees of up to {constants.MAX_MATRIX_CARTS} carts, one row of fees for each cart.",
+        "value": {
+            "carts": [
+                {
+                    "cart_value": 790,
+                    "number_of_items": 4,
+                    "time": "2024-01-15T13:00:00Z",
+                },
+                {
+                    "cart_value": 790,
+                    "number_of_items": 4,
+                    "time": "2024-01-19T16:00:00Z",
+                },
+            ],
+            "delivery_distances": [500, 2235, 10_000],
+        },
+    },
+}
+
+matrix_body = {
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "examples": matrix_examples,
+            },
+        },
+    },
+}
+
+matrix_responses = {
+    200: {
+        "description": "Calculated delivery fees, in euro cents, in the order of the delivery distances. "
+                       "A list of fees for cart, or a list of fee lists (one for each cart) for carts.",
+        "content": {
+            "application/json": {
+                "examples": {
+                    "cart": {
+                        "summary": "One cart",
+                        "value": {
+                            "delivery_fees": [410, 710, 1500],
+                        },
+                    },
+                    "carts": {
+                        "summary": "Many carts",
+                        "value": {
+                            "delivery_fees": [[410, 710, 1500], [492, 852, 1500]],
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+location_examples = {
+    "venue_location": {
+        "summary": "Customer and venue coordinates",
+        "description": "The delivery distance is the great-circle distance between the coordinates, rounded up to meters.",
+        "value": {
+            "cart_value": 790,
+            "number_of_items": 4,
+            "time": "2024-01-15T13:00:00Z",
+            "customer_location": {
+                "latitude": 60.1841,
+                "longitude": 24.9494,
+            },
+            "venue_location": {
+                "latitude": 60.1690,
+                "longitude": 24.9327,
+            },
+        },
+    },
+    "venue_id": {
+        "summary": "Venue ID",
+        "description": "Venue coordinates from the venue file (VENUE_FILE_PATH).",
+        "value": {
+            "cart_value": 790,
+            "number_of_items": 4,
+            "time": "2024-01-15T13:00:00Z",
+            "customer_location": {
+                "latitude": 60.1841,
+                "longitude": 24.9494,
+            },
+            "venue_id": "kamppi",
+        },
+    },
+}
+
+location_body = {
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "examples": location_examples,
+            },
+        },
+    },
+}
+
+location_responses = {
+    200: {
+        "description": "Calculated delivery fee in euro cents, and the delivery distance in meters.",
+        "content": {
+            "application/json": {
+                "example": {
+                    "delivery_fee": 610,
+                    "delivery_distance": 1917,
+                },
+            },
+        },
+    },
+    503: {
+        "description": "Venue ID given, but no venue file is loaded.",
+    },
+}
+
+nearby_body = {
+    "requestBody": {
+        "content": {
+            "application/json": {
+                "example": {
+                    "cart": matrix_examples["cart"]["value"]["cart"],
+                    "customer_location": location_examples["venue_id"]["value"]["customer_location"],
+                    "radius": 2_000,
+                },
+            },
+        },
+    },
+}
+
+nearby_responses = {
+    200: {
+        "description": "Venues of the venue file within the radius (in meters) of the customer, nearest first, "
+                       "with their delivery distances and the delivery fees of the cart in euro cents.",
+        "content": {
+            "application/json": {
+                "example": {
+                    "venue_ids": ["kallio", "kamppi"],
+                    "delivery_distances": [120, 1917],
+                    "delivery_fees": [410, 610],
+                },
+            },
+        },
+    },
+    503: {
+        "description": "No venue file is loaded.",
+    },
+}
+
+route_docs = {
+    constants.LOCATION_CALCULATE_ENDPOINT: (location_responses, location_body),
+    constants.NEARBY_CALCULATE_ENDPOINT: (nearby_responses, nearby_body),
+    constants.MATRIX_CALCULATE_ENDPOINT: (matrix_responses, matrix_body),
+    constants.CALCULATE_ENDPOINT: (responses, order_body),
+    constants.BATCH_CALCULATE_ENDPOINT: (batch_responses, batch_body),
+    constants.STREAM_CALCULATE_ENDPOINT: (stream_responses, stream_body),
+}
+"""
+Responses and OpenAPI extra fields of the documented routes, by route path.
+"""
+
+
+def document_routes(app: FastAPI):
+    """
+    Adds the documentation to the routes of the app. Must be called before the OpenAPI schema is generated.
+    """
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path in route_docs:
+            route.responses, route.openapi_extra = route_docs[route.path]
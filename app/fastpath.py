@@ -0,0 +1,171 @@
+"""
+High-throughput parsing of fee calculation requests.
+
+Well-formed requests (positive integer fields and an RFC 3339 order time) are parsed directly from the raw request
+body, without constructing an Order. Everything else falls back to validating an Order, so the accepted values and
+the validation errors are exactly the same as when FastAPI validates the request body into an Order.
+"""
+import email.message
+import json
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+import orjson
+from fastapi.dependencies.utils import get_missing_field_error
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+
+from app.order import Order
+
+OrderValues = Tuple[int, int, int, datetime]
+
+# ASCII digits only, as \d matches other Unicode digits too, which int() accepts but Order validation does not.
+_DATETIME_PATTERN = re.compile(
+    r"(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?(?:(Z)|([+-])(\d{2}):(\d{2}))?",
+    re.ASCII,
+)
+
+
+def parse_datetime(value: str) -> Optional[datetime]:
+    """
+    Parses the common RFC 3339 datetime formats, e.g. 2024-01-15T13:00:00Z or 2024-01-15T13:00:00.5+02:00.
+
+    :return: Parsed datetime, or None if the value is not in one of the supported formats
+    """
+    match = _DATETIME_PATTERN.fullmatch(value)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second, fraction, utc, sign, offset_hours, offset_minutes = match.groups()
+    tzinfo = None
+    if utc is not None:
+        tzinfo = timezone.utc
+    elif sign is not None:
+        if int(offset_minutes) > 59:
+            return None
+        offset = timedelta(hours=int(offset_hours), minutes=int(offset_minutes))
+        try:
+            tzinfo = timezone(-offset if sign == "-" else offset)
+        except ValueError:
+            return None
+
+    microsecond = int(fraction.ljust(6, "0")) if fraction is not None else 0
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), microsecond, tzinfo)
+    except ValueError:
+        return None
+
+
+def _is_positive_int(value: Any) -> bool:
+    return type(value) is int and value > 0
+
+
+def _is_json(content_type: Optional[str]) -> bool:
+    if content_type is None or content_type == "application/json":
+        return True
+
+    message = email.message.Message()
+    message["content-type"] = content_type
+    subtype = message.get_content_subtype()
+    return message.get_content_maintype() == "application" and (subtype == "json" or subtype.endswith("+json"))
+
+
+def _validate_order(data: Any) -> OrderValues:
+    if data is None:
+        raise RequestValidationError([get_missing_field_error(("body",))], body=data)
+
+    try:
+        order = Order.model_validate(data, from_attributes=True)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body",) + error["loc"]} for error in e.errors()],
+            body=data,
+        )
+
+    return order.cart_value, order.delivery_distance, order.number_of_items, order.time
+
+
+def _decode(body: bytes) -> Any:
+    try:
+        return json.loads(body)
+    except json.JSONDecodeError as e:
+        raise RequestValidationError(
+            [
+                {
+                    "type": "json_invalid",
+                    "loc": ("body", e.pos),
+                    "msg": "JSON decode error",
+                    "input": {},
+                    "ctx": {"error": e.msg},
+                },
+            ],
+            body=e.doc,
+        )
+
+
+def decode_order(body: bytes, content_type: Optional[str] = None) -> Any:
+    """
+    Decodes a raw JSON request body with orjson, the first step of parse_order.
+
+    :return: Decoded request body, or None if the body is empty, not JSON or not decodable by orjson
+    """
+    if not body or not _is_json(content_type):
+        return None
+
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def validate_order(data: Any, body: bytes, content_type: Optional[str] = None) -> OrderValues:
+    """
+    Validates the order values of a request body decoded with decode_order, the second step of parse_order.
+    Validation failures raise RequestValidationError, which FastAPI turns into the usual 422 response.
+
+    :return: Cart value, delivery distance, number of items and order time
+    """
+    if type(data) is dict:
+        cart_value = data.get("cart_value")
+        delivery_distance = data.get("delivery_distance")
+        number_of_items = data.get("number_of_items")
+        order_time = data.get("time")
+
+        if (
+            _is_positive_int(cart_value)
+            and _is_positive_int(delivery_distance)
+            and _is_positive_int(number_of_items)
+            and type(order_time) is str
+        ):
+            order_time = parse_datetime(order_time)
+            if order_time is not None:
+                return cart_value, delivery_distance, number_of_items, order_time
+
+    if not body:
+        return _validate_order(None)
+    if not _is_json(content_type):
+        return _validate_order(body)
+
+    # orjson differs from the standard library decoder FastAPI uses in edge cases (e.g. integers over 64 bits are
+    # decoded as floats), so the body is decoded again for the Order validation.
+    return _validate_order(_decode(body))
+
+
+def parse_order(body: bytes, content_type: Optional[str] = None) -> OrderValues:
+    """
+    Parses and validates the order values from a raw request body.
+    Validation failures raise RequestValidationError, which FastAPI turns into the usual 422 response.
+
+    :return: Cart value, delivery distance, number of items and order time
+    """
+    return validate_order(decode_order(body, content_type), body, content_type)
+
+
+def encode_fee(fee: int) -> bytes:
+    """
+    Encodes the fee calculation response body.
+
+    :return: JSON response body with the delivery fee
+    """
+    return orjson.dumps({"delivery_fee": fee})
@@ -0,0 +1,72 @@
+"""
+Delivery distances from coordinates, and the request models of the location and nearby venue endpoints.
+
+Delivery distances are great-circle (haversine) distances on a sphere with the mean radius of the Earth, rounded up
+to whole meters. Venue IDs and nearby venues are looked up from the venue file, see app/venues.py.
+"""
+import math
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel, Field, PositiveInt, model_validator
+
+from app.constants import EARTH_RADIUS, MAX_NEARBY_RADIUS
+from app.matrix import Cart
+
+
+class Location(BaseModel):
+    """
+    Coordinates of the customer or venue, in degrees.
+    """
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+
+
+def haversine_distance(latitude: float, longitude: float, other_latitude: float, other_longitude: float) -> float:
+    """
+    :return: Great-circle distance between the coordinates (in degrees), in meters
+    """
+    latitude, other_latitude = math.radians(latitude), math.radians(other_latitude)
+    a = (
+        math.sin((other_latitude - latitude) / 2) ** 2
+        + math.cos(latitude) * math.cos(other_latitude) * math.sin(math.radians(other_longitude - longitude) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def delivery_distance(distance: float) -> int:
+    """
+    Rounds a distance up to whole meters. Deliveries within the same building are 1 meter.
+
+    :return: Delivery distance in meters
+    """
+    return max(math.ceil(distance), 1)
+
+
+class LocatedOrder(BaseModel):
+    """
+    Order with the customer location and the venue location (venue_location), or the ID of a venue in the venue file
+    (venue_id), in place of the delivery distance.
+    """
+    cart_value: PositiveInt
+    number_of_items: PositiveInt
+    time: datetime
+    customer_location: Location
+    venue_location: Optional[Location] = None
+    venue_id: Optional[str] = Field(default=None, min_length=1, max_length=64)
+
+    @model_validator(mode="after")
+    def check_venue(self) -> "LocatedOrder":
+        if (self.venue_location is None) == (self.venue_id is None):
+            raise ValueError("Give either venue_location or venue_id")
+
+        return self
+
+
+class NearbyRequest(BaseModel):
+    """
+    Cart and the customer location, for calculating the delivery fees from all venues within the radius (in meters).
+    """
+    cart: Cart
+    customer_location: Location
+    radius: PositiveInt = Field(le=MAX_NEARBY_RADIUS)
@@ -0,0 +1,137 @@
+"""
+Fee schedule history, for recomputing past fees with the fee rules that were in force at the time of each order,
+e.g. when auditing disputed orders.
+
+The history is a list of fee configurations, each with the time it took effect, read from a JSON file:
+
+    [
+      {"effective_from": "2024-01-01T00:00:00Z"},
+      {"effective_from": "2024-03-01T00:00:00+02:00", "base_delivery_fee": 250}
+    ]
+
+Values missing from a version default to the constants, like in the fee configuration file. An order is priced with
+the latest version that took effect at or before the order time, found with a binary search over the effective times.
+Order times without timezone information are taken as UTC. For whole arrays of orders, see calculate_history_fees
+in app/vectorized.py.
+"""
+from bisect import bisect_right
+from datetime import datetime, timezone
+from typing import List, Sequence, Tuple
+
+from pydantic import AwareDatetime, Field, RootModel, ValidationError
+
+from app.config import FeeConfig
+from app.schedule import FeeBreakdown, FeeSchedule
+
+
+class NoScheduleError(ValueError):
+    """
+    The order time is before the first fee schedule of the history.
+    """
+
+
+class FeeScheduleVersion(FeeConfig):
+    """
+    Fee rule values and the time they took effect. The time must have timezone information.
+    """
+    effective_from: AwareDatetime
+
+    def schedule(self) -> FeeSchedule:
+        """
+        :return: Fee schedule compiled from the configuration
+        """
+        return FeeConfig.model_validate(self.model_dump(exclude={"effective_from"})).schedule()
+
+
+class FeeHistoryConfig(RootModel):
+    root: List[FeeScheduleVersion] = Field(min_length=1)
+
+
+class FeeHistory:
+    """
+    Fee schedules indexed by the time they took effect. Has the same calculate and breakdown methods as FeeSchedule,
+    which use the schedule in force at the order time, so a history can be used wherever a schedule is.
+    """
+    __slots__ = ("effective_from", "schedules", "utc_effective_from")
+
+    def __init__(self, versions: Sequence[Tuple[datetime, FeeSchedule]]):
+        """
+        Raises ValueError if there are no versions, a time has no timezone information or two versions take effect
+        at the same time.
+        """
+        if not versions:
+            raise ValueError("Fee history must have at least one fee schedule")
+        if any(effective_from.tzinfo is None for effective_from, _ in versions):
+            raise ValueError("Effective times of fee schedules must have timezone information")
+
+        versions = sorted(versions, key=lambda version: version[0])
+        self.effective_from: List[datetime] = [effective_from for effective_from, _ in versions]
+        self.schedules: List[FeeSchedule] = [schedule for _, schedule in versions]
+        for previous, effective_from in zip(self.effective_from, self.effective_from[1:]):
+            if previous == effective_from:
+                raise ValueError(f"Several fee schedules take effect at {effective_from.isoformat()}")
+        # Naive UTC times, so that the lookups compare naive datetimes, which is faster than comparing aware ones.
+        self.utc_effective_from: List[datetime] = [
+            effective_from.astimezone(timezone.utc).replace(tzinfo=None) for effective_from in self.effective_from
+        ]
+
+    def __len__(self) -> int:
+        return len(self.schedules)
+
+    def index_at(self, order_time: datetime) -> int:
+        """
+        Raises NoScheduleError if the order time is before the first schedule took effect.
+
+        :return: Index of the fee schedule in force at the order time
+        """
+        utc_time = order_time
+        if order_time.tzinfo is not None:
+            utc_time = order_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+        index = bisect_right(self.utc_effective_from, utc_time) - 1
+        if index < 0:
+            raise NoScheduleError(
+                f"No fee schedule in force at {utc_time.isoformat()}+00:00, the first one took effect at "
+                f"{self.effective_from[0].isoformat()}"
+            )
+        return index
+
+    def schedule_at(self, order_time: datetime) -> FeeSchedule:
+        """
+        :return: Fee schedule in force at the order time
+        """
+        return self.schedules[self.index_at(order_time)]
+
+    def calculate(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> int:
+        """
+        See FeeSchedule.calculate.
+
+        :return: Total fee for the delivery with the fee schedule in force at the order time, in cents
+        """
+        return self.schedules[self.index_at(order_time)].calculate(cart_value, delivery_distance, number_of_items, order_time)
+
+    def breakdown(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> FeeBreakdown:
+        """
+        See FeeSchedule.breakdown.
+
+        :return: Delivery fee with the fee schedule in force at the order time, split into its components
+        """
+        return self.schedule_at(order_time).breakdown(cart_value, delivery_distance, number_of_items, order_time)
+
+
+def load_fee_history(path: str) -> FeeHistory:
+    """
+    Reads and validates a fee history file.
+    Raises OSError if the file cannot be read and ValueError if it is not a valid fee history.
+
+    :return: Fee history with the schedules compiled from the file
+    """
+    with open(path, "rb") as file:
+        content = file.read()
+
+    try:
+        versions = FeeHistoryConfig.model_validate_json(content).root
+    except ValidationError as e:
+        raise ValueError(f"Invalid fee history in {path}: {e}") from e
+
+    return FeeHistory([(version.effective_from, version.schedule()) for version in versions])
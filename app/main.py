@@ -1,13 +1,444 @@
-from fastapi import Body
+import asyncio
+import hmac
+import time
+from typing import Any, AsyncIterator, List, Tuple
 
-from app.constants import CALCULATE_ENDPOINT
-from app.docs import examples, responses
+import orjson
+from fastapi import Body, Depends, FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import ValidationError
+
+from app import metrics, profiling
+from app.coalesce import request_flights
+from app.config import FeeConfig, config_watcher, save_fee_config
+from app.constants import (
+    BATCH_CALCULATE_ENDPOINT,
+    BATCH_THREADPOOL_THRESHOLD,
+    BREAKDOWN_PARAMETER,
+    CALCULATE_ENDPOINT,
+    COALESCE_REQUESTS,
+    CONFIG_ENDPOINT,
+    CONFIG_TOKEN,
+    FEE_LOOKUP_TABLES,
+    HEALTH_ENDPOINT,
+    LOCATION_CALCULATE_ENDPOINT,
+    MATRIX_CALCULATE_ENDPOINT,
+    MAX_BATCH_SIZE,
+    MAX_STREAM_LINE_LENGTH,
+    METRICS_ENDPOINT,
+    NEARBY_CALCULATE_ENDPOINT,
+    STREAM_CALCULATE_ENDPOINT,
+)
+from app.fastpath import OrderValues, decode_order, encode_fee, parse_order, validate_order
+from app.geo import LocatedOrder, NearbyRequest, delivery_distance, haversine_distance
+from app.matrix import FeeMatrixRequest
 from app.order import Order
+from app.schedule import FeeSchedule, get_fee_schedule
 from app.server import app
+from app.tables import build_tables, price
+
+if FEE_LOOKUP_TABLES:
+    build_tables(get_fee_schedule())
+
+
+@app.post(CALCULATE_ENDPOINT)
+async def delivery_fee(request: Request):
+    if request.scope["query_string"] and request.query_params.get(BREAKDOWN_PARAMETER) in ("1", "true"):
+        return await _delivery_fee_breakdown(request)
+    if profiling.enabled and profiling.sampled(request.headers):
+        return await _profiled_delivery_fee(request)
+    if COALESCE_REQUESTS:
+        return await _coalesced_delivery_fee(request)
+
+    start = time.perf_counter()
+    schedule = get_fee_schedule()
+    try:
+        values = parse_order(await request.body(), request.headers.get("content-type"))
+    except RequestValidationError:
+        if metrics.enabled:
+            metrics.validation_failures.inc()
+        raise
+
+    fee = price(schedule, *values)
+
+    response = Response(encode_fee(fee), media_type="application/json")
+    if metrics.enabled:
+        metrics.observe_fee(schedule, *values, fee)
+        metrics.request_duration.observe(time.perf_counter() - start)
+
+    return response
+
+
+async def _quote(schedule: FeeSchedule, values: OrderValues) -> Tuple[int, bytes]:
+    """
+    Prices validated order values for the coalesced fee calculation endpoint.
+    Yields to the event loop once first, so that requests for the same quote that arrived at the same time join this
+    calculation.
+
+    :return: Delivery fee and response body
+    """
+    await asyncio.sleep(0)
+    fee = price(schedule, *values)
+
+    return fee, encode_fee(fee)
+
+
+async def _coalesced_delivery_fee(request: Request) -> Response:
+    """
+    Fee calculation endpoint with concurrent requests for the same quote coalesced, see app/coalesce.py.
+    Every request is parsed and validated on its own. Requests are for the same quote if they are priced with the
+    same fee schedule and have the same FeeSchedule.quote_key and free delivery, so requests that differ only in
+    formatting or in values the fee does not depend on are coalesced too.
+    """
+    start = time.perf_counter()
+    schedule = get_fee_schedule()
+    try:
+        values = parse_order(await request.body(), request.headers.get("content-type"))
+    except RequestValidationError:
+        if metrics.enabled:
+            metrics.validation_failures.inc()
+        raise
+
+    key = (schedule, values[0] >= schedule.free_delivery_threshold, *schedule.quote_key(*values))
+    fee, content = await request_flights.run(key, lambda: _quote(schedule, values))
+
+    response = Response(content, media_type="application/json")
+    if metrics.enabled:
+        metrics.observe_fee(schedule, *values, fee)
+        metrics.request_duration.observe(time.perf_counter() - start)
+
+    return response
+
+
+async def _delivery_fee_breakdown(request: Request) -> Response:
+    """
+    Fee calculation endpoint with the fee components added to the response, see FeeSchedule.breakdown.
+    """
+    start = time.perf_counter()
+    schedule = get_fee_schedule()
+    try:
+        values = parse_order(await request.body(), request.headers.get("content-type"))
+    except RequestValidationError:
+        if metrics.enabled:
+            metrics.validation_failures.inc()
+        raise
+
+    breakdown = schedule.breakdown(*values)
+    response = Response(
+        orjson.dumps({"delivery_fee": breakdown.delivery_fee, "breakdown": breakdown.to_dict()}),
+        media_type="application/json",
+    )
+    if metrics.enabled:
+        metrics.observe_fee(schedule, *values, breakdown.delivery_fee)
+        metrics.request_duration.observe(time.perf_counter() - start)
+
+    return response
+
+
+async def _profiled_delivery_fee(request: Request) -> Response:
+    """
+    Fee calculation endpoint with the stages of the request timed, see app/profiling.py.
+    """
+    start = time.perf_counter()
+    profile = profiling.RequestProfile()
+    schedule = get_fee_schedule()
+    body = await request.body()
+    profile.mark("receive")
 
+    profile.start_trace()
+    content_type = request.headers.get("content-type")
+    data = decode_order(body, content_type)
+    profile.mark("decode")
+    try:
+        values = validate_order(data, body, content_type)
+    except RequestValidationError:
+        profile.finish()
+        if metrics.enabled:
+            metrics.validation_failures.inc()
+        raise
+    profile.mark("validate")
+
+    fee = price(schedule, *values)
+    profile.mark("calculate")
+
+    response = Response(encode_fee(fee), media_type="application/json")
+    profile.mark("serialize")
+
+    server_timing = profile.finish()
+    if server_timing is not None:
+        response.headers["server-timing"] = server_timing
+    if metrics.enabled:
+        metrics.observe_fee(schedule, *values, fee)
+        metrics.request_duration.observe(time.perf_counter() - start)
+
+    return response
+
+
+def _observed_fee(order: Order, schedule: FeeSchedule) -> int:
+    """
+    Calculates the delivery fee of a validated order with the fee schedule and records it in the metrics.
+
+    :return: Total fee for the delivery, in cents
+    """
+    values = (order.cart_value, order.delivery_distance, order.number_of_items, order.time)
+    fee = schedule.calculate(*values)
+    if metrics.enabled:
+        metrics.observe_fee(schedule, *values, fee)
+
+    return fee
+
+
+def _batch_result(payload: Any, schedule: FeeSchedule) -> dict:
+    """
+    Validates and prices a single order of a batch request.
+    Invalid orders are reported with their validation errors instead of failing the whole batch.
+
+    :return: Delivery fee of the order, or the validation errors if the order is invalid
+    """
+    try:
+        order = Order.model_validate(payload)
+    except ValidationError as e:
+        if metrics.enabled:
+            metrics.validation_failures.inc()
+        return {
+            "detail": e.errors(include_url=False)
+        }
 
-@app.post(CALCULATE_ENDPOINT, responses=responses)
-def delivery_fee(order: Order = Body(openapi_examples=examples)):
     return {
-        "delivery_fee": order.calculate_delivery_fee()
+        "delivery_fee": _observed_fee(order, schedule)
     }
+
+
+def _batch_results(orders: List[Any], schedule: FeeSchedule) -> dict:
+    return {
+        "results": [_batch_result(payload, schedule) for payload in orders]
+    }
+
+
+@app.post(BATCH_CALCULATE_ENDPOINT)
+async def batch_delivery_fee(orders: List[Any] = Body(max_length=MAX_BATCH_SIZE)):
+    # Large batches would block the event loop for other requests, so they are calculated in the threadpool.
+    if len(orders) > BATCH_THREADPOOL_THRESHOLD:
+        return await run_in_threadpool(_batch_results, orders, get_fee_schedule())
+
+    return _batch_results(orders, get_fee_schedule())
+
+
+_LINE_TOO_LONG = orjson.dumps({
+    "detail": [
+        {
+            "type": "line_too_long",
+            "loc": [],
+            "msg": f"Line should have at most {MAX_STREAM_LINE_LENGTH} bytes",
+        },
+    ],
+}) + b"\n"
+
+
+def _stream_result(line: bytes, schedule: FeeSchedule) -> bytes:
+    """
+    Validates and prices a single order line of a streaming request.
+
+    :return: Result line with the delivery fee of the order, or the validation errors if the order is invalid
+    """
+    try:
+        order = Order.model_validate_json(line)
+    except ValidationError as e:
+        if metrics.enabled:
+            metrics.validation_failures.inc()
+        return orjson.dumps({"detail": jsonable_encoder(e.errors(include_url=False))}) + b"\n"
+
+    return orjson.dumps({"delivery_fee": _observed_fee(order, schedule)}) + b"\n"
+
+
+async def _stream_results(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Splits the request body stream into order lines and yields the results as the lines arrive.
+    At most one line is buffered at a time, so memory use does not depend on the size of the request.
+    The whole stream is calculated with the fee schedule that was active when the stream started.
+    """
+    schedule = get_fee_schedule()
+    buffer = b""
+    skipping = False
+
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        results = []
+
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif line.strip():
+                results.append(_LINE_TOO_LONG if len(line) > MAX_STREAM_LINE_LENGTH else _stream_result(line, schedule))
+
+        if len(buffer) > MAX_STREAM_LINE_LENGTH:
+            if not skipping:
+                results.append(_LINE_TOO_LONG)
+                skipping = True
+            buffer = b""
+
+        if results:
+            yield b"".join(results)
+
+    if buffer.strip() and not skipping:
+        yield _stream_result(buffer, schedule)
+
+
+class _DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response that is sent while the request body is still being received.
+    StreamingResponse listens for client disconnect by receiving messages, which would take the request body chunks
+    away from the request stream. Here the request stream itself ends the response if the client disconnects.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post(STREAM_CALCULATE_ENDPOINT)
+async def stream_delivery_fee(request: Request):
+    return _DuplexStreamingResponse(_stream_results(request.stream()), media_type="application/x-ndjson")
+
+
+@app.post(MATRIX_CALCULATE_ENDPOINT)
+async def fee_matrix(matrix: FeeMatrixRequest):
+    # Imported when first used, as NumPy would add to the application startup time.
+    from app.vectorized import calculate_fee_matrix
+
+    carts = matrix.cart_rows()
+    fees = calculate_fee_matrix(
+        get_fee_schedule(),
+        [(cart.cart_value, cart.number_of_items, cart.time) for cart in carts],
+        matrix.delivery_distances,
+    )
+    if metrics.enabled:
+        metrics.fee_calculations.inc(amount=fees.size)
+
+    return Response(
+        orjson.dumps({"delivery_fees": fees[0] if matrix.cart is not None else fees}, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type="application/json",
+    )
+
+
+def _venue_index():
+    """
+    :return: Venue index of the venue file, loaded on first use
+    """
+    # Imported when first used, as NumPy would add to the application startup time.
+    from app.venues import get_venue_index
+
+    venue_index = get_venue_index()
+    if venue_index is None:
+        raise HTTPException(status_code=503, detail="Venue lookups need a venue file, set VENUE_FILE_PATH")
+    return venue_index
+
+
+@app.post(LOCATION_CALCULATE_ENDPOINT)
+async def located_delivery_fee(order: LocatedOrder):
+    if order.venue_id is not None:
+        venue_index = _venue_index()
+        venue = venue_index.find(order.venue_id)
+        if venue is None:
+            raise RequestValidationError([{
+                "type": "venue_not_found",
+                "loc": ("body", "venue_id"),
+                "msg": "Venue not found",
+                "input": order.venue_id,
+            }])
+        venue_location = float(venue_index.latitudes[venue]), float(venue_index.longitudes[venue])
+    else:
+        venue_location = order.venue_location.latitude, order.venue_location.longitude
+
+    customer = order.customer_location
+    distance = delivery_distance(haversine_distance(customer.latitude, customer.longitude, *venue_location))
+    schedule = get_fee_schedule()
+    values = (order.cart_value, distance, order.number_of_items, order.time)
+    fee = price(schedule, *values)
+    if metrics.enabled:
+        metrics.observe_fee(schedule, *values, fee)
+
+    return Response(orjson.dumps({"delivery_fee": fee, "delivery_distance": distance}), media_type="application/json")
+
+
+@app.post(NEARBY_CALCULATE_ENDPOINT)
+async def nearby_fees(nearby: NearbyRequest):
+    from app.vectorized import calculate_fee_matrix
+
+    venue_index = _venue_index()
+    customer = nearby.customer_location
+    venues, distances = venue_index.within(customer.latitude, customer.longitude, nearby.radius)
+    cart = nearby.cart
+    fees = calculate_fee_matrix(get_fee_schedule(), [(cart.cart_value, cart.number_of_items, cart.time)], distances)[0]
+    if metrics.enabled:
+        metrics.fee_calculations.inc(amount=fees.size)
+
+    return Response(
+        orjson.dumps(
+            {
+                "venue_ids": [venue_id.decode() for venue_id in venue_index.ids[venues].tolist()],
+                "delivery_distances": distances,
+                "delivery_fees": fees,
+            },
+            option=orjson.OPT_SERIALIZE_NUMPY,
+        ),
+        media_type="application/json",
+    )
+
+
+@app.get(METRICS_ENDPOINT, response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get(HEALTH_ENDPOINT, include_in_schema=False)
+async def health():
+    return Response(b'{"status":"ok"}', media_type="application/json")
+
+
+@app.get(CONFIG_ENDPOINT, include_in_schema=False)
+async def fee_config() -> FeeConfig:
+    return FeeConfig.from_schedule(get_fee_schedule())
+
+
+def _authorize_config_change(request: Request):
+    """
+    Checks the bearer token of a fee configuration change against CONFIG_TOKEN, and that there is a configuration
+    file to write the change to. Runs as a dependency, so that these requests are rejected before their body is read.
+    """
+    if not CONFIG_TOKEN:
+        raise HTTPException(status_code=403, detail="Fee configuration changes are disabled, set CONFIG_TOKEN to enable them")
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), CONFIG_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid fee configuration token", headers={"WWW-Authenticate": "Bearer"})
+
+    # Without a configuration file only the worker that answers the request would change its fee schedule.
+    if config_watcher is None:
+        raise HTTPException(status_code=409, detail="Fee configuration changes need a configuration file, set FEE_CONFIG_PATH")
+
+
+@app.put(CONFIG_ENDPOINT, include_in_schema=False, dependencies=[Depends(_authorize_config_change)])
+async def replace_fee_config(config: FeeConfig) -> FeeConfig:
+    # The file is updated so that every worker picks up the change.
+    save_fee_config(config_watcher.path, config)
+    config_watcher.reload(force=True)
+
+    return config
+
+
+def openapi() -> dict:
+    """
+    Generates the OpenAPI schema when it is first requested. The route documentation is only built then,
+    so that it does not add to the startup time.
+    """
+    if app.openapi_schema is None:
+        from app.docs import document_routes
+        document_routes(app)
+
+    return FastAPI.openapi(app)
+
+
+app.openapi = openapi
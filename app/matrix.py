@@ -0,0 +1,43 @@
+"""
+Request models of the fee matrix endpoint, which calculates the delivery fees of one or more carts across a list of
+delivery distances, e.g. the fee of a basket from every venue shown on a discovery page.
+
+The fees are calculated with calculate_fee_matrix in app/vectorized.py.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, PositiveInt, model_validator
+
+from app.constants import MAX_MATRIX_CARTS, MAX_MATRIX_DISTANCES
+
+
+class Cart(BaseModel):
+    """
+    Order values that do not depend on the venue: cart value, number of items and time of the order.
+    """
+    cart_value: PositiveInt
+    number_of_items: PositiveInt
+    time: datetime
+
+
+class FeeMatrixRequest(BaseModel):
+    """
+    One cart (cart) or a list of carts (carts), and the delivery distances to calculate the fees for.
+    """
+    cart: Optional[Cart] = None
+    carts: Optional[List[Cart]] = Field(default=None, min_length=1, max_length=MAX_MATRIX_CARTS)
+    delivery_distances: List[PositiveInt] = Field(min_length=1, max_length=MAX_MATRIX_DISTANCES)
+
+    @model_validator(mode="after")
+    def check_carts(self) -> "FeeMatrixRequest":
+        if (self.cart is None) == (self.carts is None):
+            raise ValueError("Give either cart or carts")
+
+        return self
+
+    def cart_rows(self) -> List[Cart]:
+        """
+        :return: Carts of the request, one for each row of the fee matrix
+        """
+        return [self.cart] if self.cart is not None else self.carts
@@ -0,0 +1,176 @@
+"""
+Prometheus-style metrics for the fee calculation, exposed in the Prometheus text format on the metrics endpoint.
+
+Metrics are plain in-process counters updated without locks, so they are cheap enough to leave on under load.
+Increments are not atomic between threads, which at worst loses a count under heavy contention.
+Each worker process of app.serve has its own counters, so the endpoint shows the worker that answered the request.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from app import constants
+from app.cache import quote_cache
+from app.coalesce import request_flights
+from app.schedule import FeeSchedule
+
+enabled: bool = constants.METRICS_ENABLED
+"""
+Metrics are only recorded when enabled.
+"""
+
+
+class Counter:
+    """
+    Counter metric, optionally with one label.
+    """
+
+    def __init__(self, name: str, documentation: str, label: str = ""):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.values: Dict[str, int] = {}
+
+    def inc(self, label_value: str = "", amount: int = 1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for label_value, value in sorted(self.values.items()):
+            labels = f'{{{self.label}="{label_value}"}}' if self.label else ""
+            yield f"{self.name}{labels} {value}"
+
+
+class Histogram:
+    """
+    Histogram metric with fixed bucket upper bounds, optionally with constant labels, e.g. 'stage="decode"'.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...], labels: str = ""):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.labels = labels
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def header(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+
+    def samples(self) -> Iterable[str]:
+        labels = f"{self.labels}," if self.labels else ""
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{{labels}le="{"+Inf" if bound == float("inf") else bound}"}} {cumulative}'
+        labels = f"{{{self.labels}}}" if self.labels else ""
+        yield f"{self.name}_sum{labels} {self.sum}"
+        yield f"{self.name}_count{labels} {cumulative}"
+
+    def collect(self) -> Iterable[str]:
+        yield from self.header()
+        yield from self.samples()
+
+
+request_duration = Histogram(
+    "feecalc_request_duration_seconds",
+    "Handling time of successful fee calculation requests.",
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+validation_failures = Counter(
+    "feecalc_validation_failures_total",
+    "Fee calculation requests or orders that failed validation.",
+)
+fee_calculations = Counter(
+    "fee_calculations_total",
+    "Calculated delivery fees.",
+)
+rule_hits = Counter(
+    "fee_rule_hits_total",
+    "Calculated delivery fees that a fee rule applied to.",
+    "rule",
+)
+distance_tiers = Counter(
+    "fee_distance_tier_total",
+    "Calculated delivery fees by the number of additional distance fees charged.",
+    "tier",
+)
+
+PROFILE_STAGES: Tuple[str, ...] = ("receive", "decode", "validate", "calculate", "serialize")
+"""
+Stages of a fee calculation request timed by the profiling mode (see app/profiling.py).
+"""
+
+stage_durations: Dict[str, Histogram] = {
+    stage: Histogram(
+        "feecalc_stage_duration_seconds",
+        "Time spent in each stage of profiled fee calculation requests.",
+        (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01),
+        f'stage="{stage}"',
+    )
+    for stage in PROFILE_STAGES
+}
+
+
+def observe_fee(schedule: FeeSchedule, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime, fee: int):
+    """
+    Records which fee rules applied to a calculated fee.
+    """
+    if not enabled:
+        return
+
+    fee_calculations.inc()
+    if cart_value >= schedule.free_delivery_threshold:
+        rule_hits.inc("free_delivery")
+        return
+
+    steps = 0
+    if delivery_distance > schedule.base_delivery_fee_distance:
+        steps = -(-(delivery_distance - schedule.base_delivery_fee_distance) // schedule.additional_fee_distance)
+    # Tiers past the maximum fee are counted together, to keep the number of label values bounded.
+    max_tier = -(-(schedule.max_fee - schedule.base_delivery_fee) // schedule.additional_fee)
+    distance_tiers.inc(str(steps) if steps < max_tier else f"{max_tier}+")
+
+    if number_of_items >= schedule.additional_item_limit:
+        rule_hits.inc("item_surcharge")
+    if number_of_items > schedule.bulk_fee_threshold:
+        rule_hits.inc("bulk_fee")
+    if cart_value < schedule.small_order_threshold:
+        rule_hits.inc("small_order_surcharge")
+    if schedule.is_rush_hour(order_time):
+        rule_hits.inc("rush_multiplier")
+    # A fee equal to the maximum fee was only capped if it was higher before the cap, which the breakdown tells.
+    if fee == schedule.max_fee and schedule.breakdown(cart_value, delivery_distance, number_of_items, order_time).max_fee_reduction:
+        rule_hits.inc("max_fee")
+
+
+def render() -> str:
+    """
+    :return: All metrics in the Prometheus text format
+    """
+    cache = quote_cache.info()
+    lines = [
+        *request_duration.collect(),
+        *validation_failures.collect(),
+        *fee_calculations.collect(),
+        *rule_hits.collect(),
+        *distance_tiers.collect(),
+        *stage_durations[PROFILE_STAGES[0]].header(),
+        *(line for histogram in stage_durations.values() for line in histogram.samples()),
+        "# HELP fee_quote_cache_hits_total Fee quotes served from the quote cache.",
+        "# TYPE fee_quote_cache_hits_total counter",
+        f"fee_quote_cache_hits_total {cache['hits']}",
+        "# HELP fee_quote_cache_misses_total Fee quotes calculated because they were not in the quote cache.",
+        "# TYPE fee_quote_cache_misses_total counter",
+        f"fee_quote_cache_misses_total {cache['misses']}",
+        "# HELP feecalc_coalesced_requests_total Fee calculation requests answered with the result of an identical concurrent request.",
+        "# TYPE feecalc_coalesced_requests_total counter",
+        f"feecalc_coalesced_requests_total {request_flights.coalesced}",
+    ]
+    return "\n".join(lines) + "\n"
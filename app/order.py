@@ -1,9 +1,7 @@
-import math
-
 from pydantic import BaseModel, PositiveInt
-from datetime import datetime, time
+from datetime import datetime
 
-from app import constants
+from app.schedule import FeeBreakdown, get_fee_schedule
 
 
 class Order(BaseModel):
@@ -26,7 +24,7 @@ class Order(BaseModel):
 
         :return: True if delivery is free, False if not
         """
-        return self.cart_value >= constants.FREE_DELIVERY_THRESHOLD
+        return get_fee_schedule().free_delivery(self.cart_value)
 
     def calculate_distance_fee(self) -> int:
         """
@@ -42,14 +40,7 @@ class Order(BaseModel):
 
         :return: Distance fee based on the delivery distance
         """
-        fee = constants.BASE_DELIVERY_FEE
-
-        if self.delivery_distance > constants.BASE_DELIVERY_FEE_DISTANCE:
-            additional_distance = self.delivery_distance - constants.BASE_DELIVERY_FEE_DISTANCE
-            additional_fees = math.ceil(additional_distance / constants.ADDITIONAL_FEE_DISTANCE)
-            fee += additional_fees * constants.ADDITIONAL_FEE
-
-        return fee
+        return get_fee_schedule().calculate_distance_fee(self.delivery_distance)
 
     def calculate_small_order_surcharge_fee(self) -> int:
         """
@@ -62,10 +53,7 @@ class Order(BaseModel):
 
         :return: Small order surcharge if applicable
         """
-        if self.cart_value < constants.SMALL_ORDER_THRESHOLD:
-            return constants.SMALL_ORDER_THRESHOLD - self.cart_value
-
-        return 0
+        return get_fee_schedule().calculate_small_order_surcharge_fee(self.cart_value)
 
     def calculate_bulk_fee(self) -> int:
         """
@@ -77,10 +65,7 @@ class Order(BaseModel):
 
         :return: Bulk fee if applicable
         """
-        if self.number_of_items > constants.BULK_FEE_THRESHOLD:
-            return constants.BULK_FEE
-
-        return 0
+        return get_fee_schedule().calculate_bulk_fee(self.number_of_items)
 
     def calculate_item_count_surcharge_fee(self) -> int:
         """
@@ -92,34 +77,23 @@ class Order(BaseModel):
 
         :return: Surcharge fee if applicable
         """
-        if self.number_of_items >= constants.ADDITIONAL_ITEM_LIMIT:
-            extra_items = self.number_of_items - constants.ADDITIONAL_ITEM_LIMIT + 1
-            return extra_items * constants.ADDITIONAL_ITEM_SURCHARGE
-
-        return 0
+        return get_fee_schedule().calculate_item_count_surcharge_fee(self.number_of_items)
 
     def calculate_rush_hour_fees(self, fee: int) -> int:
         """
         Calculates additional fees for orders placed during rush hours.
         Applies a multiplier to the fee for orders within specified rush hour time frames.
 
-        For example, if rush hours time applies, current fee is = 100, and RUSH_MULTIPLIER = 1.2.
-        Then the current delivery fee is multiplied 1.2 * 100 = 120.
+        For example, if rush hours time applies, current fee is = 100, and RUSH_MULTIPLIER_BPS = 12_000 (1.2).
+        Then the current delivery fee is multiplied 1.2 * 100 = 120. The result is rounded half up to whole cents.
 
         :return: Original delivery fee multiplied with rush hour multiplier if applicable
         """
-        is_rush_hour_day: bool = self.time.weekday() == constants.RUSH_DELIVERY_DAY
-        is_within_rush_hours: bool = time(constants.RUSH_DELIVERY_START, 0) <= self.time.time() <= time(
-            constants.RUSH_DELIVERY_END, 0)
-
-        if is_rush_hour_day and is_within_rush_hours:
-            fee *= constants.RUSH_MULTIPLIER
+        return get_fee_schedule().calculate_rush_hour_fees(fee, self.time)
 
-        return fee
-
-    def calculate_delivery_fee(self) -> int:
+    def calculate_fee_breakdown(self) -> FeeBreakdown:
         """
-        Calculates the total delivery fee for the order.
+        Calculates the total delivery fee for the order together with the fee components, in a single pass.
         Maximum limit is set for the delivery fee (constant MAX_FEE), higher fees will not be charged.
 
         Calculates and sums different fees in the following order:
@@ -129,16 +103,14 @@ class Order(BaseModel):
             4. bulk fees
             5. rush hour fees
 
-        :return: Total fee for the delivery, in cents
+        :return: Delivery fee and its components, in cents
         """
-        fee = 0
+        return get_fee_schedule().breakdown(self.cart_value, self.delivery_distance, self.number_of_items, self.time)
 
-        if self.free_delivery():
-            return fee
+    def calculate_delivery_fee(self) -> int:
+        """
+        Calculates the total delivery fee for the order, see calculate_fee_breakdown.
 
-        fee += self.calculate_distance_fee()
-        fee += self.calculate_item_count_surcharge_fee()
-        fee += self.calculate_small_order_surcharge_fee()
-        fee += self.calculate_bulk_fee()
-        fee = self.calculate_rush_hour_fees(fee)
-        return min(fee, constants.MAX_FEE)
+        :return: Total fee for the delivery, in cents
+        """
+        return self.calculate_fee_breakdown().delivery_fee
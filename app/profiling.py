@@ -0,0 +1,134 @@
+"""
+Opt-in profiling of fee calculation requests.
+
+A request is profiled when it is sampled (PROFILE_SAMPLE_RATE) or has the profiling header (PROFILE_HEADER, when
+PROFILE_HEADER_ENABLED). Profiled requests record the time spent in each stage of the request (receiving the body,
+decoding the JSON, validating the order, calculating the fee and serializing the response) in the stage duration
+metrics, and return the timings in the Server-Timing response header. With PROFILE_DIR set, a profiler trace of the
+request is also written to that directory.
+
+When profiling is off, requests only check the module level enabled flag. Sampled requests check the header and
+draw a random number, which costs well under a microsecond.
+"""
+import cProfile
+import importlib.util
+import os
+import random
+import time
+from typing import List, Mapping, Optional, Tuple
+
+from app import constants, metrics
+
+sample_rate: float = constants.PROFILE_SAMPLE_RATE
+header_enabled: bool = constants.PROFILE_HEADER_ENABLED
+server_timing: bool = constants.PROFILE_SERVER_TIMING
+trace_dir: str = constants.PROFILE_DIR
+engine: str = constants.PROFILE_ENGINE
+
+enabled: bool = sample_rate > 0 or header_enabled
+"""
+Requests are only considered for profiling when enabled. Set with configure.
+"""
+
+if engine not in ("cprofile", "pyinstrument"):
+    raise ValueError(f"Unknown profiler {engine!r}, expected cprofile or pyinstrument")
+if engine == "pyinstrument" and importlib.util.find_spec("pyinstrument") is None:
+    raise ImportError("PROFILE_ENGINE is pyinstrument, but the pyinstrument package is not installed")
+
+
+def configure(
+    rate: float = sample_rate,
+    header: bool = header_enabled,
+    timing: bool = server_timing,
+    directory: str = trace_dir,
+):
+    """
+    Changes the profiling settings of this process, e.g. in tests. Settings not given keep their startup values.
+    """
+    global sample_rate, header_enabled, server_timing, trace_dir, enabled
+    sample_rate = rate
+    header_enabled = header
+    server_timing = timing
+    trace_dir = directory
+    enabled = sample_rate > 0 or header_enabled
+
+
+def sampled(headers: Mapping[str, str]) -> bool:
+    """
+    :return: True if the request with the headers should be profiled
+    """
+    if header_enabled and constants.PROFILE_HEADER in headers:
+        return True
+
+    return random.random() < sample_rate
+
+
+class RequestProfile:
+    """
+    Stage timings and the optional profiler trace of one profiled request. Each call of mark ends a stage,
+    timed from the end of the previous stage.
+    """
+    __slots__ = ("stages", "_last", "_profiler")
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+        self._profiler = None
+        self._last = time.perf_counter()
+
+    def start_trace(self):
+        """
+        Starts the profiler if traces are recorded. The profiler is started only after the request body is received,
+        so that the trace does not include other requests handled while this one is waiting.
+        """
+        if not trace_dir:
+            return
+
+        if engine == "pyinstrument":
+            from pyinstrument import Profiler
+            self._profiler = Profiler(async_mode="disabled")
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self._last))
+        self._last = now
+
+    def finish(self) -> Optional[str]:
+        """
+        Stops the profiler and writes its trace, and records the stage timings in the stage duration metrics.
+
+        :return: Server-Timing header value with the stage durations in milliseconds, None if it is turned off
+        """
+        if self._profiler is not None:
+            _write_trace(self._profiler)
+
+        if metrics.enabled:
+            for stage, seconds in self.stages:
+                metrics.stage_durations[stage].observe(seconds)
+
+        if not server_timing:
+            return None
+
+        total = sum(seconds for _, seconds in self.stages)
+        return ", ".join(
+            f"{stage};dur={seconds * 1_000:.3f}" for stage, seconds in self.stages + [("total", total)]
+        )
+
+
+def _write_trace(profiler):
+    """
+    Stops the profiler and writes the trace to the trace directory, named by the process and the time of the request.
+    """
+    os.makedirs(trace_dir, exist_ok=True)
+    name = os.path.join(trace_dir, f"feecalc-{os.getpid()}-{time.time_ns()}")
+    if engine == "pyinstrument":
+        profiler.stop()
+        with open(f"{name}.html", "w") as file:
+            file.write(profiler.output_html())
+    else:
+        profiler.disable()
+        profiler.dump_stats(f"{name}.prof")
@@ -0,0 +1,263 @@
+"""
+Command-line tool for repricing order files offline, e.g. months of order history.
+
+The input file is read in chunks, and the chunks are priced in a pool of worker processes with the same rules and
+validation as the API. Results are written out in input order as soon as they are ready, so memory use does not
+depend on the file size. Each output row has the input columns, the delivery fee and the validation error (if any).
+
+CSV files must have a header row with (at least) the columns cart_value, delivery_distance, number_of_items and
+time, and no line breaks inside fields. Parquet files are supported if pyarrow is installed.
+
+With --history, each order is priced with the fee schedule that was in force at its order time (see app/history.py),
+e.g. to audit past fees. Orders before the first schedule of the history get an error.
+
+Usage:
+    python -m app.reprice orders.csv repriced.csv --workers 8
+    python -m app.reprice orders.csv audited.csv --history fee_history.json
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+from pydantic import ValidationError
+
+from app.config import load_fee_config
+from app.fastpath import parse_datetime
+from app.history import FeeHistory, NoScheduleError, load_fee_history
+from app.order import Order
+from app.schedule import FeeSchedule, get_fee_schedule
+
+FIELDS = ("cart_value", "delivery_distance", "number_of_items", "time")
+"""
+Order columns that must be present in the input file.
+"""
+
+OUTPUT_FIELDS = ("delivery_fee", "error")
+"""
+Columns added to the output file.
+"""
+
+DEFAULT_CHUNK_SIZE: int = 50_000
+
+Pricing = Union[FeeSchedule, FeeHistory]
+"""
+Fee schedule, or fee history that prices each order with the schedule in force at its order time.
+"""
+
+
+def _positive_int(value: Any) -> Optional[int]:
+    if type(value) is int:
+        return value if value > 0 else None
+    if type(value) is str and value.isdigit() and value.isascii():
+        value = int(value)
+        return value if value > 0 else None
+
+    return None
+
+
+def _order_time(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if type(value) is str:
+        return parse_datetime(value)
+
+    return None
+
+
+def price_order(schedule: Pricing, cart_value: Any, delivery_distance: Any, number_of_items: Any, order_time: Any) -> Tuple[Any, str]:
+    """
+    Validates and prices a single order from an order file with the fee schedule or history. Values that are not plain
+    positive integers and RFC 3339 times are validated with Order, so the same values are accepted as in the API.
+
+    :return: Delivery fee and an empty error, or None and the validation errors of the order
+    """
+    values = (_positive_int(cart_value), _positive_int(delivery_distance), _positive_int(number_of_items), _order_time(order_time))
+    if None in values:
+        try:
+            order = Order.model_validate(dict(zip(FIELDS, (cart_value, delivery_distance, number_of_items, order_time))))
+        except ValidationError as e:
+            return None, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        values = (order.cart_value, order.delivery_distance, order.number_of_items, order.time)
+
+    try:
+        return schedule.calculate(*values), ""
+    except NoScheduleError as e:
+        return None, f"time: {e}"
+
+
+def reprice_csv_lines(schedule: Pricing, header: List[str], lines: List[str]) -> Tuple[str, int, int]:
+    """
+    Prices a chunk of CSV lines. Runs in the worker processes.
+
+    :return: Output CSV lines, number of rows and number of invalid rows
+    """
+    columns = [header.index(field) for field in FIELDS]
+    output = io.StringIO()
+    writer = csv.writer(output, lineterminator="\n")
+    invalid = 0
+
+    rows = list(csv.reader(lines))
+    for row in rows:
+        if len(row) != len(header):
+            fee, error = None, f"Row should have {len(header)} columns, has {len(row)}"
+        else:
+            fee, error = price_order(schedule, *(row[column] for column in columns))
+
+        if error:
+            invalid += 1
+        writer.writerow(row + ["" if fee is None else fee, error])
+
+    return output.getvalue(), len(rows), invalid
+
+
+def reprice_columns(schedule: Pricing, columns: dict) -> Tuple[dict, int, int]:
+    """
+    Prices a chunk of orders given as columns, e.g. a Parquet record batch. Runs in the worker processes.
+
+    :return: Input columns with the output columns added, number of rows and number of invalid rows
+    """
+    fees = []
+    errors = []
+    for values in zip(*(columns[field] for field in FIELDS)):
+        fee, error = price_order(schedule, *values)
+        fees.append(fee)
+        errors.append(error or None)
+
+    invalid = len(errors) - errors.count(None)
+    return {**columns, "delivery_fee": fees, "error": errors}, len(fees), invalid
+
+
+def _ordered_results(executor: Optional[Executor], function: Callable, chunks: Iterable[tuple], window: int) -> Iterator:
+    """
+    Runs the function for each chunk in the executor, and yields the results in the input order.
+    At most window chunks are in flight at a time, so reading the input does not get ahead of the workers.
+    Without an executor the chunks are processed in the current process.
+    """
+    if executor is None:
+        for chunk in chunks:
+            yield function(*chunk)
+        return
+
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(function, *chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+
+    while pending:
+        yield pending.popleft().result()
+
+
+def _reprice_csv(schedule: Pricing, input_path: str, output_path: str, executor: Optional[Executor], chunk_size: int, window: int) -> Tuple[int, int]:
+    rows = invalid = 0
+
+    with open(input_path, newline="") as input_file, open(output_path, "w", newline="") as output_file:
+        first_line = next(input_file, None)
+        if first_line is None:
+            raise ValueError(f"Input file {input_path} is empty")
+        header = next(csv.reader([first_line]))
+        missing = [field for field in FIELDS if field not in header]
+        if missing:
+            raise ValueError(f"Input file is missing columns: {', '.join(missing)}")
+
+        csv.writer(output_file, lineterminator="\n").writerow(header + list(OUTPUT_FIELDS))
+        chunks = ((schedule, header, lines) for lines in iter(lambda: list(islice(input_file, chunk_size)), []))
+
+        for output, chunk_rows, chunk_invalid in _ordered_results(executor, reprice_csv_lines, chunks, window):
+            output_file.write(output)
+            rows += chunk_rows
+            invalid += chunk_invalid
+
+    return rows, invalid
+
+
+def _reprice_parquet(schedule: Pricing, input_path: str, output_path: str, executor: Optional[Executor], chunk_size: int, window: int) -> Tuple[int, int]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Parquet files require pyarrow, install it with: pip install pyarrow")
+
+    rows = invalid = 0
+    input_file = pq.ParquetFile(input_path)
+    missing = [field for field in FIELDS if field not in input_file.schema_arrow.names]
+    if missing:
+        raise ValueError(f"Input file is missing columns: {', '.join(missing)}")
+
+    schema = input_file.schema_arrow.append(pa.field("delivery_fee", pa.int64())).append(pa.field("error", pa.string()))
+    chunks = ((schedule, batch.to_pydict()) for batch in input_file.iter_batches(batch_size=chunk_size))
+
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for output, chunk_rows, chunk_invalid in _ordered_results(executor, reprice_columns, chunks, window):
+            writer.write_table(pa.Table.from_pydict(output, schema=schema))
+            rows += chunk_rows
+            invalid += chunk_invalid
+
+    return rows, invalid
+
+
+def reprice(
+    input_path: str,
+    output_path: str,
+    workers: int = 1,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    schedule: Optional[Pricing] = None,
+) -> Tuple[int, int]:
+    """
+    Reprices the orders in the input file and writes them with the delivery fees to the output file.
+    The file format (CSV or Parquet) is chosen by the input file extension, and the output is written in the same format.
+    Fees are calculated with the given fee schedule or history, or the active fee schedule if not given.
+
+    :return: Number of rows and number of invalid rows
+    """
+    schedule = schedule or get_fee_schedule()
+    reprice_file = _reprice_parquet if input_path.endswith(".parquet") else _reprice_csv
+
+    if workers <= 1:
+        return reprice_file(schedule, input_path, output_path, None, chunk_size, 1)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return reprice_file(schedule, input_path, output_path, executor, chunk_size, 2 * workers)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.reprice", description="Reprice orders in a CSV or Parquet file.")
+    parser.add_argument("input", help="input order file (.csv or .parquet)")
+    parser.add_argument("output", help="output file, written in the same format as the input")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes (default: number of CPUs)")
+    pricing = parser.add_mutually_exclusive_group()
+    pricing.add_argument("--config", help="fee configuration file (default: the fee constants)")
+    pricing.add_argument("--history", help="fee history file, prices each order with the fee schedule in force at its time")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help=f"rows per chunk (default: {DEFAULT_CHUNK_SIZE})")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        schedule = None
+        if args.config:
+            schedule = load_fee_config(args.config)
+        elif args.history:
+            schedule = load_fee_history(args.history)
+        rows, invalid = reprice(args.input, args.output, args.workers, args.chunk_size, schedule)
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    seconds = time.perf_counter() - start
+    print(
+        f"Repriced {rows} rows ({invalid} invalid) in {seconds:.2f} s, {rows / seconds:,.0f} rows/s with {args.workers} workers",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Weekly rush hour calendar with multiple rush windows, each with its own multiplier and timezone.
+
+Windows are compiled into sorted interval boundaries per timezone and weekday, so resolving an order time to a
+multiplier is a list lookup by weekday and a binary search over the times of the day, instead of comparing the order
+time against every window.
+"""
+from bisect import bisect_right
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+from app import constants
+
+
+class RushWindow(BaseModel):
+    """
+    Rush hour window on one weekday (0 is Monday). Orders from start to end, both inclusive, are multiplied with
+    the multiplier. A window with an end before its start continues past midnight to the next day.
+
+    Without a timezone the window applies to the wall-clock time of the order time as given, with a timezone
+    the order time is converted to that timezone first (order times without timezone information are taken as UTC).
+    """
+    model_config = ConfigDict(extra="forbid", frozen=True)
+
+    weekday: int = Field(ge=0, le=6)
+    start: time
+    end: time
+    multiplier_bps: int = Field(ge=constants.MIN_CONFIG_RUSH_MULTIPLIER_BPS, le=constants.MAX_CONFIG_RUSH_MULTIPLIER_BPS)
+    timezone: Optional[str] = None
+
+    @field_validator("start", "end")
+    @classmethod
+    def check_naive_time(cls, value: time) -> time:
+        if value.tzinfo is not None:
+            raise ValueError("Rush window times must not have a UTC offset, set the timezone of the window instead")
+
+        return value
+
+    @field_validator("timezone")
+    @classmethod
+    def check_timezone(cls, value: Optional[str]) -> Optional[str]:
+        if value is not None:
+            try:
+                ZoneInfo(value)
+            except (ZoneInfoNotFoundError, ValueError):
+                raise ValueError(f"Unknown IANA timezone {value!r}")
+
+        return value
+
+
+def _next_microsecond(t: time) -> Optional[time]:
+    """
+    :return: Time one microsecond later, None at the end of the day
+    """
+    if t == time.max:
+        return None
+
+    return (datetime.combine(datetime.min, t) + timedelta(microseconds=1)).time()
+
+
+class RushCalendar:
+    """
+    Rush windows compiled for fast multiplier lookups. Windows in the same timezone must not overlap.
+    If windows in different timezones overlap, the highest multiplier applies.
+
+    For every timezone, each weekday has the sorted times where the multiplier changes and the multiplier from each
+    of them on, or None if there are no rush windows on that weekday. When all windows are on the wall-clock time
+    of the order time, these days are also available as wall_clock_days, so that hot paths can inline the lookup.
+    """
+    __slots__ = ("windows", "min_multiplier_bps", "wall_clock_days", "_zones")
+
+    def __init__(self, windows: Sequence[RushWindow]):
+        self.windows: Tuple[RushWindow, ...] = tuple(windows)
+        self.min_multiplier_bps: int = min((window.multiplier_bps for window in self.windows), default=constants.BASIS_POINTS)
+
+        # Rush intervals from start to end (exclusive, None at the end of the day) by timezone and weekday.
+        intervals: Dict[Optional[str], List[List[Tuple[time, Optional[time], int]]]] = {}
+        for window in self.windows:
+            days = intervals.setdefault(window.timezone, [[] for _ in range(7)])
+            end = _next_microsecond(window.end)
+            if end is None or window.start < end:
+                days[window.weekday].append((window.start, end, window.multiplier_bps))
+            else:
+                # Windows past midnight continue on the next day, Sunday night windows on Monday.
+                days[window.weekday].append((window.start, None, window.multiplier_bps))
+                days[(window.weekday + 1) % 7].append((time.min, end, window.multiplier_bps))
+
+        self._zones = []
+        for name, days in intervals.items():
+            compiled_days: List[Optional[Tuple[List[time], List[int]]]] = []
+            for day_intervals in days:
+                if not day_intervals:
+                    compiled_days.append(None)
+                    continue
+
+                boundaries = [time.min]
+                multipliers = [0]
+                for start, end, multiplier_bps in sorted(day_intervals, key=lambda interval: interval[0]):
+                    if boundaries[-1] is None or start < boundaries[-1]:
+                        raise ValueError(f"Rush windows overlap in timezone {name or 'of the order time'}")
+                    if start == boundaries[-1]:
+                        multipliers[-1] = multiplier_bps
+                    else:
+                        boundaries.append(start)
+                        multipliers.append(multiplier_bps)
+                    boundaries.append(end)
+                    multipliers.append(0)
+                if boundaries[-1] is None:
+                    del boundaries[-1], multipliers[-1]
+                compiled_days.append((boundaries, multipliers))
+
+            self._zones.append((ZoneInfo(name) if name else None, compiled_days))
+
+        self.wall_clock_days: Optional[List[Optional[Tuple[List[time], List[int]]]]] = None
+        if not self._zones:
+            self.wall_clock_days = [None] * 7
+        elif len(self._zones) == 1 and self._zones[0][0] is None:
+            self.wall_clock_days = self._zones[0][1]
+
+    @classmethod
+    def single_window(cls, weekday: int, start_hour: int, end_hour: int, multiplier_bps: int) -> "RushCalendar":
+        """
+        :return: Calendar with one rush window on the wall-clock time of the order time, like the rush hour constants
+        """
+        return cls([RushWindow(weekday=weekday, start=time(start_hour), end=time(end_hour), multiplier_bps=multiplier_bps)])
+
+    def multiplier_bps(self, order_time: datetime) -> int:
+        """
+        Resolves the order time to the rush hour multiplier.
+
+        :return: Rush hour multiplier in basis points, 0 if the order time is not in a rush window
+        """
+        multiplier_bps = 0
+        for zone, days in self._zones:
+            local_time = order_time
+            if zone is not None:
+                local_time = (order_time if order_time.tzinfo else order_time.replace(tzinfo=timezone.utc)).astimezone(zone)
+
+            day = days[local_time.weekday()]
+            if day is None:
+                continue
+
+            zone_multiplier_bps = day[1][bisect_right(day[0], local_time.time()) - 1]
+            if zone_multiplier_bps > multiplier_bps:
+                multiplier_bps = zone_multiplier_bps
+
+        return multiplier_bps
@@ -0,0 +1,409 @@
+from bisect import bisect_right
+from datetime import datetime, time
+from typing import Callable, List, Optional, Sequence
+
+from app import constants
+from app.rush import RushCalendar, RushWindow
+
+_HALF_BASIS_POINT = constants.BASIS_POINTS // 2
+
+
+class FeeBreakdown:
+    """
+    Delivery fee of an order split into its components, in cents, e.g. for receipts.
+
+    The components add up to the delivery fee: distance_fee + item_surcharge + small_order_surcharge + bulk_fee
+    + rush_fee - max_fee_reduction. rush_fee is what the rush hour multiplier added to the other components,
+    and max_fee_reduction what the maximum fee took off the total.
+    """
+    __slots__ = (
+        "free_delivery",
+        "distance_fee",
+        "item_surcharge",
+        "small_order_surcharge",
+        "bulk_fee",
+        "rush_multiplier_bps",
+        "rush_fee",
+        "max_fee_reduction",
+        "delivery_fee",
+    )
+
+    def __init__(
+        self,
+        free_delivery: bool,
+        distance_fee: int,
+        item_surcharge: int,
+        small_order_surcharge: int,
+        bulk_fee: int,
+        rush_multiplier_bps: int,
+        rush_fee: int,
+        max_fee_reduction: int,
+        delivery_fee: int,
+    ):
+        self.free_delivery = free_delivery
+        self.distance_fee = distance_fee
+        self.item_surcharge = item_surcharge
+        self.small_order_surcharge = small_order_surcharge
+        self.bulk_fee = bulk_fee
+        self.rush_multiplier_bps = rush_multiplier_bps
+        self.rush_fee = rush_fee
+        self.max_fee_reduction = max_fee_reduction
+        self.delivery_fee = delivery_fee
+
+    @property
+    def max_fee_applied(self) -> bool:
+        return self.max_fee_reduction > 0
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, FeeBreakdown):
+            return NotImplemented
+
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"FeeBreakdown({', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)})"
+
+    def to_dict(self) -> dict:
+        """
+        :return: Components of the fee by name, including whether the maximum fee was applied
+        """
+        return {
+            "free_delivery": self.free_delivery,
+            "distance_fee": self.distance_fee,
+            "item_surcharge": self.item_surcharge,
+            "small_order_surcharge": self.small_order_surcharge,
+            "bulk_fee": self.bulk_fee,
+            "rush_multiplier_bps": self.rush_multiplier_bps,
+            "rush_fee": self.rush_fee,
+            "max_fee_applied": self.max_fee_reduction > 0,
+            "max_fee_reduction": self.max_fee_reduction,
+        }
+
+
+_FREE_DELIVERY = FeeBreakdown(True, 0, 0, 0, 0, 0, 0, 0, 0)
+
+
+class FeeSchedule:
+    """
+    Delivery fee rules compiled once from the constants, so calculating a fee does not need to
+    look up module globals or build new objects for every order.
+
+    The calculate method is a fast path for callers that already have validated values and want to skip
+    constructing an Order.
+    """
+    __slots__ = (
+        "base_delivery_fee",
+        "base_delivery_fee_distance",
+        "additional_fee",
+        "additional_fee_distance",
+        "additional_item_limit",
+        "additional_item_surcharge",
+        "max_fee",
+        "rush_multiplier_bps",
+        "rush_delivery_day",
+        "rush_start",
+        "rush_end",
+        "free_delivery_threshold",
+        "small_order_threshold",
+        "bulk_fee_threshold",
+        "bulk_fee",
+        "rush_windows",
+        "rush_calendar",
+    )
+
+    def __init__(
+        self,
+        base_delivery_fee: int,
+        base_delivery_fee_distance: int,
+        additional_fee: int,
+        additional_fee_distance: int,
+        additional_item_limit: int,
+        additional_item_surcharge: int,
+        max_fee: int,
+        rush_multiplier_bps: int,
+        rush_delivery_day: int,
+        rush_delivery_start: int,
+        rush_delivery_end: int,
+        free_delivery_threshold: int,
+        small_order_threshold: int,
+        bulk_fee_threshold: int,
+        bulk_fee: int,
+        rush_windows: Optional[Sequence[RushWindow]] = None,
+    ):
+        self.base_delivery_fee = base_delivery_fee
+        self.base_delivery_fee_distance = base_delivery_fee_distance
+        self.additional_fee = additional_fee
+        self.additional_fee_distance = additional_fee_distance
+        self.additional_item_limit = additional_item_limit
+        self.additional_item_surcharge = additional_item_surcharge
+        self.max_fee = max_fee
+        self.rush_multiplier_bps = rush_multiplier_bps
+        self.rush_delivery_day = rush_delivery_day
+        self.rush_start = time(rush_delivery_start, 0)
+        self.rush_end = time(rush_delivery_end, 0)
+        self.free_delivery_threshold = free_delivery_threshold
+        self.small_order_threshold = small_order_threshold
+        self.bulk_fee_threshold = bulk_fee_threshold
+        self.bulk_fee = bulk_fee
+        # Rush windows replace the single rush hour window from the rush delivery day, start, end and multiplier.
+        self.rush_windows = tuple(rush_windows) if rush_windows is not None else None
+        if self.rush_windows is not None:
+            self.rush_calendar = RushCalendar(self.rush_windows)
+        else:
+            self.rush_calendar = RushCalendar.single_window(
+                rush_delivery_day, rush_delivery_start, rush_delivery_end, rush_multiplier_bps,
+            )
+
+    @classmethod
+    def from_constants(cls) -> "FeeSchedule":
+        """
+        Builds the fee schedule from the current values in the constants module.
+
+        :return: Fee schedule matching the constants
+        """
+        return cls(
+            base_delivery_fee=constants.BASE_DELIVERY_FEE,
+            base_delivery_fee_distance=constants.BASE_DELIVERY_FEE_DISTANCE,
+            additional_fee=constants.ADDITIONAL_FEE,
+            additional_fee_distance=constants.ADDITIONAL_FEE_DISTANCE,
+            additional_item_limit=constants.ADDITIONAL_ITEM_LIMIT,
+            additional_item_surcharge=constants.ADDITIONAL_ITEM_SURCHARGE,
+            max_fee=constants.MAX_FEE,
+            rush_multiplier_bps=constants.RUSH_MULTIPLIER_BPS,
+            rush_delivery_day=constants.RUSH_DELIVERY_DAY,
+            rush_delivery_start=constants.RUSH_DELIVERY_START,
+            rush_delivery_end=constants.RUSH_DELIVERY_END,
+            free_delivery_threshold=constants.FREE_DELIVERY_THRESHOLD,
+            small_order_threshold=constants.SMALL_ORDER_THRESHOLD,
+            bulk_fee_threshold=constants.BULK_FEE_THRESHOLD,
+            bulk_fee=constants.BULK_FEE,
+        )
+
+    def free_delivery(self, cart_value: int) -> bool:
+        """
+        See Order.free_delivery.
+
+        :return: True if delivery is free, False if not
+        """
+        return cart_value >= self.free_delivery_threshold
+
+    def calculate_distance_fee(self, delivery_distance: int) -> int:
+        """
+        See Order.calculate_distance_fee.
+
+        :return: Distance fee based on the delivery distance
+        """
+        if delivery_distance > self.base_delivery_fee_distance:
+            additional_fees = -(-(delivery_distance - self.base_delivery_fee_distance) // self.additional_fee_distance)
+            return self.base_delivery_fee + additional_fees * self.additional_fee
+
+        return self.base_delivery_fee
+
+    def calculate_small_order_surcharge_fee(self, cart_value: int) -> int:
+        """
+        See Order.calculate_small_order_surcharge_fee.
+
+        :return: Small order surcharge if applicable
+        """
+        if cart_value < self.small_order_threshold:
+            return self.small_order_threshold - cart_value
+
+        return 0
+
+    def calculate_bulk_fee(self, number_of_items: int) -> int:
+        """
+        See Order.calculate_bulk_fee.
+
+        :return: Bulk fee if applicable
+        """
+        if number_of_items > self.bulk_fee_threshold:
+            return self.bulk_fee
+
+        return 0
+
+    def calculate_item_count_surcharge_fee(self, number_of_items: int) -> int:
+        """
+        See Order.calculate_item_count_surcharge_fee.
+
+        :return: Surcharge fee if applicable
+        """
+        if number_of_items >= self.additional_item_limit:
+            return (number_of_items - self.additional_item_limit + 1) * self.additional_item_surcharge
+
+        return 0
+
+    def is_rush_hour(self, order_time: datetime) -> bool:
+        """
+        Checks if the order time is within the rush hours.
+
+        :return: True if the rush hour multiplier applies, False if not
+        """
+        return self.rush_calendar.multiplier_bps(order_time) > 0
+
+    @staticmethod
+    def apply_rush_multiplier(fee: int, multiplier_bps: int) -> int:
+        """
+        Multiplies the fee with a rush hour multiplier in integer basis points, rounding half up to whole cents.
+
+        :return: Fee multiplied with the rush hour multiplier
+        """
+        return (fee * multiplier_bps + _HALF_BASIS_POINT) // constants.BASIS_POINTS
+
+    def calculate_rush_hour_fees(self, fee: int, order_time: datetime) -> int:
+        """
+        See Order.calculate_rush_hour_fees.
+
+        :return: Delivery fee multiplied with rush hour multiplier if applicable
+        """
+        multiplier_bps = self.rush_calendar.multiplier_bps(order_time)
+        if multiplier_bps:
+            return self.apply_rush_multiplier(fee, multiplier_bps)
+
+        return fee
+
+    def saturation_fee(self) -> int:
+        """
+        Smallest fee that is charged as the maximum fee even if the rush hour multiplier is below 1. The fee components
+        only grow with the order values, so calculations can clamp fees to this value without changing the result.
+
+        :return: Saturation fee, in cents
+        """
+        return max(
+            self.max_fee,
+            -(-(self.max_fee * constants.BASIS_POINTS - _HALF_BASIS_POINT) // self.rush_calendar.min_multiplier_bps),
+        )
+
+    def quote_key(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> tuple:
+        """
+        Normalizes the order values to the parts the fee depends on: the number of additional distance steps,
+        the number of surcharged items, whether the bulk fee applies, the cart value up to the small order threshold
+        and the rush hour multiplier that applies. Orders with the same key have the same fee,
+        unless they qualify for free delivery.
+
+        :return: Normalized order key
+        """
+        if delivery_distance > self.base_delivery_fee_distance:
+            distance_steps = -(-(delivery_distance - self.base_delivery_fee_distance) // self.additional_fee_distance)
+        else:
+            distance_steps = 0
+
+        return (
+            distance_steps,
+            max(number_of_items - self.additional_item_limit + 1, 0),
+            number_of_items > self.bulk_fee_threshold,
+            min(cart_value, self.small_order_threshold),
+            self.rush_calendar.multiplier_bps(order_time),
+        )
+
+    def calculate(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> int:
+        """
+        Calculates the total delivery fee for already validated order values, see Order.calculate_delivery_fee.
+
+        :return: Total fee for the delivery, in cents
+        """
+        if cart_value >= self.free_delivery_threshold:
+            return 0
+
+        fee = self.calculate_distance_fee(delivery_distance)
+        if number_of_items >= self.additional_item_limit:
+            fee += (number_of_items - self.additional_item_limit + 1) * self.additional_item_surcharge
+        if cart_value < self.small_order_threshold:
+            fee += self.small_order_threshold - cart_value
+        if number_of_items > self.bulk_fee_threshold:
+            fee += self.bulk_fee
+
+        # Same as rush_calendar.multiplier_bps, inlined for rush windows on the wall-clock time of the order.
+        wall_clock_days = self.rush_calendar.wall_clock_days
+        if wall_clock_days is None:
+            multiplier_bps = self.rush_calendar.multiplier_bps(order_time)
+        else:
+            day = wall_clock_days[order_time.weekday()]
+            multiplier_bps = day[1][bisect_right(day[0], order_time.time()) - 1] if day is not None else 0
+        if multiplier_bps:
+            fee = (fee * multiplier_bps + _HALF_BASIS_POINT) // constants.BASIS_POINTS
+
+        return min(fee, self.max_fee)
+
+    def breakdown(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> FeeBreakdown:
+        """
+        Calculates the delivery fee and its components in one pass, with the same rules as calculate.
+
+        :return: Delivery fee split into its components
+        """
+        if cart_value >= self.free_delivery_threshold:
+            return _FREE_DELIVERY
+
+        distance_fee = self.base_delivery_fee
+        if delivery_distance > self.base_delivery_fee_distance:
+            distance_fee += -(-(delivery_distance - self.base_delivery_fee_distance) // self.additional_fee_distance) * self.additional_fee
+        item_surcharge = 0
+        if number_of_items >= self.additional_item_limit:
+            item_surcharge = (number_of_items - self.additional_item_limit + 1) * self.additional_item_surcharge
+        small_order_surcharge = 0
+        if cart_value < self.small_order_threshold:
+            small_order_surcharge = self.small_order_threshold - cart_value
+        bulk_fee = self.bulk_fee if number_of_items > self.bulk_fee_threshold else 0
+        fee = distance_fee + item_surcharge + small_order_surcharge + bulk_fee
+
+        wall_clock_days = self.rush_calendar.wall_clock_days
+        if wall_clock_days is None:
+            multiplier_bps = self.rush_calendar.multiplier_bps(order_time)
+        else:
+            day = wall_clock_days[order_time.weekday()]
+            multiplier_bps = day[1][bisect_right(day[0], order_time.time()) - 1] if day is not None else 0
+        rush_fee = 0
+        if multiplier_bps:
+            rush_fee = (fee * multiplier_bps + _HALF_BASIS_POINT) // constants.BASIS_POINTS - fee
+            fee += rush_fee
+
+        max_fee_reduction = 0
+        if fee > self.max_fee:
+            max_fee_reduction = fee - self.max_fee
+            fee = self.max_fee
+
+        return FeeBreakdown(
+            False,
+            distance_fee,
+            item_surcharge,
+            small_order_surcharge,
+            bulk_fee,
+            multiplier_bps,
+            rush_fee,
+            max_fee_reduction,
+            fee,
+        )
+
+
+_active_schedule: FeeSchedule = FeeSchedule.from_constants()
+
+_schedule_listeners: List[Callable[[FeeSchedule], None]] = []
+
+
+def get_fee_schedule() -> FeeSchedule:
+    """
+    Returns the fee schedule currently in use. Callers that calculate several values for the same order or request
+    should get the schedule once and use it for all of them, so a schedule swap does not change rules midway.
+
+    :return: Active fee schedule
+    """
+    return _active_schedule
+
+
+def set_fee_schedule(schedule: FeeSchedule):
+    """
+    Replaces the active fee schedule. The swap is a single reference assignment, so it is atomic:
+    calculations started with the previous schedule finish with it, and new calculations use the new one.
+    The schedule listeners are called before the swap.
+    """
+    global _active_schedule
+    for listener in _schedule_listeners:
+        listener(schedule)
+    _active_schedule = schedule
+
+
+def add_schedule_listener(listener: Callable[[FeeSchedule], None]):
+    """
+    Registers a function that is called with every new fee schedule before it becomes active, e.g. to prepare
+    data derived from the schedule before the first request uses it.
+    """
+    _schedule_listeners.append(listener)
@@ -0,0 +1,223 @@
+"""
+Production server launcher. Runs the API in multiple uvicorn worker processes supervised by this process.
+
+- The number of workers defaults to the number of CPUs.
+- uvloop and httptools are used when they are installed, otherwise the asyncio event loop and h11.
+- With --reuse-port every worker binds its own SO_REUSEPORT socket and the kernel balances connections between
+  them. Otherwise the workers share one listening socket.
+- Workers are restarted after --max-requests requests (with up to --max-requests-jitter extra, so that the workers
+  do not all restart at once), and whenever a worker exits unexpectedly. A stopping worker first stops accepting
+  connections and answers requests on the connections it has already accepted, see WorkerServer.
+- SIGTERM and SIGINT shut down gracefully: workers stop accepting connections and finish in-flight requests, and
+  workers still running after --graceful-timeout seconds are killed.
+- Each worker has its own fee quote cache, lookup tables, metrics and counters (unless the quote cache is shared with
+  SHARED_QUOTE_CACHE_PATH), so GET /metrics shows the worker that happened to answer it, not the whole server.
+- Idle keep-alive connections are closed after --keep-alive-timeout seconds. Pipelined HTTP/1.1 requests are answered
+  in order, one at a time per connection, and --limit-concurrency answers requests over the limit with 503.
+
+Usage:
+    python -m app.serve --host 0.0.0.0 --port 8000 --workers 16
+"""
+import argparse
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+from typing import List, Optional
+
+import uvicorn
+
+APP = "app.main:app"
+
+DEFAULT_GRACEFUL_TIMEOUT: float = 30.0
+
+DEFAULT_KEEP_ALIVE_TIMEOUT: int = 5
+
+ACCEPTED_CONNECTION_GRACE: float = 0.5
+
+logger = logging.getLogger("app.serve")
+
+
+def event_loop() -> str:
+    """
+    :return: uvicorn event loop implementation, uvloop if installed
+    """
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    """
+    :return: uvicorn HTTP protocol implementation, httptools if installed
+    """
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def bind_socket(host: str, port: int, reuse_port: bool) -> socket.socket:
+    """
+    :return: Listening socket bound to the address, with SO_REUSEPORT if reuse_port is set
+    """
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_config(args: argparse.Namespace) -> uvicorn.Config:
+    """
+    :return: uvicorn configuration for one worker process
+    """
+    max_requests = None
+    if args.max_requests > 0:
+        max_requests = args.max_requests + random.randint(0, args.max_requests_jitter)
+
+    return uvicorn.Config(
+        APP,
+        loop=event_loop(),
+        http=http_protocol(),
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        timeout_keep_alive=args.keep_alive_timeout,
+        limit_concurrency=args.limit_concurrency or None,
+        backlog=args.backlog,
+        log_level=args.log_level,
+        access_log=False,
+    )
+
+
+class WorkerServer(uvicorn.Server):
+    """
+    uvicorn server that stops accepting connections before it shuts down the open ones. uvicorn closes connections
+    that have not sent a request yet right away, which drops the first request of a connection accepted just before
+    the shutdown. The server waits ACCEPTED_CONNECTION_GRACE seconds in between, so those requests are read and
+    answered like other in-flight requests.
+    """
+
+    async def shutdown(self, sockets: Optional[List[socket.socket]] = None):
+        for server in self.servers:
+            server.close()
+        await asyncio.sleep(ACCEPTED_CONNECTION_GRACE)
+        await super().shutdown(sockets)
+
+
+def run_worker(args: argparse.Namespace, sock: Optional[socket.socket]):
+    """
+    Worker process entry point. Serves requests until the worker is stopped or has served its maximum requests.
+    """
+    if sock is None:
+        sock = bind_socket(args.host, args.port, reuse_port=True)
+    WorkerServer(worker_config(args)).run(sockets=[sock])
+
+
+class Supervisor:
+    """
+    Starts the worker processes, replaces workers that exit, and stops them on shutdown.
+    """
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.context = multiprocessing.get_context("spawn")
+        self.sock = None if args.reuse_port else bind_socket(args.host, args.port, reuse_port=False)
+        self.workers: List[multiprocessing.Process] = []
+        self.should_exit = threading.Event()
+
+    def start_worker(self) -> multiprocessing.Process:
+        process = self.context.Process(target=run_worker, args=(self.args, self.sock), daemon=False)
+        process.start()
+        return process
+
+    def handle_exit(self, signum, frame):
+        self.should_exit.set()
+
+    def run(self):
+        if self.args.reuse_port:
+            # Bind once before starting the workers, so that an address in use fails here and not in every worker.
+            bind_socket(self.args.host, self.args.port, reuse_port=True).close()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, self.handle_exit)
+
+        logger.info(
+            "Starting %d workers on %s:%d (loop %s, http %s, reuse port %s)",
+            self.args.workers, self.args.host, self.args.port, event_loop(), http_protocol(), self.args.reuse_port,
+        )
+        self.workers = [self.start_worker() for _ in range(self.args.workers)]
+
+        while not self.should_exit.wait(0.5):
+            for i, process in enumerate(self.workers):
+                if not process.is_alive():
+                    logger.info("Worker %d exited with code %s, restarting", process.pid, process.exitcode)
+                    self.workers[i] = self.start_worker()
+
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Shutting down %d workers", len(self.workers))
+        for process in self.workers:
+            if process.is_alive():
+                process.terminate()
+        for process in self.workers:
+            process.join(self.args.graceful_timeout + 1)
+            if process.is_alive():
+                logger.warning("Worker %d did not stop in time, killing it", process.pid)
+                process.kill()
+                process.join()
+
+        if self.sock is not None:
+            self.sock.close()
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m app.serve", description="Run the delivery fee API with multiple workers.")
+    parser.add_argument("--host", default="127.0.0.1", help="bind address (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8000, help="bind port (default: 8000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--reuse-port", action="store_true", help="bind a separate SO_REUSEPORT socket in every worker")
+    parser.add_argument("--max-requests", type=int, default=0, help="restart a worker after this many requests (default: never)")
+    parser.add_argument("--max-requests-jitter", type=int, default=0, help="random extra requests added to --max-requests per worker")
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=DEFAULT_GRACEFUL_TIMEOUT,
+        help=f"seconds to wait for in-flight requests on shutdown (default: {DEFAULT_GRACEFUL_TIMEOUT:g})",
+    )
+    parser.add_argument(
+        "--keep-alive-timeout",
+        type=int,
+        default=DEFAULT_KEEP_ALIVE_TIMEOUT,
+        help=f"seconds to keep idle connections open, set it longer than the idle timeout of the load balancer "
+             f"(default: {DEFAULT_KEEP_ALIVE_TIMEOUT})",
+    )
+    parser.add_argument(
+        "--limit-concurrency",
+        type=int,
+        default=0,
+        help="maximum number of connections and in-flight requests per worker, more are answered with 503 (default: no limit)",
+    )
+    parser.add_argument("--backlog", type=int, default=2048, help="maximum number of pending connections (default: 2048)")
+    parser.add_argument("--log-level", default="info", choices=("critical", "error", "warning", "info", "debug"))
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format="%(levelname)s:     %(message)s")
+    if args.workers < 1:
+        print("error: --workers must be at least 1", file=sys.stderr)
+        return 1
+
+    Supervisor(args).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,57 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 
+from app.compression import CompressionMiddleware
+from app.config import config_watcher
+from app.constants import BINARY_HOST, BINARY_PORT, COMPRESSION_ENABLED, DOCS_ENABLED
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Loads the fee configuration file, if one is configured, and watches it for changes while the server is running.
+    Serves the binary fee protocol next to the HTTP API, if BINARY_PORT is set.
+    """
+    watcher = None
+    if config_watcher is not None:
+        config_watcher.reload(force=True)
+        watcher = asyncio.create_task(config_watcher.watch())
+
+    binary_server = None
+    if BINARY_PORT:
+        from app.binary import start_server
+        binary_server = await start_server(BINARY_HOST, BINARY_PORT)
+
+    yield
+
+    if binary_server is not None:
+        binary_server.close()
+        await binary_server.wait_closed()
+    if watcher is not None:
+        watcher.cancel()
+        with suppress(asyncio.CancelledError):
+            await watcher
+
+
 app = FastAPI(
     title="Wolt delivery fee calculator API",
     summary="Wolt Summer 2024 Internship backend assignment project, python HTTP API for calculating delivery fees.",
     version="0.0.1",
     contact={
         "name": "jj-stigell",
-        "url": "https://github.com/jj-stigell",
+        "url": "https://github.com/jj-stigell/wolt-api",
     },
     license_info={
         "name": "MIT",
         "url": "https://github.com/jj-stigell/wolt-api/blob/main/LICENSE",
     },
+    docs_url="/docs" if DOCS_ENABLED else None,
+    redoc_url="/redoc" if DOCS_ENABLED else None,
+    openapi_url="/openapi.json" if DOCS_ENABLED else None,
+    lifespan=lifespan,
 )
+
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
@@ -0,0 +1,223 @@
+"""
+Quote cache shared by all worker processes on a node, backed by a memory-mapped file (e.g. in /dev/shm).
+
+The file is a fixed-size hash table of 64 byte slots, grouped in buckets of WAYS slots. A quote is stored in the
+bucket of its key, and a full bucket evicts its oldest quote (the one that expires first, as every quote lives for the
+same TTL). Expired quotes are replaced first.
+
+Reads do not take locks. Every slot has a sequence number that writers make odd while they update the slot and even
+again when they are done, and readers only use a slot if its sequence number was even and unchanged while they read it.
+Writers lock the bucket they write to with a byte range lock on the file, so that writers in different processes do
+not update the same slot at the same time.
+
+Keys include a fingerprint of the fee schedule, so workers with different fee schedules (e.g. while a new fee
+configuration is being picked up) never use each other's quotes, and quotes of a replaced fee schedule are not used.
+
+A lookup computes FeeSchedule.quote_key and reads the slots through struct, so it costs more than FeeSchedule.calculate
+with the current fee rules. The cache only reduces latency when the fee calculation is more expensive than that.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from app import constants
+from app.config import FeeConfig
+from app.schedule import FeeSchedule
+
+WAYS: int = 4
+"""
+Slots per bucket.
+"""
+
+_MAGIC = b"WQC1"
+_HEADER = struct.Struct("<4sI")
+_HEADER_SIZE = 64
+# Sequence number, flags, schedule fingerprint, the four key values, fee and expiry time.
+_SLOT = struct.Struct("<IIQqqqqqd")
+_SEQUENCE = struct.Struct("<I")
+_SLOTS_DTYPE = np.dtype([
+    ("sequence", "<u4"),
+    ("flags", "<u4"),
+    ("fingerprint", "<u8"),
+    ("key", "<i8", (4,)),
+    ("fee", "<i8"),
+    ("expires", "<f8"),
+])
+_BUCKET_SIZE = WAYS * _SLOT.size
+_USED = 1
+_BULK_FEE = 2
+_MAX_KEY_VALUE = 2 ** 63 - 1
+
+
+def schedule_fingerprint(schedule: FeeSchedule) -> int:
+    """
+    :return: 64-bit hash of the fee rules of the schedule, the same in every process
+    """
+    config = FeeConfig.from_schedule(schedule).model_dump_json().encode()
+    return int.from_bytes(hashlib.blake2b(config, digest_size=8).digest(), "little")
+
+
+class SharedQuoteCache:
+    """
+    Fee quote cache in a memory-mapped file shared between processes, with the same interface as QuoteCache.
+    Processes that open the same file share the quotes. The hit and miss counts are counted per process.
+    """
+
+    def __init__(self, path: str, slots: int = constants.SHARED_QUOTE_CACHE_SLOTS, ttl: float = constants.QUOTE_CACHE_TTL):
+        buckets = slots // WAYS
+        if buckets < 1 or buckets & (buckets - 1):
+            raise ValueError(f"Shared quote cache slots must be {WAYS} times a power of two, got {slots}")
+
+        self.path = path
+        self.maxsize = slots
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._bucket_mask = buckets - 1
+        self._schedule: Optional[FeeSchedule] = None
+        self._fingerprint = 0
+        self._lock = threading.Lock()
+
+        size = _HEADER_SIZE + slots * _SLOT.size
+        header = _HEADER.pack(_MAGIC, slots)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            # The first process initializes the file. Resizing a file that other processes have mapped would crash
+            # them, so a file with another layout is an error.
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, header, 0)
+            elif os.fstat(self._fd).st_size != size or os.pread(self._fd, _HEADER.size, 0) != header:
+                raise ValueError(f"{path} is not a shared quote cache with {slots} slots, remove it or use another path")
+        except BaseException:
+            os.close(self._fd)
+            raise
+        fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+        self._mm = mmap.mmap(self._fd, size)
+
+    def __len__(self) -> int:
+        slots = np.frombuffer(self._mm, dtype=_SLOTS_DTYPE, offset=_HEADER_SIZE)
+        return int(np.count_nonzero((slots["flags"] & _USED).astype(bool) & (slots["expires"] > time.time())))
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+    def clear(self):
+        """
+        Removes all cached quotes of all processes and resets the hit and miss counters of this process.
+        """
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, len(self._mm) - _HEADER_SIZE, _HEADER_SIZE)
+            try:
+                for offset in range(_HEADER_SIZE, len(self._mm), _SLOT.size):
+                    sequence = _SEQUENCE.unpack_from(self._mm, offset)[0]
+                    _SLOT.pack_into(self._mm, offset, (sequence + 2) & 0xFFFFFFFF, 0, 0, 0, 0, 0, 0, 0, 0.0)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, len(self._mm) - _HEADER_SIZE, _HEADER_SIZE)
+            self.hits = 0
+            self.misses = 0
+
+    def info(self) -> dict:
+        """
+        :return: Cache hits and misses of this process, maximum size and current size of the shared cache
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "maxsize": self.maxsize,
+            "currsize": len(self),
+        }
+
+    def calculate(
+        self,
+        schedule: FeeSchedule,
+        cart_value: int,
+        delivery_distance: int,
+        number_of_items: int,
+        order_time: datetime,
+    ) -> int:
+        """
+        Returns the cached fee for the order, or calculates it with the schedule and caches it.
+
+        :return: Total fee for the delivery, in cents
+        """
+        if cart_value >= schedule.free_delivery_threshold:
+            return schedule.calculate(cart_value, delivery_distance, number_of_items, order_time)
+
+        if schedule is not self._schedule:
+            self._fingerprint = schedule_fingerprint(schedule)
+            self._schedule = schedule
+        fingerprint = self._fingerprint
+
+        distance_steps, surcharged_items, bulk_fee, cart_value_key, multiplier_bps = schedule.quote_key(
+            cart_value, delivery_distance, number_of_items, order_time,
+        )
+        if distance_steps > _MAX_KEY_VALUE or surcharged_items > _MAX_KEY_VALUE:
+            return schedule.calculate(cart_value, delivery_distance, number_of_items, order_time)
+
+        flags = (_USED | _BULK_FEE) if bulk_fee else _USED
+        bucket = hash((fingerprint, distance_steps, surcharged_items, bulk_fee, cart_value_key, multiplier_bps)) & self._bucket_mask
+        offset = _HEADER_SIZE + bucket * _BUCKET_SIZE
+        key = (flags, fingerprint, distance_steps, surcharged_items, cart_value_key, multiplier_bps)
+        now = time.time()
+
+        mm = self._mm
+        for slot in range(offset, offset + _BUCKET_SIZE, _SLOT.size):
+            _, *slot_key, _, _ = _SLOT.unpack_from(mm, slot)
+            if tuple(slot_key) != key:
+                continue
+
+            # Read the slot again between two reads of its sequence number, so that a quote written at the same time
+            # is not used.
+            sequence = _SEQUENCE.unpack_from(mm, slot)[0]
+            _, *slot_key, fee, expires = _SLOT.unpack_from(mm, slot)
+            if not sequence & 1 and _SEQUENCE.unpack_from(mm, slot)[0] == sequence and tuple(slot_key) == key and expires > now:
+                self.hits += 1
+                return fee
+            break
+
+        fee = schedule.calculate(cart_value, delivery_distance, number_of_items, order_time)
+        self.misses += 1
+        self._store(offset, key, fee, now + self.ttl)
+        return fee
+
+    def _store(self, offset: int, key: tuple, fee: int, expires: float):
+        """
+        Writes a quote into the bucket at the offset, replacing the same key, an empty or expired slot,
+        or the oldest quote of the bucket.
+        """
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, _BUCKET_SIZE, offset)
+            try:
+                now = time.time()
+                victim = None
+                oldest, oldest_expires = offset, float("inf")
+                for slot in range(offset, offset + _BUCKET_SIZE, _SLOT.size):
+                    _, *slot_key, _, slot_expires = _SLOT.unpack_from(self._mm, slot)
+                    if tuple(slot_key) == key:
+                        victim = slot
+                        break
+                    if victim is None and (not slot_key[0] & _USED or slot_expires <= now):
+                        victim = slot
+                    elif slot_expires < oldest_expires:
+                        oldest, oldest_expires = slot, slot_expires
+                if victim is None:
+                    victim = oldest
+
+                sequence = _SEQUENCE.unpack_from(self._mm, victim)[0]
+                _SEQUENCE.pack_into(self._mm, victim, (sequence + 1) & 0xFFFFFFFF)
+                _SLOT.pack_into(self._mm, victim, (sequence + 1) & 0xFFFFFFFF, *key, fee, expires)
+                _SEQUENCE.pack_into(self._mm, victim, (sequence + 2) & 0xFFFFFFFF)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, _BUCKET_SIZE, offset)
@@ -0,0 +1,157 @@
+import logging
+import time
+from array import array
+from bisect import bisect_right
+from datetime import datetime
+from typing import Optional, Tuple
+
+from app.cache import quote_cache
+from app.constants import BASIS_POINTS, FEE_LOOKUP_TABLES, MAX_LOOKUP_TABLE_SIZE
+from app.schedule import FeeSchedule, add_schedule_listener
+
+logger = logging.getLogger(__name__)
+
+
+class FeeTables:
+    """
+    Table-driven fee engine. The distance, item count and small order components of the fee are precomputed into
+    flat lookup tables, so calculating a fee is a few index operations.
+
+    Distance and item count fees only grow until the fee saturates at the maximum fee, so the tables end at the
+    saturation points and larger inputs are clamped to the last table entry. Schedules with a fee step of 0, or whose
+    tables would have more than MAX_LOOKUP_TABLE_SIZE entries, raise ValueError.
+    """
+    __slots__ = (
+        "schedule",
+        "distance_fees",
+        "item_fees",
+        "small_order_fees",
+        "max_distance",
+        "max_items",
+        "build_seconds",
+    )
+
+    def __init__(self, schedule: FeeSchedule):
+        start = time.perf_counter()
+        self.schedule = schedule
+
+        saturation_fee = schedule.saturation_fee()
+        if schedule.additional_fee <= 0 or schedule.additional_item_surcharge <= 0:
+            raise ValueError("Fee lookup tables need positive additional distance and item fees")
+        size = max(self.table_sizes(schedule, saturation_fee))
+        if size > MAX_LOOKUP_TABLE_SIZE:
+            raise ValueError(f"Fee lookup tables would have {size} entries, more than {MAX_LOOKUP_TABLE_SIZE}")
+
+        self.distance_fees = array("q", [schedule.calculate_distance_fee(0)])
+        while self.distance_fees[-1] < saturation_fee:
+            self.distance_fees.append(schedule.calculate_distance_fee(len(self.distance_fees)))
+        self.max_distance = len(self.distance_fees) - 1
+
+        self.item_fees = array("q", [schedule.calculate_item_count_surcharge_fee(0) + schedule.calculate_bulk_fee(0)])
+        while self.item_fees[-1] < saturation_fee:
+            items = len(self.item_fees)
+            self.item_fees.append(schedule.calculate_item_count_surcharge_fee(items) + schedule.calculate_bulk_fee(items))
+        self.max_items = len(self.item_fees) - 1
+
+        self.small_order_fees = array(
+            "q",
+            (schedule.calculate_small_order_surcharge_fee(cart_value) for cart_value in range(schedule.small_order_threshold + 1)),
+        )
+
+        self.build_seconds = time.perf_counter() - start
+
+    @staticmethod
+    def table_sizes(schedule: FeeSchedule, saturation_fee: int) -> Tuple[int, int, int]:
+        """
+        Upper bounds of the table sizes, calculated without building the tables. The distance and item fee steps
+        must be positive, otherwise the tables would never reach the saturation fee.
+
+        :return: Number of entries in the distance, item count and small order tables
+        """
+        distance_steps = max(-(-(saturation_fee - schedule.base_delivery_fee) // schedule.additional_fee), 0)
+        item_steps = -(-saturation_fee // schedule.additional_item_surcharge)
+        return (
+            schedule.base_delivery_fee_distance + distance_steps * schedule.additional_fee_distance + 1,
+            schedule.additional_item_limit + item_steps + 1,
+            schedule.small_order_threshold + 1,
+        )
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: Memory used by the lookup tables, in bytes
+        """
+        return sum(table.itemsize * len(table) for table in (self.distance_fees, self.item_fees, self.small_order_fees))
+
+    def calculate(self, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> int:
+        """
+        Calculates the total delivery fee with the lookup tables, see FeeSchedule.calculate.
+
+        :return: Total fee for the delivery, in cents
+        """
+        schedule = self.schedule
+        if cart_value >= schedule.free_delivery_threshold:
+            return 0
+
+        fee = (
+            self.distance_fees[delivery_distance if delivery_distance < self.max_distance else self.max_distance]
+            + self.item_fees[number_of_items if number_of_items < self.max_items else self.max_items]
+            + self.small_order_fees[cart_value if cart_value < schedule.small_order_threshold else -1]
+        )
+        wall_clock_days = schedule.rush_calendar.wall_clock_days
+        if wall_clock_days is None:
+            multiplier_bps = schedule.rush_calendar.multiplier_bps(order_time)
+        else:
+            day = wall_clock_days[order_time.weekday()]
+            multiplier_bps = day[1][bisect_right(day[0], order_time.time()) - 1] if day is not None else 0
+        if multiplier_bps:
+            fee = (fee * multiplier_bps + BASIS_POINTS // 2) // BASIS_POINTS
+
+        return fee if fee < schedule.max_fee else schedule.max_fee
+
+
+_fee_tables: Tuple[Optional[FeeSchedule], Optional[FeeTables]] = (None, None)
+
+
+def build_tables(schedule: FeeSchedule):
+    """
+    Builds the lookup tables for a fee schedule that is being activated, so that requests never build them.
+    If the tables would be too large, the schedule is used without tables.
+    """
+    global _fee_tables
+    try:
+        tables = FeeTables(schedule)
+    except ValueError as e:
+        logger.warning("Fee lookup tables not used for this fee schedule: %s", e)
+        tables = None
+    else:
+        logger.info("Built fee lookup tables in %.1f ms, %d bytes", tables.build_seconds * 1_000, tables.nbytes)
+    _fee_tables = (schedule, tables)
+
+
+def tables_for(schedule: FeeSchedule) -> Optional[FeeTables]:
+    """
+    Returns the lookup tables of the fee schedule, built when the schedule was activated.
+
+    :return: Lookup tables of the fee schedule, None if the schedule has no tables (because they would be too large,
+        or the schedule is not the active one) and fees must be calculated with the schedule
+    """
+    tables_schedule, tables = _fee_tables
+    return tables if tables_schedule is schedule else None
+
+
+def price(schedule: FeeSchedule, cart_value: int, delivery_distance: int, number_of_items: int, order_time: datetime) -> int:
+    """
+    Calculates the total delivery fee with the lookup tables of the fee schedule if it has them, with the quote cache
+    otherwise.
+
+    :return: Total fee for the delivery, in cents
+    """
+    tables = tables_for(schedule) if FEE_LOOKUP_TABLES else None
+    if tables is not None:
+        return tables.calculate(cart_value, delivery_distance, number_of_items, order_time)
+    return quote_cache.calculate(schedule, cart_value, delivery_distance, number_of_items, order_time)
+
+
+if FEE_LOOKUP_TABLES:
+    add_schedule_listener(build_tables)
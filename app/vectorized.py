@@ -0,0 +1,264 @@
+"""
+Vectorized delivery fee calculation for columnar order data, e.g. nightly repricing of historical orders.
+
+Applies the rules of a fee schedule like FeeSchedule.calculate, but to whole NumPy arrays of order values at once.
+Results are equal to the ones calculated one order at a time with the schedule.
+"""
+from datetime import datetime, time as time_of_day, timezone
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app import constants
+from app.history import FeeHistory, NoScheduleError
+from app.rush import RushCalendar
+from app.schedule import FeeSchedule, get_fee_schedule
+
+MAX_INPUT_VALUE: int = 2 ** 62
+"""
+Integer inputs are clipped to this value to fit int64. Each fee schedule then clips them further to where its fee
+has saturated, see _input_limits.
+"""
+
+_MICROSECONDS_IN_DAY: int = 24 * 60 * 60 * 1_000_000
+_EPOCH_WEEKDAY: int = 3  # 1970-01-01 was a Thursday
+
+
+def to_datetime64(times: Iterable[datetime]) -> np.ndarray:
+    """
+    Converts order times to a datetime64 array. Timezone information is dropped, and the wall-clock
+    time in the timezone of each datetime is kept, as Order uses the weekday and time of the datetime as given.
+
+    :return: Order times as datetime64[us] array
+    """
+    return np.array([t.replace(tzinfo=None) for t in times], dtype="datetime64[us]")
+
+
+def _as_int64(values) -> np.ndarray:
+    try:
+        return np.minimum(np.asarray(values, dtype=np.int64), MAX_INPUT_VALUE)
+    except OverflowError:
+        return np.asarray([min(value, MAX_INPUT_VALUE) for value in values], dtype=np.int64)
+
+
+def _microseconds(t: time_of_day) -> int:
+    return ((t.hour * 60 + t.minute) * 60 + t.second) * 1_000_000 + t.microsecond
+
+
+def rush_multipliers(calendar: RushCalendar, time: np.ndarray, order_times: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Vectorized version of RushCalendar.multiplier_bps. For calendars on the wall-clock time of the order time, the
+    weekly boundaries of the calendar are searched for all order times at once. Calendars with timezones convert each
+    order time in order_times (datetimes, or the datetime64 order times taken as UTC if not given) one by one.
+
+    :return: Rush hour multipliers in basis points, 0 where the order time is not in a rush window
+    """
+    if calendar.wall_clock_days is None:
+        if order_times is None:
+            order_times = time.astype(object)
+        return np.fromiter((calendar.multiplier_bps(t) for t in order_times), dtype=np.int64, count=len(order_times))
+
+    boundaries = []
+    multipliers = []
+    for weekday, day in enumerate(calendar.wall_clock_days):
+        if day is None:
+            boundaries.append(weekday * _MICROSECONDS_IN_DAY)
+            multipliers.append(0)
+        else:
+            boundaries += [weekday * _MICROSECONDS_IN_DAY + _microseconds(t) for t in day[0]]
+            multipliers += day[1]
+
+    days = time.astype("datetime64[D]")
+    weekday = (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+    time_of_week = weekday * _MICROSECONDS_IN_DAY + (time - days).astype(np.int64)
+    return np.asarray(multipliers, dtype=np.int64)[np.searchsorted(boundaries, time_of_week, side="right") - 1]
+
+
+def _input_limits(schedule: FeeSchedule, saturation_fee: int) -> Tuple[int, int, int]:
+    """
+    Input values past which the fee does not change: cart values qualify for free delivery and pay no small order
+    surcharge, and delivery distances and item counts have reached the saturation fee (the distance and item fee
+    steps are at least 1) and the bulk fee.
+
+    :return: Largest cart value, delivery distance and number of items that need to be calculated
+    """
+    return (
+        max(schedule.free_delivery_threshold, schedule.small_order_threshold),
+        schedule.base_delivery_fee_distance + saturation_fee * schedule.additional_fee_distance,
+        max(schedule.additional_item_limit + saturation_fee, schedule.bulk_fee_threshold + 1),
+    )
+
+
+def _fees(
+    schedule: FeeSchedule,
+    cart_value: np.ndarray,
+    delivery_distance: np.ndarray,
+    number_of_items: np.ndarray,
+    multiplier_bps: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized version of FeeSchedule.calculate, for order values and rush hour multipliers that broadcast together.
+    The distance fees are calculated for the shape of the delivery distances and the other fee components for the
+    shape of the cart values and item counts, so that calculate_fee_matrix calculates each of them once.
+
+    :return: Total fees for the deliveries, in cents
+    """
+    # Fees at or above the saturation fee are all charged as the maximum fee, so clamping the inputs and the fee
+    # components keeps the products within int64.
+    saturation_fee = schedule.saturation_fee()
+    cart_limit, distance_limit, items_limit = _input_limits(schedule, saturation_fee)
+    cart_value = np.minimum(cart_value, cart_limit)
+    delivery_distance = np.minimum(delivery_distance, distance_limit)
+    number_of_items = np.minimum(number_of_items, items_limit)
+
+    additional_fees = -(-np.maximum(delivery_distance - schedule.base_delivery_fee_distance, 0) // schedule.additional_fee_distance)
+    distance_fee = np.minimum(
+        min(schedule.base_delivery_fee, saturation_fee) + np.minimum(additional_fees, saturation_fee) * min(schedule.additional_fee, saturation_fee),
+        saturation_fee,
+    )
+    extra_items = np.maximum(number_of_items - schedule.additional_item_limit + 1, 0)
+    cart_fee = np.minimum(np.minimum(extra_items, saturation_fee) * min(schedule.additional_item_surcharge, saturation_fee), saturation_fee)
+    cart_fee += np.minimum(np.maximum(schedule.small_order_threshold - cart_value, 0), saturation_fee)
+    cart_fee += np.where(number_of_items > schedule.bulk_fee_threshold, min(schedule.bulk_fee, saturation_fee), 0)
+    fee = distance_fee + np.minimum(cart_fee, saturation_fee)
+    np.minimum(fee, saturation_fee, out=fee)
+
+    if multiplier_bps.any():
+        # A multiplier of BASIS_POINTS keeps the fee as is, so the rush hour fees are calculated in place for all.
+        fee *= np.where(multiplier_bps > 0, multiplier_bps, constants.BASIS_POINTS)
+        fee += constants.BASIS_POINTS // 2
+        fee //= constants.BASIS_POINTS
+    np.minimum(fee, schedule.max_fee, out=fee)
+    np.copyto(fee, 0, where=cart_value >= schedule.free_delivery_threshold)
+
+    return fee
+
+
+def _schedule_fees(
+    schedule: FeeSchedule,
+    cart_value: np.ndarray,
+    delivery_distance: np.ndarray,
+    number_of_items: np.ndarray,
+    time: np.ndarray,
+    order_times: Optional[np.ndarray],
+) -> np.ndarray:
+    multiplier_bps = rush_multipliers(schedule.rush_calendar, time, order_times)
+    return _fees(schedule, cart_value, delivery_distance, number_of_items, multiplier_bps)
+
+
+def _order_times(time) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+    """
+    :return: Wall-clock order times and UTC order times as datetime64[us] arrays, and the order times as datetimes
+        if they were given as datetimes
+    """
+    if isinstance(time, np.ndarray) and np.issubdtype(time.dtype, np.datetime64):
+        time = time.astype("datetime64[us]")
+        return time, time, None
+
+    order_times = np.empty(len(time), dtype=object)
+    order_times[:] = time
+    utc_times = np.array(
+        [(t.astimezone(timezone.utc) if t.tzinfo else t).replace(tzinfo=None) for t in order_times],
+        dtype="datetime64[us]",
+    )
+    return to_datetime64(order_times), utc_times, order_times
+
+
+def calculate_schedule_fees(schedule: FeeSchedule, cart_value, delivery_distance, number_of_items, time) -> np.ndarray:
+    """
+    Calculates the total delivery fees for arrays of orders with the fee schedule, see FeeSchedule.calculate.
+    All arguments must have the same length. Order times can be given as a datetime64 array (taken as UTC for rush
+    windows with a timezone) or as datetimes.
+
+    :return: Total fees for the deliveries, in cents
+    """
+    time, _, order_times = _order_times(time)
+    return _schedule_fees(schedule, _as_int64(cart_value), _as_int64(delivery_distance), _as_int64(number_of_items), time, order_times)
+
+
+def calculate_delivery_fees(cart_value, delivery_distance, number_of_items, time) -> np.ndarray:
+    """
+    Calculates the total delivery fees for arrays of orders with the active fee schedule, see
+    calculate_schedule_fees and Order.calculate_delivery_fee.
+
+    :return: Total fees for the deliveries, in cents
+    """
+    return calculate_schedule_fees(get_fee_schedule(), cart_value, delivery_distance, number_of_items, time)
+
+
+def calculate_fee_matrix(
+    schedule: FeeSchedule,
+    carts: Sequence[Tuple[int, int, datetime]],
+    delivery_distances: Sequence[int],
+) -> np.ndarray:
+    """
+    Calculates the delivery fees of carts (cart value, number of items and order time) crossed with delivery distances,
+    with the fee schedule. The distance fees are calculated once for all carts, and the fee components that do not
+    depend on the distance (surcharges, bulk fee, rush hour multiplier and free delivery) once for each cart.
+    Each fee is equal to FeeSchedule.calculate of the cart with that distance.
+
+    :return: Total fees for the deliveries, in cents, with a row for each cart and a column for each distance
+    """
+    distance = _as_int64(delivery_distances)
+    if not carts:
+        return np.zeros((0, len(distance)), dtype=np.int64)
+
+    cart_value, number_of_items, order_times = zip(*carts)
+    # Few carts, so the calendar is looked up for each one instead of converting the times to datetime64.
+    multiplier_bps = np.fromiter((schedule.rush_calendar.multiplier_bps(t) for t in order_times), dtype=np.int64, count=len(carts))
+    return _fees(
+        schedule,
+        _as_int64(cart_value)[:, np.newaxis],
+        distance[np.newaxis, :],
+        _as_int64(number_of_items)[:, np.newaxis],
+        multiplier_bps[:, np.newaxis],
+    )
+
+
+def calculate_history_fees(history: FeeHistory, cart_value, delivery_distance, number_of_items, time) -> np.ndarray:
+    """
+    Calculates the total delivery fees for arrays of orders, each with the fee schedule in force at its order time,
+    see FeeHistory.calculate. The schedules are resolved for all orders at once with a binary search over the
+    effective times, and the orders of each schedule are then priced together, so pricing with a history costs
+    little more than pricing with one schedule. Order times are given like in calculate_schedule_fees.
+    Raises NoScheduleError if an order time is before the first schedule took effect.
+
+    :return: Total fees for the deliveries, in cents
+    """
+    cart_value = _as_int64(cart_value)
+    delivery_distance = _as_int64(delivery_distance)
+    number_of_items = _as_int64(number_of_items)
+    time, utc_times, order_times = _order_times(time)
+
+    effective_from = np.array(history.utc_effective_from, dtype="datetime64[us]")
+    indices = np.searchsorted(effective_from, utc_times, side="right") - 1
+    if not len(indices):
+        return np.zeros(0, dtype=np.int64)
+    first, last = indices.min(), indices.max()
+    if first < 0:
+        raise NoScheduleError(
+            f"No fee schedule in force at {np.datetime_as_string(utc_times[indices < 0].min())}Z, "
+            f"the first one took effect at {history.effective_from[0].isoformat()}"
+        )
+
+    if first == last:
+        return _schedule_fees(history.schedules[first], cart_value, delivery_distance, number_of_items, time, order_times)
+
+    # Orders grouped by schedule, orders sorted by time are already grouped.
+    order = np.argsort(indices, kind="stable")
+    bounds = np.searchsorted(indices[order], np.arange(first, last + 2))
+    fees = np.empty(len(indices), dtype=np.int64)
+    for schedule, start, end in zip(history.schedules[first:last + 1], bounds, bounds[1:]):
+        if start == end:
+            continue
+        selected = order[start:end]
+        fees[selected] = _schedule_fees(
+            schedule,
+            cart_value[selected],
+            delivery_distance[selected],
+            number_of_items[selected],
+            time[selected],
+            order_times[selected] if order_times is not None else None,
+        )
+
+    return fees
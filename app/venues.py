@@ -0,0 +1,268 @@
+"""
+Venue file with a grid index for venue ID and nearby venue lookups.
+
+The venue file is memory-mapped read-only, so all worker processes on a node share one copy of it in the page cache.
+Venues are stored sorted by the cell of a latitude/longitude grid (cells of cell_degrees degrees), so the venues of
+a row of cells are one contiguous range of the file. Venues within a radius are found by binary searching the cell
+ranges of the rows that the radius covers, and calculating the haversine distances of only those venues.
+A copy of the venue IDs is stored sorted, for binary searching venue IDs.
+
+Venue files are created from CSV files with the columns id, latitude and longitude:
+    python -m app.venues venues.csv venues.bin
+
+The file is replaced atomically, but worker processes keep using the venues they have loaded until they restart.
+"""
+import argparse
+import csv
+import math
+import mmap
+import os
+import struct
+import sys
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app import constants
+
+_MAGIC = b"WVI1"
+# Magic, venue ID size, number of venues and grid cell size.
+_HEADER = struct.Struct("<4sIQd")
+_HEADER_SIZE = 64
+# Bounds of the nearby venue search are widened by this much (in degrees, about 1 cm), so that rounding errors
+# never leave out a venue within the radius.
+_MARGIN_DEGREES = 1e-7
+
+
+def haversine_distances(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """
+    Vectorized app.geo.haversine_distance from one location (in degrees) to arrays of locations.
+
+    :return: Great-circle distances in meters
+    """
+    latitude, latitudes = np.radians(latitude), np.radians(latitudes)
+    a = (
+        np.sin((latitudes - latitude) / 2) ** 2
+        + np.cos(latitude) * np.cos(latitudes) * np.sin(np.radians(longitudes - longitude) / 2) ** 2
+    )
+    return 2 * constants.EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _grid_size(cell_degrees: float) -> Tuple[int, int]:
+    return math.ceil(180 / cell_degrees), math.ceil(360 / cell_degrees)
+
+
+def _layout(count: int, id_size: int) -> List[Tuple[str, np.dtype, int]]:
+    """
+    :return: Name, data type and file offset of each array of a venue file
+    """
+    layout = []
+    offset = _HEADER_SIZE
+    for name, dtype in (
+        ("cells", np.dtype("<i8")),
+        ("latitudes", np.dtype("<f8")),
+        ("longitudes", np.dtype("<f8")),
+        ("ids", np.dtype(f"S{id_size}")),
+        ("sorted_ids", np.dtype(f"S{id_size}")),
+        ("sorted_indices", np.dtype("<i8")),
+    ):
+        layout.append((name, dtype, offset))
+        # Arrays start at multiples of 8 bytes.
+        offset += -(-count * dtype.itemsize // 8) * 8
+    layout.append(("end", np.dtype("u1"), offset))
+    return layout
+
+
+def write_venue_file(
+    path: str,
+    venues: Iterable[Tuple[str, float, float]],
+    cell_degrees: float = constants.VENUE_GRID_DEGREES,
+):
+    """
+    Writes the venues (ID, latitude and longitude) into a venue file, replacing the file atomically.
+    """
+    ids, latitudes, longitudes = [], [], []
+    for venue_id, latitude, longitude in venues:
+        if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+            raise ValueError(f"Venue {venue_id} has invalid coordinates {latitude}, {longitude}")
+        ids.append(venue_id.encode())
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+    if len(set(ids)) != len(ids):
+        raise ValueError("Venue IDs must be unique")
+    if not all(ids) or any(venue_id.endswith(b"\0") for venue_id in ids):
+        raise ValueError("Venue IDs must be non-empty and not end with a null character")
+
+    count = len(ids)
+    id_size = max(map(len, ids), default=1)
+    latitudes, longitudes = np.array(latitudes, dtype=np.float64), np.array(longitudes, dtype=np.float64)
+    rows, columns = _grid_size(cell_degrees)
+    cells = (
+        np.minimum(((latitudes + 90) // cell_degrees).astype(np.int64), rows - 1) * columns
+        + np.minimum(((longitudes + 180) // cell_degrees).astype(np.int64), columns - 1)
+    )
+    order = np.argsort(cells, kind="stable")
+    ids = np.array(ids, dtype=f"S{id_size}")[order]
+    sorted_indices = np.argsort(ids, kind="stable")
+    arrays = {
+        "cells": cells[order],
+        "latitudes": latitudes[order],
+        "longitudes": longitudes[order],
+        "ids": ids,
+        "sorted_ids": ids[sorted_indices],
+        "sorted_indices": sorted_indices.astype(np.int64),
+    }
+
+    layout = _layout(count, id_size)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, id_size, count, cell_degrees).ljust(_HEADER_SIZE, b"\0"))
+        for name, dtype, offset in layout[:-1]:
+            file.seek(offset)
+            file.write(arrays[name].astype(dtype, copy=False).tobytes())
+        file.truncate(layout[-1][2])
+    os.replace(temporary, path)
+
+
+class VenueIndex:
+    """
+    Read-only venue file, memory-mapped. Venues are identified by their position in the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < _HEADER_SIZE:
+                raise ValueError(f"{path} is not a venue file")
+            self._mm = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+
+        magic, id_size, count, self.cell_degrees = _HEADER.unpack_from(self._mm)
+        layout = _layout(count, id_size)
+        if magic != _MAGIC or not id_size or size != layout[-1][2]:
+            self._mm.close()
+            raise ValueError(f"{path} is not a venue file")
+
+        arrays = {name: np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset) for name, dtype, offset in layout[:-1]}
+        self.cells: np.ndarray = arrays["cells"]
+        self.latitudes: np.ndarray = arrays["latitudes"]
+        self.longitudes: np.ndarray = arrays["longitudes"]
+        self.ids: np.ndarray = arrays["ids"]
+        self._sorted_ids: np.ndarray = arrays["sorted_ids"]
+        self._sorted_indices: np.ndarray = arrays["sorted_indices"]
+        self._rows, self._columns = _grid_size(self.cell_degrees)
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def find(self, venue_id: str) -> Optional[int]:
+        """
+        :return: Position of the venue with the ID, or None if there is no such venue
+        """
+        key = venue_id.encode()
+        if len(key) > self.ids.dtype.itemsize:
+            return None
+        position = int(np.searchsorted(self._sorted_ids, key))
+        if position == len(self._sorted_ids) or self._sorted_ids[position] != key:
+            return None
+        return int(self._sorted_indices[position])
+
+    def distances(self, latitude: float, longitude: float, venues: np.ndarray) -> np.ndarray:
+        """
+        :return: Delivery distances in meters (rounded up, at least 1) from the location to the venues at the positions
+        """
+        distances = np.ceil(haversine_distances(latitude, longitude, self.latitudes[venues], self.longitudes[venues]))
+        return np.maximum(distances, 1).astype(np.int64)
+
+    def _row(self, latitude: float) -> int:
+        return min(int((latitude + 90) // self.cell_degrees), self._rows - 1)
+
+    def _column(self, longitude: float) -> int:
+        return min(int((longitude + 180) // self.cell_degrees), self._columns - 1)
+
+    def _column_ranges(self, latitude: float, longitude: float, angle: float) -> List[Tuple[int, int]]:
+        """
+        :return: First and last grid columns that can have venues within the angular distance (in radians) of the location
+        """
+        if math.sin(angle) >= math.cos(math.radians(latitude)):
+            # The circle contains a pole.
+            return [(0, self._columns - 1)]
+
+        half_width = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude)))) + _MARGIN_DEGREES
+        west, east = longitude - half_width, longitude + half_width
+        if east - west >= 360:
+            return [(0, self._columns - 1)]
+        # Circles across the antimeridian have columns on both ends of the grid.
+        if west < -180:
+            return [(self._column(west + 360), self._columns - 1), (0, self._column(east))]
+        if east > 180:
+            return [(self._column(west), self._columns - 1), (0, self._column(east - 360))]
+        return [(self._column(west), self._column(east))]
+
+    def within(self, latitude: float, longitude: float, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the venues within the radius (in meters) of the location, nearest first.
+
+        :return: Positions of the venues and their delivery distances in meters
+        """
+        angle = radius / constants.EARTH_RADIUS
+        half_height = math.degrees(angle) + _MARGIN_DEGREES
+        south, north = latitude - half_height, latitude + half_height
+        if south <= -90 or north >= 90:
+            column_ranges = [(0, self._columns - 1)]
+        else:
+            column_ranges = self._column_ranges(latitude, longitude, angle)
+
+        rows = np.arange(self._row(max(south, -90)), self._row(min(north, 90)) + 1, dtype=np.int64) * self._columns
+        starts = np.concatenate([np.searchsorted(self.cells, rows + first, "left") for first, _ in column_ranges])
+        ends = np.concatenate([np.searchsorted(self.cells, rows + last, "right") for _, last in column_ranges])
+        candidates = np.concatenate([np.arange(start, end) for start, end in zip(starts.tolist(), ends.tolist())])
+
+        distances = self.distances(latitude, longitude, candidates)
+        within = distances <= radius
+        candidates, distances = candidates[within], distances[within]
+        order = np.argsort(distances, kind="stable")
+        return candidates[order], distances[order]
+
+
+_venue_index: Optional[VenueIndex] = None
+
+
+def get_venue_index() -> Optional[VenueIndex]:
+    """
+    Loads the venue file from VENUE_FILE_PATH on the first call.
+
+    :return: Venue index of the venue file, or None if VENUE_FILE_PATH is not set
+    """
+    global _venue_index
+
+    if not constants.VENUE_FILE_PATH:
+        return None
+    if _venue_index is None or _venue_index.path != constants.VENUE_FILE_PATH:
+        _venue_index = VenueIndex(constants.VENUE_FILE_PATH)
+    return _venue_index
+
+
+def read_venue_csv(path: str) -> Iterable[Tuple[str, float, float]]:
+    """
+    :return: Venue ID, latitude and longitude of each row of a CSV file with the columns id, latitude and longitude
+    """
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            yield row["id"], float(row["latitude"]), float(row["longitude"])
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.venues", description="Create a venue file from a CSV file.")
+    parser.add_argument("input", help="input CSV file with the columns id, latitude and longitude")
+    parser.add_argument("output", help="output venue file")
+    parser.add_argument("--cell-degrees", type=float, default=constants.VENUE_GRID_DEGREES, help="grid cell size in degrees")
+    args = parser.parse_args(argv)
+
+    write_venue_file(args.output, read_venue_csv(args.input), args.cell_degrees)
+    print(f"{len(VenueIndex(args.output))} venues written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
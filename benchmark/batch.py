@@ -0,0 +1,49 @@
+"""
+Compares the batch endpoint against calling the single order endpoint once per order.
+
+Run from the project root with:
+    python -m benchmark.batch
+"""
+import random
+import time
+
+from fastapi.testclient import TestClient
+
+from app import constants
+from app.main import app
+
+BATCH_SIZES = (1, 10, 100, 1_000, 10_000)
+
+
+def random_order(rng: random.Random) -> dict:
+    return {
+        "cart_value": rng.randint(1, constants.FREE_DELIVERY_THRESHOLD + 1_000),
+        "delivery_distance": rng.randint(1, 10_000),
+        "number_of_items": rng.randint(1, 30),
+        "time": f"2024-01-{rng.randint(15, 21)}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+    }
+
+
+def main():
+    client = TestClient(app)
+    rng = random.Random(0)
+
+    print(f"{'orders':>8} {'single (us/order)':>18} {'batch (us/order)':>17} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        orders = [random_order(rng) for _ in range(size)]
+        single_count = min(size, 1_000)
+
+        start = time.perf_counter()
+        for order in orders[:single_count]:
+            client.post(constants.CALCULATE_ENDPOINT, json=order)
+        single = (time.perf_counter() - start) / single_count
+
+        start = time.perf_counter()
+        client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders)
+        batch = (time.perf_counter() - start) / size
+
+        print(f"{size:>8} {single * 1e6:>18.1f} {batch * 1e6:>17.1f} {single / batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
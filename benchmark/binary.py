@@ -0,0 +1,167 @@
+"""
+Messages per second and latency of the binary fee protocol (app/binary.py) compared to the JSON endpoints, on loopback.
+
+The production launcher (app.serve) runs with one worker, serving both the HTTP API and the binary protocol.
+Unary calls are made by CONNECTIONS concurrent connections that each send one request at a time: JSON requests are
+pre-encoded HTTP/1.1 keep-alive requests sent over raw connections, so that the client is as cheap as possible.
+Streaming calls send STREAM_ORDERS orders over one connection, to the NDJSON stream endpoint and as a binary stream.
+The client runs in the same machine, so on a machine with few cores it competes with the server for the CPU.
+
+Run from the project root with:
+    python -m benchmark.binary
+"""
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, List, Tuple
+
+import httpx
+
+from app import constants
+from app.binary import FeeClient
+
+HOST = "127.0.0.1"
+PORT = 8767
+BINARY_PORT = 8768
+CONNECTIONS = 32
+DURATION = 5.0
+STREAM_ORDERS = 100_000
+
+ORDER = (790, 2235, 4, datetime(2024, 1, 15, 13))
+ORDER_JSON = json.dumps({
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}).encode()
+REQUEST = (
+    f"POST {constants.CALCULATE_ENDPOINT} HTTP/1.1\r\n"
+    f"Host: {HOST}:{PORT}\r\n"
+    "Content-Type: application/json\r\n"
+    f"Content-Length: {len(ORDER_JSON)}\r\n"
+    "\r\n"
+).encode() + ORDER_JSON
+
+
+def wait_until_ready():
+    for _ in range(100):
+        try:
+            httpx.get(f"http://{HOST}:{PORT}{constants.HEALTH_ENDPOINT}").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+
+    raise RuntimeError("Server did not start")
+
+
+Call = Callable[[], Awaitable[None]]
+
+
+async def json_connection() -> Tuple[Call, Call]:
+    """
+    :return: Function that makes a unary call on a new connection, and a function that closes the connection
+    """
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+
+    async def call():
+        writer.write(REQUEST)
+        headers = await reader.readuntil(b"\r\n\r\n")
+        assert headers.startswith(b"HTTP/1.1 200"), headers
+        length = int(headers.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+        await reader.readexactly(length)
+
+    async def close():
+        writer.close()
+        await writer.wait_closed()
+
+    return call, close
+
+
+async def binary_connection() -> Tuple[Call, Call]:
+    """
+    :return: Function that makes a unary call on a new connection, and a function that closes the connection
+    """
+    client = await FeeClient.connect(HOST, BINARY_PORT)
+
+    async def call():
+        assert await client.calculate(*ORDER) == 710
+
+    return call, client.close
+
+
+async def unary(connect: Callable[[], Awaitable[Tuple[Call, Call]]]) -> str:
+    connections = [await connect() for _ in range(CONNECTIONS)]
+    latencies: List[float] = []
+    deadline = time.perf_counter() + DURATION
+
+    async def connection(call):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(call) for call, _ in connections))
+    elapsed = time.perf_counter() - start
+    for _, close in connections:
+        await close()
+    p50, p99 = (statistics.quantiles(latencies, n=100)[i] * 1e3 for i in (49, 98))
+    return f"{len(latencies) / elapsed:>12,.0f} messages/s   p50 {p50:>6.2f} ms   p99 {p99:>6.2f} ms"
+
+
+async def json_stream() -> str:
+    body = b"\n".join([ORDER_JSON] * STREAM_ORDERS)
+    async with httpx.AsyncClient(timeout=60) as client:
+        start = time.perf_counter()
+        response = await client.post(
+            f"http://{HOST}:{PORT}{constants.STREAM_CALCULATE_ENDPOINT}",
+            content=body,
+            headers={"content-type": "application/x-ndjson"},
+        )
+        assert response.text.count("\n") == STREAM_ORDERS
+    return f"{STREAM_ORDERS / (time.perf_counter() - start):>12,.0f} messages/s"
+
+
+async def binary_stream() -> str:
+    client = await FeeClient.connect(HOST, BINARY_PORT)
+    start = time.perf_counter()
+    count = 0
+    async for fee in client.stream(ORDER for _ in range(STREAM_ORDERS)):
+        assert fee == 710
+        count += 1
+    elapsed = time.perf_counter() - start
+    await client.close()
+    return f"{count / elapsed:>12,.0f} messages/s"
+
+
+async def measure():
+    print(f"{CONNECTIONS} connections for {DURATION:g} s (unary), {STREAM_ORDERS:,} orders on one connection (streaming)")
+    for name, run in (
+        ("JSON /feecalc unary", lambda: unary(json_connection)),
+        ("binary unary", lambda: unary(binary_connection)),
+        ("JSON /feecalc/stream", json_stream),
+        ("binary streaming", binary_stream),
+    ):
+        print(f"{name:<22} {await run()}")
+
+
+def main():
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", HOST, "--port", str(PORT), "--workers", "1", "--log-level", "warning"],
+        env={**os.environ, "BINARY_PORT": str(BINARY_PORT), "BINARY_HOST": HOST},
+    )
+    try:
+        wait_until_ready()
+        asyncio.run(measure())
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
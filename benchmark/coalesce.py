@@ -0,0 +1,124 @@
+"""
+CPU time per request of the fee calculation endpoint with and without request coalescing (COALESCE_REQUESTS),
+for a flash sale request mix where most requests ask for one of a few identical quotes at the same time.
+
+Requests arrive in bursts that are all sent to the ASGI app at once, without an HTTP client, so that the CPU time
+is spent in the application. The mix is also run with a simulated expensive fee calculation dependency (e.g. a
+distance service), which is where coalescing saves the most.
+
+Run from the project root with:
+    python -m benchmark.coalesce
+"""
+import asyncio
+import random
+import time
+from typing import List
+
+import orjson
+
+import app.main
+import app.tables
+from app import constants
+from app.coalesce import request_flights
+from benchmark.workload import generate_orders
+
+BURSTS = 200
+BURST_SIZE = 100
+HOT_QUOTES = 3
+DUPLICATE_RATIO = 0.95
+"""
+Fraction of the requests that ask for one of the HOT_QUOTES quotes, the rest are distinct orders.
+"""
+DEPENDENCY_SECONDS = 0.00005
+
+
+def request_bodies(count: int, seed: int = 42) -> List[bytes]:
+    rng = random.Random(seed)
+    orders = generate_orders(count, seed=seed)
+    hot = [orjson.dumps(order) for order in orders[:HOT_QUOTES]]
+    return [rng.choice(hot) if rng.random() < DUPLICATE_RATIO else orjson.dumps(order) for order in orders]
+
+
+async def post(body: bytes):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": constants.CALCULATE_ENDPOINT,
+        "raw_path": constants.CALCULATE_ENDPOINT.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app.main.app(scope, receive, send)
+    assert messages[0]["status"] == 200, messages
+
+
+class SlowQuoteCache:
+    """
+    Fee calculation with a simulated expensive dependency that keeps the CPU busy for DEPENDENCY_SECONDS.
+    """
+
+    def __init__(self, quote_cache):
+        self.quote_cache = quote_cache
+
+    def calculate(self, *args) -> int:
+        deadline = time.perf_counter() + DEPENDENCY_SECONDS
+        while time.perf_counter() < deadline:
+            pass
+        return self.quote_cache.calculate(*args)
+
+
+async def run_bursts(bodies: List[bytes]):
+    for i in range(0, len(bodies), BURST_SIZE):
+        await asyncio.gather(*(post(body) for body in bodies[i:i + BURST_SIZE]))
+
+
+def cpu_per_request(bodies: List[bytes], coalesce: bool) -> float:
+    """
+    :return: Process CPU time per request in microseconds
+    """
+    app.main.COALESCE_REQUESTS = coalesce
+    asyncio.run(run_bursts(bodies[:BURST_SIZE * 5]))
+    start = time.process_time()
+    asyncio.run(run_bursts(bodies))
+    return (time.process_time() - start) / len(bodies) * 1e6
+
+
+def main():
+    bodies = request_bodies(BURSTS * BURST_SIZE)
+    quote_cache = app.tables.quote_cache
+    print(f"{BURSTS} bursts of {BURST_SIZE} requests, {DUPLICATE_RATIO:.0%} for {HOT_QUOTES} identical quotes")
+    for name, dependency in (("fee calculation", False), (f"with {DEPENDENCY_SECONDS * 1e6:.0f} us dependency", True)):
+        app.tables.quote_cache = SlowQuoteCache(quote_cache) if dependency else quote_cache
+        # Best of three runs, alternating the modes so that both see the same machine load.
+        results = {False: [], True: []}
+        for _ in range(3):
+            for coalesce in (False, True):
+                results[coalesce].append(cpu_per_request(bodies, coalesce))
+        before = request_flights.coalesced
+        cpu_per_request(bodies, True)
+        coalesced = (request_flights.coalesced - before) / len(bodies)
+
+        off, on = min(results[False]), min(results[True])
+        print(
+            f"{name:<28} off {off:>7.1f} us/request   on {on:>7.1f} us/request   "
+            f"{(off - on) / off:>6.1%} less CPU, {coalesced:.0%} of requests coalesced"
+        )
+    app.tables.quote_cache = quote_cache
+
+
+if __name__ == "__main__":
+    main()
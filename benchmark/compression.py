@@ -0,0 +1,135 @@
+"""
+Bytes on the wire and CPU time of response compression (app/compression.py) for batch responses of different sizes,
+and the overhead on single fee responses, which are below the compression threshold.
+
+The response sizes are measured by sending the requests to the ASGI app in-process. The compression CPU time is
+measured on the response bodies directly, as it is small compared to calculating the batch, and is also shown as
+a share of the CPU time of the uncompressed request.
+
+Run from the project root with:
+    python -m benchmark.compression
+"""
+import asyncio
+import time
+from typing import Callable, List, Tuple
+
+import orjson
+
+import app.main
+from app import constants
+from app.compression import ZSTD_AVAILABLE, Compressor
+from benchmark.workload import generate_orders
+
+BATCH_SIZES = (10, 100, 1_000, 10_000)
+GZIP_LEVELS = (1, 3, 6, 9)
+SINGLE_REQUESTS = 20_000
+
+
+async def post(path: str, body: bytes, accept_encoding: bytes) -> bytes:
+    """
+    :return: Response body
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"accept-encoding", accept_encoding),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    chunks = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            assert message["status"] == 200, message
+        else:
+            chunks.append(message.get("body", b""))
+
+    await app.main.app(scope, receive, send)
+    return b"".join(chunks)
+
+
+def best_cpu_time(function: Callable[[], object], repeat: int) -> float:
+    """
+    :return: Best CPU time of the function in microseconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.process_time()
+        function()
+        times.append(time.process_time() - start)
+    return min(times) * 1e6
+
+
+def encodings() -> List[Tuple[str, bytes, int]]:
+    """
+    :return: Name, Accept-Encoding header value and gzip level of each measured encoding
+    """
+    result = [(f"gzip level {level}", b"gzip", level) for level in GZIP_LEVELS]
+    if ZSTD_AVAILABLE:
+        result.append((f"zstd level {constants.COMPRESSION_ZSTD_LEVEL}", b"zstd", constants.COMPRESSION_GZIP_LEVEL))
+    return result
+
+
+def single_fee_overhead() -> Tuple[float, float]:
+    """
+    :return: CPU time per single fee request in microseconds without and with Accept-Encoding: gzip
+    """
+    body = orjson.dumps(generate_orders(1)[0])
+
+    def run(accept_encoding: bytes):
+        async def requests():
+            for _ in range(SINGLE_REQUESTS):
+                await post(constants.CALCULATE_ENDPOINT, body, accept_encoding)
+        asyncio.run(requests())
+
+    # Interleaved runs, so that both see the same machine load.
+    results = {b"identity": [], b"gzip": []}
+    for _ in range(5):
+        for accept_encoding in results:
+            results[accept_encoding].append(best_cpu_time(lambda: run(accept_encoding), 1) / SINGLE_REQUESTS)
+    return min(results[b"identity"]), min(results[b"gzip"])
+
+
+def main():
+    gzip_level = constants.COMPRESSION_GZIP_LEVEL
+    orders = generate_orders(max(BATCH_SIZES))
+    print(f"Compression threshold {constants.COMPRESSION_MINIMUM_SIZE} bytes, zstd available: {ZSTD_AVAILABLE}")
+    print(f"{'orders':>7} {'encoding':<14} {'bytes':>10} {'ratio':>7} {'compress us':>12} {'ns/byte':>8} {'of request':>11}")
+
+    for size in BATCH_SIZES:
+        request = orjson.dumps(orders[:size])
+        identity = asyncio.run(post(constants.BATCH_CALCULATE_ENDPOINT, request, b"identity"))
+        request_time = best_cpu_time(lambda: asyncio.run(post(constants.BATCH_CALCULATE_ENDPOINT, request, b"identity")), 3)
+        print(f"{size:>7,} {'identity':<14} {len(identity):>10,} {1:>6.1f}x {0:>12,.1f} {0:>8.1f} {0:>10.1%}")
+
+        for name, accept_encoding, level in encodings():
+            constants.COMPRESSION_GZIP_LEVEL = level
+            compressed = asyncio.run(post(constants.BATCH_CALCULATE_ENDPOINT, request, accept_encoding))
+            encoding = accept_encoding.decode()
+            compress_time = best_cpu_time(lambda: Compressor(encoding).finish(identity), max(3, 20_000 // size))
+            print(
+                f"{size:>7,} {name:<14} {len(compressed):>10,} {len(identity) / len(compressed):>6.1f}x "
+                f"{compress_time:>12,.1f} {compress_time * 1e3 / len(identity):>8.1f} {compress_time / request_time:>10.1%}"
+            )
+    constants.COMPRESSION_GZIP_LEVEL = gzip_level
+
+    identity, gzip = single_fee_overhead()
+    print(f"single fee request: {identity:.1f} us without, {gzip:.1f} us with Accept-Encoding: gzip (not compressed)")
+
+
+if __name__ == "__main__":
+    main()
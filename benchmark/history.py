@@ -0,0 +1,81 @@
+"""
+Cost of pricing orders with a fee history (the schedule in force at each order time) compared to one fixed fee
+schedule, for a month of orders and histories with different numbers of versions.
+
+Run from the project root with:
+    python -m benchmark.history
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from app.config import FeeConfig
+from app.history import FeeHistory
+from app.schedule import FeeSchedule
+from app.vectorized import calculate_history_fees, calculate_schedule_fees
+
+ORDERS = 1_000_000
+SCALAR_ORDERS = 100_000
+VERSIONS = (1, 4, 30, 720)
+MONTH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def random_orders(rng: np.random.Generator, size: int) -> tuple:
+    """
+    :return: Order columns with order times in January 2024, sorted by time like an order history export
+    """
+    start = np.datetime64("2024-01-01T00:00:00", "us")
+    return (
+        rng.integers(1, 25_000, size),
+        rng.integers(1, 10_000, size),
+        rng.integers(1, 30, size),
+        start + np.sort(rng.integers(0, 31 * 24 * 60 * 60 * 1_000_000, size)).astype("timedelta64[us]"),
+    )
+
+
+def fee_history(versions: int) -> FeeHistory:
+    """
+    :return: History with the versions evenly spread over the month, with a different base delivery fee each
+    """
+    step = timedelta(days=31) / versions
+    return FeeHistory([(MONTH + i * step, FeeConfig(base_delivery_fee=200 + i % 100).schedule()) for i in range(versions)])
+
+
+def best_time(function, repeat: int = 5) -> float:
+    """
+    :return: Best wall-clock time of the function in seconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    columns = random_orders(rng, ORDERS)
+    shuffled = tuple(column[permutation] for column, permutation in zip(columns, [rng.permutation(ORDERS)] * 4))
+    scalar_orders = list(zip(*(column[:SCALAR_ORDERS].tolist() for column in columns)))
+    schedule = FeeSchedule.from_constants()
+
+    fixed = best_time(lambda: calculate_schedule_fees(schedule, *columns))
+    scalar_fixed = best_time(lambda: [schedule.calculate(*order) for order in scalar_orders], 3)
+    print(f"one schedule: vectorized {ORDERS / fixed:>12,.0f} orders/s, one at a time {SCALAR_ORDERS / scalar_fixed:>10,.0f} orders/s")
+
+    print(f"{'versions':>8} {'vectorized (orders/s)':>22} {'vs one':>7} {'shuffled (orders/s)':>20} {'one at a time (orders/s)':>25} {'vs one':>7}")
+    for versions in VERSIONS:
+        history = fee_history(versions)
+        vectorized = best_time(lambda: calculate_history_fees(history, *columns))
+        unsorted = best_time(lambda: calculate_history_fees(history, *shuffled))
+        scalar = best_time(lambda: [history.calculate(*order) for order in scalar_orders], 3)
+        print(
+            f"{versions:>8} {ORDERS / vectorized:>22,.0f} {vectorized / fixed:>6.2f}x {ORDERS / unsorted:>20,.0f} "
+            f"{SCALAR_ORDERS / scalar:>25,.0f} {scalar / scalar_fixed:>6.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Latency percentiles of the fee calculation endpoint under high concurrency, compared to the original sync handler
+(benchmark.reference). Each app is served by uvicorn in a separate process on loopback.
+
+Run from the project root with:
+    python -m benchmark.latency
+"""
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+import httpx
+import uvicorn
+
+from app import constants
+
+HOST = "127.0.0.1"
+PORT = 8765
+CONNECTIONS = 1_000
+REQUESTS_PER_CONNECTION = 10
+
+APPS = {
+    "reference": "benchmark.reference:reference_app",
+    "app.main": "app.main:app",
+}
+
+ORDER = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+def serve(app: str):
+    uvicorn.run(app, host=HOST, port=PORT, log_level="warning", backlog=CONNECTIONS * 2)
+
+
+async def wait_until_ready(client: httpx.AsyncClient):
+    for _ in range(100):
+        try:
+            await client.post(constants.CALCULATE_ENDPOINT, json=ORDER)
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+
+    raise RuntimeError("Server did not start")
+
+
+async def measure() -> list:
+    limits = httpx.Limits(max_connections=CONNECTIONS, max_keepalive_connections=CONNECTIONS)
+    async with httpx.AsyncClient(base_url=f"http://{HOST}:{PORT}", limits=limits, timeout=60) as client:
+        await wait_until_ready(client)
+        latencies = []
+
+        async def connection():
+            for _ in range(REQUESTS_PER_CONNECTION):
+                start = time.perf_counter()
+                response = await client.post(constants.CALCULATE_ENDPOINT, json=ORDER)
+                latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200
+
+        await asyncio.gather(*(connection() for _ in range(CONNECTIONS)))
+        return latencies
+
+
+def main():
+    print(f"{CONNECTIONS} concurrent connections, {REQUESTS_PER_CONNECTION} requests each")
+    for name, app in APPS.items():
+        server = multiprocessing.Process(target=serve, args=(app,), daemon=True)
+        server.start()
+        try:
+            latencies = asyncio.run(measure())
+        finally:
+            server.terminate()
+            server.join()
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        print(f"{name:<10} p50 {percentiles[49] * 1_000:>8.1f} ms, p99 {percentiles[98] * 1_000:>8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
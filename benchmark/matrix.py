@@ -0,0 +1,89 @@
+"""
+Delivery fees of one cart from many venues (e.g. a discovery page with 500 venues): the fee matrix against calculating
+the fees one order at a time, in-process and through the API.
+
+Run from the project root with:
+    python -m benchmark.matrix
+"""
+import random
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from fastapi.testclient import TestClient
+
+from app import constants
+from app.main import app
+from app.schedule import FeeSchedule
+from app.vectorized import calculate_fee_matrix
+
+VENUES = 500
+ROUNDS = 200
+API_ROUNDS = 10
+CART = {"cart_value": 790, "number_of_items": 4, "time": "2024-01-19T16:30:00Z"}
+
+
+def elapsed(function: Callable[[], object]) -> float:
+    """
+    :return: Run time of the function in microseconds
+    """
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1e6
+
+
+def best_times(functions: Dict[str, Callable[[], object]], rounds: int) -> Dict[str, float]:
+    """
+    Runs the functions in turns, so that they all see the same machine load.
+
+    :return: Best run time of each function in microseconds
+    """
+    times: Dict[str, List[float]] = {name: [] for name in functions}
+    for _ in range(rounds):
+        for name, function in functions.items():
+            times[name].append(elapsed(function))
+    return {name: min(runs) for name, runs in times.items()}
+
+
+def main():
+    rng = random.Random(0)
+    distances = [rng.randint(100, 10_000) for _ in range(VENUES)]
+    schedule = FeeSchedule.from_constants()
+    cart_value, number_of_items = CART["cart_value"], CART["number_of_items"]
+    order_time = datetime(2024, 1, 19, 16, 30, tzinfo=timezone.utc)
+    client = TestClient(app)
+    matrix_body = {"cart": CART, "delivery_distances": distances}
+
+    expected = [schedule.calculate(cart_value, distance, number_of_items, order_time) for distance in distances]
+    assert calculate_fee_matrix(schedule, [(cart_value, number_of_items, order_time)], distances)[0].tolist() == expected
+    assert client.post(constants.MATRIX_CALCULATE_ENDPOINT, json=matrix_body).json()["delivery_fees"] == expected
+
+    print(f"Fees of one cart from {VENUES} venues, best of {ROUNDS} (in-process) and {API_ROUNDS} (API) runs")
+    for name, microseconds in {
+        **best_times({
+            "FeeSchedule.calculate loop": lambda: [
+                schedule.calculate(cart_value, distance, number_of_items, order_time) for distance in distances
+            ],
+            "calculate_fee_matrix": lambda: calculate_fee_matrix(
+                schedule, [(cart_value, number_of_items, order_time)], distances,
+            ),
+        }, ROUNDS),
+        **best_times({
+            f"{VENUES} x {constants.CALCULATE_ENDPOINT}": lambda: [
+                client.post(constants.CALCULATE_ENDPOINT, json={**CART, "delivery_distance": distance})
+                for distance in distances
+            ],
+            f"{constants.BATCH_CALCULATE_ENDPOINT}": lambda: client.post(
+                constants.BATCH_CALCULATE_ENDPOINT,
+                json=[{**CART, "delivery_distance": distance} for distance in distances],
+            ),
+            f"{constants.MATRIX_CALCULATE_ENDPOINT}": lambda: client.post(
+                constants.MATRIX_CALCULATE_ENDPOINT, json=matrix_body,
+            ),
+        }, API_ROUNDS),
+    }.items():
+        print(f"{name:<28} {microseconds:>12,.0f} us  {microseconds / VENUES:>8.2f} us/venue")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""
+Cost of recording the metrics for a fee, and throughput of the fee calculation endpoint with and without metrics.
+
+Run from the project root with:
+    python -m benchmark.metrics
+"""
+import asyncio
+import timeit
+from datetime import datetime
+
+from app import metrics
+from app.main import app
+from app.schedule import get_fee_schedule
+from benchmark.throughput import requests_per_second
+
+NUMBER = 200_000
+
+
+def main():
+    values = (790, 2235, 14, datetime(2024, 1, 19, 16))
+    fee_schedule = get_fee_schedule()
+    fee = fee_schedule.calculate(*values)
+    latency = min(timeit.repeat(lambda: metrics.observe_fee(fee_schedule, *values, fee), number=NUMBER, repeat=5)) / NUMBER
+    print(f"observe_fee {latency * 1e9:.0f} ns/call")
+
+    for enabled in (False, True, False, True):
+        metrics.enabled = enabled
+        print(f"metrics {'enabled ' if enabled else 'disabled'} {asyncio.run(requests_per_second(app)):>10,.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+"""
+Fee calculation endpoint as it was originally implemented: a sync handler that FastAPI dispatches to the threadpool,
+with the request body validated into an Order. Used as the baseline in the endpoint benchmarks.
+"""
+from fastapi import Body, FastAPI
+
+from app import constants
+from app.order import Order
+
+reference_app = FastAPI()
+
+
+@reference_app.post(constants.CALCULATE_ENDPOINT)
+def delivery_fee(order: Order = Body()):
+    return {
+        "delivery_fee": order.calculate_delivery_fee()
+    }
@@ -0,0 +1,52 @@
+"""
+Throughput of the offline repricing tool with different numbers of worker processes.
+
+Run from the project root with:
+    python -m benchmark.reprice
+"""
+import csv
+import os
+import random
+import tempfile
+import time
+
+from app.reprice import reprice
+
+ROWS = 1_000_000
+
+
+def write_orders(path: str, rows: int):
+    rng = random.Random(0)
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["cart_value", "delivery_distance", "number_of_items", "time"])
+        for _ in range(rows):
+            writer.writerow([
+                rng.randint(1, 25_000),
+                rng.randint(1, 10_000),
+                rng.randint(1, 30),
+                f"2024-01-{rng.randint(1, 31):02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+            ])
+
+
+def main():
+    cpus = os.cpu_count() or 1
+    worker_counts = sorted({1, cpus} | {2 ** power for power in range(cpus.bit_length()) if 2 ** power <= cpus})
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_path = os.path.join(directory, "orders.csv")
+        output_path = os.path.join(directory, "repriced.csv")
+        write_orders(input_path, ROWS)
+
+        single = None
+        print(f"{'workers':>7} {'rows/s':>12} {'speedup':>8}")
+        for workers in worker_counts:
+            start = time.perf_counter()
+            reprice(input_path, output_path, workers=workers)
+            rate = ROWS / (time.perf_counter() - start)
+            single = single or rate
+            print(f"{workers:>7} {rate:>12,.0f} {rate / single:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
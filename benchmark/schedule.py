@@ -0,0 +1,65 @@
+"""
+Per-call latency of the compiled FeeSchedule compared to the Order path.
+
+The module constant based implementation Order used before FeeSchedule is kept here as a reference.
+
+Run from the project root with:
+    python -m benchmark.schedule
+"""
+import math
+import timeit
+from datetime import datetime, time
+
+from app import constants
+from app.order import Order
+from app.schedule import get_fee_schedule
+
+NUMBER = 200_000
+
+ORDER_VALUES = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 14,
+    "time": datetime(2024, 1, 19, 16),
+}
+
+
+def constants_calculate_delivery_fee(order: Order) -> int:
+    if order.cart_value >= constants.FREE_DELIVERY_THRESHOLD:
+        return 0
+
+    fee = constants.BASE_DELIVERY_FEE
+    if order.delivery_distance > constants.BASE_DELIVERY_FEE_DISTANCE:
+        additional_distance = order.delivery_distance - constants.BASE_DELIVERY_FEE_DISTANCE
+        fee += math.ceil(additional_distance / constants.ADDITIONAL_FEE_DISTANCE) * constants.ADDITIONAL_FEE
+    if order.number_of_items >= constants.ADDITIONAL_ITEM_LIMIT:
+        fee += (order.number_of_items - constants.ADDITIONAL_ITEM_LIMIT + 1) * constants.ADDITIONAL_ITEM_SURCHARGE
+    if order.cart_value < constants.SMALL_ORDER_THRESHOLD:
+        fee += constants.SMALL_ORDER_THRESHOLD - order.cart_value
+    if order.number_of_items > constants.BULK_FEE_THRESHOLD:
+        fee += constants.BULK_FEE
+    if order.time.weekday() == constants.RUSH_DELIVERY_DAY and time(constants.RUSH_DELIVERY_START, 0) <= order.time.time() <= time(constants.RUSH_DELIVERY_END, 0):
+        fee *= constants.RUSH_MULTIPLIER
+
+    return min(fee, constants.MAX_FEE)
+
+
+def main():
+    order = Order(**ORDER_VALUES)
+    values = tuple(ORDER_VALUES.values())
+    calculate = get_fee_schedule().calculate
+
+    cases = {
+        "Order(...).calculate_delivery_fee()": lambda: Order(**ORDER_VALUES).calculate_delivery_fee(),
+        "constants lookup (previous Order path)": lambda: constants_calculate_delivery_fee(order),
+        "order.calculate_delivery_fee()": order.calculate_delivery_fee,
+        "get_fee_schedule().calculate(...)": lambda: calculate(*values),
+    }
+
+    for name, case in cases.items():
+        latency = min(timeit.repeat(case, number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:<40} {latency * 1e9:>8.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
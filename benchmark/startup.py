@@ -0,0 +1,90 @@
+"""
+Cold start of the API: import time of app.main, time from starting the server process to the first successful fee
+calculation, and the time to generate the OpenAPI schema on the first documentation request.
+
+Every measurement starts a fresh Python process, so nothing is shared between the runs.
+
+Run from the project root with:
+    python -m benchmark.startup
+"""
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from app import constants
+
+HOST = "127.0.0.1"
+PORT = 8767
+RUNS = 5
+
+ORDER = (
+    b'{"cart_value": 790, "delivery_distance": 2235, "number_of_items": 4, "time": "2024-01-15T13:00:00Z"}'
+)
+
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import app.main
+print(time.perf_counter() - start)
+"""
+
+OPENAPI_SCRIPT = """
+import time
+from app.main import app
+start = time.perf_counter()
+app.openapi()
+print(time.perf_counter() - start)
+"""
+
+
+def run_script(script: str, env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True).stdout
+    return float(output)
+
+
+def post_order() -> bool:
+    request = (
+        f"POST {constants.CALCULATE_ENDPOINT} HTTP/1.1\r\nHost: {HOST}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(ORDER)}\r\nConnection: close\r\n\r\n"
+    ).encode() + ORDER
+    try:
+        with socket.create_connection((HOST, PORT), timeout=5) as sock:
+            sock.sendall(request)
+            return sock.recv(1_024).startswith(b"HTTP/1.1 200")
+    except OSError:
+        return False
+
+
+def time_to_first_request(env: dict) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", HOST, "--port", str(PORT), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        while not post_order():
+            if server.poll() is not None:
+                raise RuntimeError("Server exited")
+            time.sleep(0.005)
+        return time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    for docs in ("1", "0"):
+        env = {**os.environ, "DOCS_ENABLED": docs}
+        import_time = min(run_script(IMPORT_SCRIPT, env) for _ in range(RUNS))
+        first_request = min(time_to_first_request(env) for _ in range(RUNS))
+        print(f"docs {'enabled ' if docs == '1' else 'disabled'} import app.main {import_time * 1_000:>6.1f} ms, "
+              f"first request {first_request * 1_000:>6.1f} ms")
+
+    openapi = min(run_script(OPENAPI_SCRIPT, os.environ) for _ in range(RUNS))
+    print(f"OpenAPI schema generated on first /openapi.json request in {openapi * 1_000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
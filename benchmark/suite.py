@@ -0,0 +1,209 @@
+"""
+Benchmark suite for the fee API with stored baselines.
+
+Runs three levels of benchmarks:
+- micro: per-call latency of each Order method
+- endpoint: throughput and latency percentiles of the fee calculation endpoint with a fixed order
+- workload: the same for a realistic mixed workload (see benchmark.workload)
+
+Requests are sent to the ASGI app in-process, so the results measure the application and not the network.
+Results are compared to a JSON baseline, and the run fails if the throughput, p99 latency or time per call of any
+benchmark regresses by more than the threshold. Baselines depend on the machine, so record one on the machine that
+runs the comparison. Without a baseline the run fails.
+
+Run from the project root with:
+    python -m benchmark.suite --save      # record the baseline
+    python -m benchmark.suite             # compare against the baseline
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import httpx
+
+from app import constants
+from app.main import app
+from app.order import Order
+from benchmark.workload import generate_orders
+
+DEFAULT_BASELINE = "benchmark/baseline.json"
+DEFAULT_THRESHOLD = 0.2
+"""
+Allowed regression as a fraction of the baseline, e.g. 0.2 fails the run if the throughput drops below 80 % or
+the p99 latency or time per call grows above 120 % of the baseline.
+"""
+
+MICRO_NUMBER = 100_000
+REQUESTS = 10_000
+CONCURRENCY = 10
+ROUNDS = 3
+"""
+Endpoint benchmarks are run ROUNDS times and the best round is kept, so that a single noisy round does not fail the run.
+"""
+
+ORDER = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+def micro_benchmarks() -> Dict[str, dict]:
+    """
+    :return: Nanoseconds per call of each Order method, for a rush hour order that every fee rule applies to
+    """
+    order = Order(cart_value=790, delivery_distance=2235, number_of_items=14, time=datetime(2024, 1, 19, 16))
+    cases = {
+        "free_delivery": order.free_delivery,
+        "calculate_distance_fee": order.calculate_distance_fee,
+        "calculate_small_order_surcharge_fee": order.calculate_small_order_surcharge_fee,
+        "calculate_bulk_fee": order.calculate_bulk_fee,
+        "calculate_item_count_surcharge_fee": order.calculate_item_count_surcharge_fee,
+        "calculate_rush_hour_fees": lambda: order.calculate_rush_hour_fees(1_000),
+        "calculate_fee_breakdown": order.calculate_fee_breakdown,
+        "calculate_delivery_fee": order.calculate_delivery_fee,
+    }
+
+    results = {}
+    for name, case in cases.items():
+        seconds = min(timeit.repeat(case, number=MICRO_NUMBER, repeat=5)) / MICRO_NUMBER
+        results[f"micro.{name}"] = {"ns_per_call": round(seconds * 1e9, 1)}
+
+    return results
+
+
+async def endpoint_benchmark(orders: List[dict]) -> dict:
+    """
+    Sends the orders to the fee calculation endpoint from CONCURRENCY concurrent clients, cycling through the orders.
+
+    :return: Requests per second and latency percentiles in milliseconds
+    """
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        latencies = []
+
+        async def worker(offset: int, count: int, record: bool):
+            for i in range(count):
+                order = orders[(offset + i * CONCURRENCY) % len(orders)]
+                start = time.perf_counter()
+                response = await client.post(constants.CALCULATE_ENDPOINT, json=order)
+                if record:
+                    latencies.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+
+        await worker(0, 200, False)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(offset, REQUESTS // CONCURRENCY, True) for offset in range(CONCURRENCY)))
+        seconds = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        "requests_per_second": round(len(latencies) / seconds, 1),
+        "p50_ms": round(percentiles[49] * 1_000, 3),
+        "p99_ms": round(percentiles[98] * 1_000, 3),
+    }
+
+
+def best_round(orders: List[dict]) -> dict:
+    """
+    :return: Highest throughput and lowest latency percentiles of ROUNDS endpoint benchmark rounds
+    """
+    rounds = [asyncio.run(endpoint_benchmark(orders)) for _ in range(ROUNDS)]
+    return {
+        "requests_per_second": max(result["requests_per_second"] for result in rounds),
+        "p50_ms": min(result["p50_ms"] for result in rounds),
+        "p99_ms": min(result["p99_ms"] for result in rounds),
+    }
+
+
+def run() -> Dict[str, dict]:
+    """
+    :return: Results of all benchmarks by benchmark name
+    """
+    results = micro_benchmarks()
+    results["endpoint.feecalc"] = best_round([ORDER])
+    results["workload.mixed"] = best_round(generate_orders(REQUESTS))
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """
+    Compares the results to the baseline. Throughput must not drop and p99 latency and time per call must not grow
+    by more than the threshold. Benchmarks missing from either side are not compared.
+
+    :return: Descriptions of the regressions, empty if there are none
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+
+        if "requests_per_second" in result and "requests_per_second" in expected:
+            limit = expected["requests_per_second"] * (1 - threshold)
+            if result["requests_per_second"] < limit:
+                regressions.append(
+                    f"{name}: {result['requests_per_second']:,.0f} requests/s, "
+                    f"baseline {expected['requests_per_second']:,.0f} (limit {limit:,.0f})"
+                )
+        if "p99_ms" in result and "p99_ms" in expected:
+            limit = expected["p99_ms"] * (1 + threshold)
+            if result["p99_ms"] > limit:
+                regressions.append(f"{name}: p99 {result['p99_ms']:.3f} ms, baseline {expected['p99_ms']:.3f} ms (limit {limit:.3f})")
+        if "ns_per_call" in result and "ns_per_call" in expected:
+            limit = expected["ns_per_call"] * (1 + threshold)
+            if result["ns_per_call"] > limit:
+                regressions.append(
+                    f"{name}: {result['ns_per_call']:,.1f} ns per call, baseline {expected['ns_per_call']:,.1f} ns (limit {limit:,.1f})"
+                )
+
+    return regressions
+
+
+def _load(path: str) -> Optional[Dict[str, dict]]:
+    try:
+        with open(path) as file:
+            return json.load(file)["results"]
+    except FileNotFoundError:
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmark.suite", description="Run the fee API benchmark suite.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"baseline file (default: {DEFAULT_BASELINE})")
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"allowed regression (default: {DEFAULT_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    results = run()
+    for name, result in results.items():
+        print(f"{name:<45} " + ", ".join(f"{key} {value:,}" for key, value in result.items()))
+
+    if args.save:
+        with open(args.baseline, "w") as file:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(), "results": results}, file, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    baseline = _load(args.baseline)
+    if baseline is None:
+        print(f"No baseline at {args.baseline}, record one with --save", file=sys.stderr)
+        return 1
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+Startup cost, memory footprint and per-call latency of the table-driven fee engine
+compared to the fee schedule arithmetic.
+
+Run from the project root with:
+    python -m benchmark.tables
+"""
+import timeit
+from datetime import datetime
+
+from app.schedule import get_fee_schedule
+from app.tables import FeeTables
+
+NUMBER = 200_000
+
+ORDERS = {
+    "normal": (790, 2235, 4, datetime(2024, 1, 15, 13)),
+    "rush hour": (790, 2235, 14, datetime(2024, 1, 19, 16)),
+    "saturated": (1, 100_000, 100, datetime(2024, 1, 15, 13)),
+}
+
+
+def main():
+    fee_schedule = get_fee_schedule()
+    tables = FeeTables(fee_schedule)
+    print(f"build time {tables.build_seconds * 1_000:.2f} ms, memory {tables.nbytes:,} bytes "
+          f"(distance {tables.max_distance + 1}, items {tables.max_items + 1}, "
+          f"cart value {len(tables.small_order_fees)} entries)")
+
+    for name, values in ORDERS.items():
+        schedule = min(timeit.repeat(lambda: fee_schedule.calculate(*values), number=NUMBER, repeat=5)) / NUMBER
+        table = min(timeit.repeat(lambda: tables.calculate(*values), number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:<10} schedule {schedule * 1e9:>6.0f} ns/call, tables {table * 1e9:>6.0f} ns/call")
+
+
+if __name__ == "__main__":
+    main()
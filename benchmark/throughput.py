@@ -0,0 +1,50 @@
+"""
+Requests per second of the fee calculation endpoint compared to a handler that validates the request body
+into an Order with FastAPI. Requests are sent to the ASGI apps in-process, so the results measure the application
+and not the network.
+
+Run from the project root with:
+    python -m benchmark.throughput
+"""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app import constants
+from app.main import app
+from benchmark.reference import reference_app
+
+REQUESTS = 20_000
+CONCURRENCY = 100
+
+ORDER = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+async def requests_per_second(asgi_app: FastAPI) -> float:
+    transport = httpx.ASGITransport(app=asgi_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker(count: int):
+            for _ in range(count):
+                response = await client.post(constants.CALCULATE_ENDPOINT, json=ORDER)
+                assert response.status_code == 200
+
+        await worker(100)
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(REQUESTS // CONCURRENCY) for _ in range(CONCURRENCY)))
+        return REQUESTS / (time.perf_counter() - start)
+
+
+def main():
+    for name, asgi_app in (("reference", reference_app), ("app.main", app)):
+        print(f"{name:<24} {asyncio.run(requests_per_second(asgi_app)):>10,.0f} requests/s")
+
+
+if __name__ == "__main__":
+    main()
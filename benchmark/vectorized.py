@@ -0,0 +1,55 @@
+"""
+Compares the vectorized fee engine against calculating the fees one Order at a time.
+
+Run from the project root with:
+    python -m benchmark.vectorized
+"""
+import time
+
+import numpy as np
+
+from app import constants
+from app.order import Order
+from app.vectorized import calculate_delivery_fees
+
+SIZES = (1_000, 100_000, 10_000_000)
+SCALAR_LIMIT = 100_000
+
+
+def random_orders(rng: np.random.Generator, size: int) -> tuple:
+    start = np.datetime64("2024-01-01T00:00:00", "us")
+    return (
+        rng.integers(1, constants.FREE_DELIVERY_THRESHOLD + 1_000, size),
+        rng.integers(1, 10_000, size),
+        rng.integers(1, 30, size),
+        start + rng.integers(0, 366 * 24 * 60 * 60, size).astype("timedelta64[s]"),
+    )
+
+
+def main():
+    rng = np.random.default_rng(0)
+
+    print(f"{'orders':>10} {'Order (orders/s)':>17} {'vectorized (orders/s)':>22}")
+    for size in SIZES:
+        cart_value, delivery_distance, number_of_items, times = random_orders(rng, size)
+
+        scalar = "-"
+        if size <= SCALAR_LIMIT:
+            orders = [
+                Order(cart_value=c, delivery_distance=d, number_of_items=n, time=t)
+                for c, d, n, t in zip(cart_value.tolist(), delivery_distance.tolist(), number_of_items.tolist(), times.tolist())
+            ]
+            start = time.perf_counter()
+            for order in orders:
+                order.calculate_delivery_fee()
+            scalar = f"{size / (time.perf_counter() - start):,.0f}"
+
+        start = time.perf_counter()
+        calculate_delivery_fees(cart_value, delivery_distance, number_of_items, times)
+        vectorized = size / (time.perf_counter() - start)
+
+        print(f"{size:>10} {scalar:>17} {vectorized:>22,.0f}")
+
+
+if __name__ == "__main__":
+    main()
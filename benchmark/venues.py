@@ -0,0 +1,83 @@
+"""
+Finding the venues within a radius of a customer: a loop of haversine distances over all venues (what callers did
+before), the vectorized haversine over all venues, and the grid index of the venue file. Also the time of the
+nearby venue fee endpoint.
+
+Run from the project root with:
+    python -m benchmark.venues
+"""
+import os
+import random
+import tempfile
+import time
+from typing import Callable
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app import constants
+from app.geo import delivery_distance, haversine_distance
+from app.main import app
+from app.venues import VenueIndex, write_venue_file
+
+CITY_VENUES = 100_000
+WORLD_VENUES = 100_000
+RADIUS = 3_000
+ROUNDS = 20
+CART = {"cart_value": 790, "number_of_items": 4, "time": "2024-01-19T16:30:00Z"}
+
+
+def best_time(function: Callable[[], object], rounds: int) -> float:
+    """
+    :return: Best run time of the function in microseconds
+    """
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1e6
+
+
+def main():
+    rng = random.Random(0)
+    venues = [(f"city-{i}", rng.gauss(60.19, 0.05), rng.gauss(24.94, 0.1)) for i in range(CITY_VENUES)]
+    venues += [(f"world-{i}", rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(WORLD_VENUES)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "venues.bin")
+        write_venue_file(path, venues)
+        index = VenueIndex(path)
+        latitudes, longitudes = index.latitudes.tolist(), index.longitudes.tolist()
+        everything = np.arange(len(index))
+        latitude, longitude = 60.17, 24.94
+
+        def python_loop():
+            return [
+                venue for venue, (venue_latitude, venue_longitude) in enumerate(zip(latitudes, longitudes))
+                if delivery_distance(haversine_distance(latitude, longitude, venue_latitude, venue_longitude)) <= RADIUS
+            ]
+
+        def vectorized():
+            return np.flatnonzero(index.distances(latitude, longitude, everything) <= RADIUS)
+
+        found = index.within(latitude, longitude, RADIUS)[0]
+        assert sorted(found.tolist()) == vectorized().tolist() == python_loop()
+
+        constants.VENUE_FILE_PATH = path
+        client = TestClient(app)
+        body = {"cart": CART, "customer_location": {"latitude": latitude, "longitude": longitude}, "radius": RADIUS}
+        assert len(client.post(constants.NEARBY_CALCULATE_ENDPOINT, json=body).json()["venue_ids"]) == len(found)
+
+        print(f"{len(venues):,} venues, {len(found):,} within {RADIUS} m, best of {ROUNDS} runs")
+        for name, microseconds in (
+            ("haversine loop", best_time(python_loop, 3)),
+            ("vectorized haversine", best_time(vectorized, ROUNDS)),
+            ("grid index", best_time(lambda: index.within(latitude, longitude, RADIUS), ROUNDS)),
+            (constants.NEARBY_CALCULATE_ENDPOINT, best_time(lambda: client.post(constants.NEARBY_CALCULATE_ENDPOINT, json=body), ROUNDS)),
+        ):
+            print(f"{name:<22} {microseconds:>12,.0f} us")
+
+
+if __name__ == "__main__":
+    main()
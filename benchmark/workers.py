@@ -0,0 +1,113 @@
+"""
+Throughput of the production launcher (app.serve) with an increasing number of worker processes.
+
+The load is generated by separate client processes that send pre-encoded requests over raw keep-alive connections,
+so that the client is not the bottleneck. On a machine with few cores the clients and workers compete for the same
+CPUs, so the scaling is best measured with more cores than workers.
+
+Run from the project root with:
+    python -m benchmark.workers
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app import constants
+
+HOST = "127.0.0.1"
+PORT = 8766
+DURATION = 5.0
+CLIENT_PROCESSES = max(1, (os.cpu_count() or 1) // 2)
+CONNECTIONS_PER_CLIENT = 32
+
+ORDER = json.dumps({
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}).encode()
+
+REQUEST = (
+    f"POST {constants.CALCULATE_ENDPOINT} HTTP/1.1\r\n"
+    f"Host: {HOST}:{PORT}\r\n"
+    "Content-Type: application/json\r\n"
+    f"Content-Length: {len(ORDER)}\r\n"
+    "\r\n"
+).encode() + ORDER
+
+
+def worker_counts() -> list:
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def wait_until_ready():
+    for _ in range(100):
+        try:
+            httpx.get(f"http://{HOST}:{PORT}{constants.HEALTH_ENDPOINT}").raise_for_status()
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+
+    raise RuntimeError("Server did not start")
+
+
+async def connection_requests(deadline: float) -> int:
+    reader, writer = await asyncio.open_connection(HOST, PORT)
+    count = 0
+    try:
+        while time.perf_counter() < deadline:
+            writer.write(REQUEST)
+            headers = await reader.readuntil(b"\r\n\r\n")
+            assert headers.startswith(b"HTTP/1.1 200"), headers
+            length = int(headers.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+            count += 1
+    finally:
+        writer.close()
+
+    return count
+
+
+async def client_requests(deadline: float) -> int:
+    return sum(await asyncio.gather(*(connection_requests(deadline) for _ in range(CONNECTIONS_PER_CLIENT))))
+
+
+def run_client(duration: float) -> int:
+    return asyncio.run(client_requests(time.perf_counter() + duration))
+
+
+def requests_per_second(workers: int) -> float:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--host", HOST, "--port", str(PORT), "--workers", str(workers), "--log-level", "warning"],
+    )
+    try:
+        wait_until_ready()
+        with multiprocessing.Pool(CLIENT_PROCESSES) as pool:
+            start = time.perf_counter()
+            total = sum(pool.map(run_client, [DURATION] * CLIENT_PROCESSES))
+            return total / (time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    print(f"{os.cpu_count()} CPUs, {CLIENT_PROCESSES} client processes with {CONNECTIONS_PER_CLIENT} connections each")
+    single = None
+    for workers in worker_counts():
+        rate = requests_per_second(workers)
+        single = single or rate
+        print(f"{workers:>3} workers {rate:>10,.0f} requests/s {rate / single:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Generator for realistic mixed fee calculation workloads.
+
+Orders are drawn from distributions that roughly follow real traffic: most carts are small to medium, distances
+cluster around a few kilometers, and a configurable share of the orders are placed during rush hour or qualify for
+free delivery.
+"""
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+from app import constants
+
+RUSH_HOUR_RATIO = 0.2
+"""
+Default share of orders placed during rush hour.
+"""
+
+FREE_DELIVERY_RATIO = 0.05
+"""
+Default share of orders with a cart value that qualifies for free delivery.
+"""
+
+_MONDAY = datetime(2024, 1, 15)
+
+
+def _rush_hour_time(rng: random.Random) -> datetime:
+    start = _MONDAY + timedelta(days=constants.RUSH_DELIVERY_DAY, hours=constants.RUSH_DELIVERY_START)
+    seconds = (constants.RUSH_DELIVERY_END - constants.RUSH_DELIVERY_START) * 3600
+    return start + timedelta(seconds=rng.randint(0, seconds))
+
+
+def _other_time(rng: random.Random) -> datetime:
+    while True:
+        order_time = _MONDAY + timedelta(seconds=rng.randrange(7 * 24 * 3600))
+        if order_time.weekday() != constants.RUSH_DELIVERY_DAY or not (
+            constants.RUSH_DELIVERY_START <= order_time.hour <= constants.RUSH_DELIVERY_END
+        ):
+            return order_time
+
+
+def generate_orders(
+    count: int,
+    rush_hour_ratio: float = RUSH_HOUR_RATIO,
+    free_delivery_ratio: float = FREE_DELIVERY_RATIO,
+    seed: int = 0,
+) -> List[dict]:
+    """
+    Generates fee calculation request bodies. The same seed always generates the same orders.
+
+    :return: List of order request bodies
+    """
+    rng = random.Random(seed)
+    orders = []
+    for _ in range(count):
+        if rng.random() < free_delivery_ratio:
+            cart_value = rng.randint(constants.FREE_DELIVERY_THRESHOLD, 3 * constants.FREE_DELIVERY_THRESHOLD)
+        else:
+            cart_value = min(int(rng.lognormvariate(7.8, 0.6)) + 1, constants.FREE_DELIVERY_THRESHOLD - 1)
+
+        order_time = _rush_hour_time(rng) if rng.random() < rush_hour_ratio else _other_time(rng)
+        orders.append({
+            "cart_value": cart_value,
+            "delivery_distance": max(1, int(rng.gammavariate(2.0, 900))),
+            "number_of_items": min(int(rng.expovariate(0.3)) + 1, 40),
+            "time": order_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+
+    return orders
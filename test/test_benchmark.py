@@ -0,0 +1,47 @@
+from datetime import datetime
+
+from app import constants
+from app.schedule import FeeSchedule
+from benchmark import suite
+from benchmark.suite import compare
+from benchmark.workload import generate_orders
+
+
+def test_compare_detects_regressions():
+    baseline = {
+        "endpoint": {"requests_per_second": 1_000, "p99_ms": 1.0},
+        "micro": {"ns_per_call": 100},
+    }
+
+    assert compare({"endpoint": {"requests_per_second": 900, "p99_ms": 1.1}, "micro": {"ns_per_call": 110}}, baseline, 0.2) == []
+    assert compare({"new": {"requests_per_second": 1, "p99_ms": 100}}, baseline, 0.2) == []
+
+    regressions = compare({"endpoint": {"requests_per_second": 700, "p99_ms": 1.5}}, baseline, 0.2)
+    assert len(regressions) == 2
+    assert all(regression.startswith("endpoint:") for regression in regressions)
+
+    regressions = compare({"micro": {"ns_per_call": 1_000}}, baseline, 0.2)
+    assert regressions == ["micro: 1,000.0 ns per call, baseline 100.0 ns (limit 120.0)"]
+
+
+def test_missing_baseline_fails(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(suite, "run", lambda: {"micro": {"ns_per_call": 100}})
+
+    assert suite.main(["--baseline", str(tmp_path / "baseline.json")]) == 1
+    assert "No baseline" in capsys.readouterr().err
+
+    assert suite.main(["--baseline", str(tmp_path / "baseline.json"), "--save"]) == 0
+    assert suite.main(["--baseline", str(tmp_path / "baseline.json")]) == 0
+
+
+def test_workload_ratios():
+    schedule = FeeSchedule.from_constants()
+    orders = generate_orders(10_000, rush_hour_ratio=0.3, free_delivery_ratio=0.1)
+
+    rush_hour = sum(schedule.is_rush_hour(datetime.fromisoformat(order["time"][:-1])) for order in orders) / len(orders)
+    free_delivery = sum(order["cart_value"] >= constants.FREE_DELIVERY_THRESHOLD for order in orders) / len(orders)
+
+    assert 0.27 < rush_hour < 0.33
+    assert 0.08 < free_delivery < 0.12
+    assert all(order["cart_value"] > 0 and order["delivery_distance"] > 0 and order["number_of_items"] > 0 for order in orders)
+    assert generate_orders(100) == generate_orders(100)
@@ -0,0 +1,168 @@
+import asyncio
+import random
+import socket
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.server
+from app import constants
+from app.binary import PREFACE, REQUEST, RESPONSE, STATUS_INVALID_ORDER, STATUS_OK, FeeClient, InvalidOrderError, start_server
+from app.main import app as fastapi_app
+from app.schedule import get_fee_schedule
+
+ORDER = (790, 2235, 4, datetime(2024, 1, 15, 13))
+
+
+def serve(test):
+    """
+    Runs the test coroutine with a binary protocol server on a free port.
+    """
+    async def run():
+        server = await start_server("127.0.0.1", 0)
+        try:
+            await test(server.sockets[0].getsockname()[1])
+        finally:
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
+
+
+def test_unary_calls():
+    async def test(port):
+        client = await FeeClient.connect("127.0.0.1", port)
+        assert await client.calculate(*ORDER) == 710
+        # Concurrent calls on one connection, rush hour with an aware time, and a value too large for the frame.
+        rush_hour = datetime(2024, 1, 19, 16, tzinfo=timezone.utc)
+        assert await asyncio.gather(
+            client.calculate(790, 1, 4, rush_hour),
+            client.calculate(790, 2235, 4, rush_hour),
+            client.calculate(790, 2 ** 80, 4, rush_hour),
+            client.calculate(2 ** 80, 2235, 4, rush_hour),
+        ) == [492, 852, 1500, 0]
+
+        with pytest.raises(InvalidOrderError):
+            await client.calculate(0, 2235, 4, ORDER[3])
+        assert await client.calculate(*ORDER) == 710
+        await client.close()
+
+    serve(test)
+
+
+def test_order_times_with_utc_offsets():
+    # Rush hours are checked against the wall-clock time of the order time as given, like in the API.
+    orders = [
+        (790, 2235, 4, datetime(2024, 1, 19, 16, tzinfo=timezone(timedelta(hours=2)))),
+        (790, 2235, 4, datetime(2024, 1, 19, 14, tzinfo=timezone.utc)),
+        (790, 2235, 4, datetime(2024, 1, 19, 23, 30, tzinfo=timezone(timedelta(hours=-5, minutes=-30)))),
+        (790, 2235, 4, datetime(2024, 1, 20, 1, tzinfo=timezone(timedelta(hours=10)))),
+    ]
+    client = TestClient(fastapi_app)
+    expected = [
+        client.post(constants.CALCULATE_ENDPOINT, json={
+            "cart_value": cart_value,
+            "delivery_distance": delivery_distance,
+            "number_of_items": number_of_items,
+            "time": order_time.isoformat(),
+        }).json()["delivery_fee"]
+        for cart_value, delivery_distance, number_of_items, order_time in orders
+    ]
+    assert expected == [852, 710, 710, 710]
+
+    async def test(port):
+        client = await FeeClient.connect("127.0.0.1", port)
+        assert [await client.calculate(*order) for order in orders] == expected
+        assert [fee async for fee in client.stream(orders)] == expected
+        await client.close()
+
+    serve(test)
+
+
+def test_streaming_call():
+    rng = random.Random(0)
+    orders = [
+        (
+            rng.randint(1, 25_000),
+            rng.randint(1, 10_000),
+            rng.randint(1, 20),
+            datetime(2024, 1, 15) + timedelta(minutes=rng.randint(0, 7 * 24 * 60)),
+        )
+        for _ in range(5_000)
+    ]
+
+    async def test(port):
+        client = await FeeClient.connect("127.0.0.1", port)
+        fees = [fee async for fee in client.stream(orders)]
+        assert fees == [get_fee_schedule().calculate(*order) for order in orders]
+
+        # The stream stops at the first invalid order.
+        with pytest.raises(InvalidOrderError):
+            async for _ in client.stream([ORDER, (790, -1, 4, ORDER[3]), ORDER]):
+                pass
+        assert [fee async for fee in client.stream([])] == []
+        await client.close()
+
+    serve(test)
+
+
+def test_raw_frames():
+    async def test(port):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        microseconds = int(datetime(2024, 1, 15, 13, tzinfo=timezone.utc).timestamp()) * 1_000_000
+        frames = (
+            PREFACE
+            + REQUEST.pack(7, 790, 2235, 4, microseconds, 0)
+            + REQUEST.pack(8, 790, 2235, 0, microseconds, 0)
+            + REQUEST.pack(9, 790, 2235, 4, 2 ** 63 - 1, 0)
+            + REQUEST.pack(10, 790, 2235, 4, microseconds, 24 * 60 * 60)
+        )
+        # Frames split across writes are reassembled.
+        for i in range(0, len(frames), 5):
+            writer.write(frames[i:i + 5])
+            await writer.drain()
+
+        responses = [RESPONSE.unpack(await reader.readexactly(RESPONSE.size)) for _ in range(4)]
+        assert responses == [
+            (7, STATUS_OK, 710),
+            (8, STATUS_INVALID_ORDER, 0),
+            (9, STATUS_INVALID_ORDER, 0),
+            (10, STATUS_INVALID_ORDER, 0),
+        ]
+        writer.close()
+
+        # Connections that do not start with the preface are closed.
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"POST /feecalc HTTP/1.1\r\n\r\n")
+        assert await reader.read() == b""
+        writer.close()
+
+    serve(test)
+
+
+def test_closed_connection():
+    async def test(port):
+        client = await FeeClient.connect("127.0.0.1", port)
+        await client.close()
+        with pytest.raises(ConnectionError):
+            await client.calculate(*ORDER)
+
+    serve(test)
+
+
+def test_served_with_the_api(monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(app.server, "BINARY_PORT", port)
+
+    async def calculate():
+        client = await FeeClient.connect("127.0.0.1", port)
+        try:
+            return await client.calculate(*ORDER)
+        finally:
+            await client.close()
+
+    with TestClient(fastapi_app) as client:
+        assert client.portal.call(calculate) == 710
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from app import constants
+from app.cache import QuoteCache
+from app.schedule import FeeSchedule
+
+not_rush_hour_date = datetime(2024, 1, 20, 12)
+rush_hour_date = datetime(2024, 1, 19, constants.RUSH_DELIVERY_START)
+fee_schedule = FeeSchedule.from_constants()
+
+
+def test_cache_hits_and_misses():
+    cache = QuoteCache(maxsize=10, ttl=60)
+    values = (790, 2235, 4, not_rush_hour_date)
+
+    assert cache.calculate(fee_schedule, *values) == fee_schedule.calculate(*values)
+    assert cache.calculate(fee_schedule, *values) == fee_schedule.calculate(*values)
+    assert cache.info() == {"hits": 1, "misses": 1, "maxsize": 10, "currsize": 1}
+
+    # Orders with the same normalized values share the cache entry.
+    assert cache.calculate(fee_schedule, 790, 2236, 4, datetime(2024, 1, 21, 9)) == fee_schedule.calculate(*values)
+    assert cache.hits == 2
+
+    # Rush hour is a different entry.
+    assert cache.calculate(fee_schedule, 790, 2235, 4, rush_hour_date) == \
+        fee_schedule.calculate(790, 2235, 4, rush_hour_date)
+    assert cache.misses == 2
+
+    # Free delivery is not cached.
+    assert cache.calculate(fee_schedule, constants.FREE_DELIVERY_THRESHOLD, 2235, 4, not_rush_hour_date) == 0
+    assert len(cache) == 2
+
+    cache.clear()
+    assert cache.info() == {"hits": 0, "misses": 0, "maxsize": 10, "currsize": 0}
+
+
+def test_quote_key():
+    distance = constants.BASE_DELIVERY_FEE_DISTANCE
+    items = constants.ADDITIONAL_ITEM_LIMIT
+
+    key = fee_schedule.quote_key(constants.SMALL_ORDER_THRESHOLD, distance, items, not_rush_hour_date)
+    assert fee_schedule.quote_key(constants.SMALL_ORDER_THRESHOLD + 1, 1, items, not_rush_hour_date) == key
+    assert fee_schedule.quote_key(constants.SMALL_ORDER_THRESHOLD - 1, distance, items, not_rush_hour_date) != key
+    assert fee_schedule.quote_key(constants.SMALL_ORDER_THRESHOLD, distance + 1, items, not_rush_hour_date) != key
+    assert fee_schedule.quote_key(constants.SMALL_ORDER_THRESHOLD, distance, items + 1, not_rush_hour_date) != key
+    assert fee_schedule.quote_key(constants.SMALL_ORDER_THRESHOLD, distance, items, rush_hour_date) != key
+
+
+def test_cache_eviction_and_expiry():
+    cache = QuoteCache(maxsize=2, ttl=60)
+
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    cache.calculate(fee_schedule, 790, 2_000, 1, not_rush_hour_date)
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    cache.calculate(fee_schedule, 790, 3_000, 1, not_rush_hour_date)
+    assert len(cache) == 2
+
+    # Least recently used entry (2000 m) was evicted.
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    assert cache.hits == 2
+    cache.calculate(fee_schedule, 790, 2_000, 1, not_rush_hour_date)
+    assert cache.misses == 4
+
+    cache = QuoteCache(maxsize=2, ttl=0)
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    assert cache.hits == 0
+
+    cache = QuoteCache(maxsize=0)
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    assert len(cache) == 0
+
+
+def test_cache_invalidated_on_schedule_change():
+    cache = QuoteCache(maxsize=10, ttl=60)
+    values = (790, 2235, 4, not_rush_hour_date)
+    cache.calculate(fee_schedule, *values)
+
+    schedule = FeeSchedule.from_constants()
+    schedule.base_delivery_fee += 100
+
+    assert cache.calculate(schedule, *values) == fee_schedule.calculate(*values) + 100
+    assert cache.hits == 0
+    assert len(cache) == 1
@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app.main
+from app import constants
+from app.coalesce import SingleFlight, request_flights
+
+ORDER = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+def test_single_flight():
+    async def run():
+        flights = SingleFlight()
+        calls = []
+
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.01)
+            return value * 2
+
+        results = await asyncio.gather(*(flights.run(key, lambda key=key: compute(key)) for key in (1, 1, 2, 1, 2)))
+        assert results == [2, 2, 4, 2, 4]
+        assert calls == [1, 2]
+        assert (flights.leaders, flights.coalesced, len(flights)) == (2, 3, 0)
+
+        # Finished computations are not reused.
+        assert await flights.run(1, lambda: compute(1)) == 2
+        assert calls == [1, 2, 1]
+
+    asyncio.run(run())
+
+
+def test_single_flight_errors_and_cancellation():
+    async def run():
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("failed")
+
+        results = await asyncio.gather(*(flights.run("key", fail) for _ in range(3)), return_exceptions=True)
+        assert [type(result) for result in results] == [ValueError] * 3
+
+        async def compute():
+            await asyncio.sleep(0.01)
+            return "result"
+
+        leader = asyncio.create_task(flights.run("key", compute))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(flights.run("key", compute))
+        follower = asyncio.create_task(flights.run("key", compute))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+
+        assert await leader == "result"
+        assert await follower == "result"
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+        # A cancelled leader does not cancel the computation for the callers still waiting for it.
+        leader = asyncio.create_task(flights.run("key", compute))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(flights.run("key", compute)) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await asyncio.gather(*followers) == ["result"] * 2
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert len(flights) == 0
+
+        # The exception of a computation that every caller stopped waiting for is retrieved.
+        leader = asyncio.create_task(flights.run("failing", fail))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0.02)
+        assert len(flights) == 0
+
+    asyncio.run(run())
+
+
+def test_coalesced_endpoint(monkeypatch):
+    monkeypatch.setattr(app.main, "COALESCE_REQUESTS", True)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            before = request_flights.coalesced
+            responses = await asyncio.gather(
+                *(client.post(constants.CALCULATE_ENDPOINT, json=ORDER) for _ in range(10)),
+                client.post(constants.CALCULATE_ENDPOINT, json={**ORDER, "number_of_items": 14}),
+            )
+            assert [response.json() for response in responses] == [{"delivery_fee": 710}] * 10 + [{"delivery_fee": 1330}]
+            assert request_flights.coalesced > before
+
+            # Requests are coalesced by quote, not by body: the same order with the keys in another order and an
+            # order that differs only in values the fee does not depend on.
+            before = request_flights.coalesced
+            responses = await asyncio.gather(
+                client.post(constants.CALCULATE_ENDPOINT, json=ORDER),
+                client.post(constants.CALCULATE_ENDPOINT, json=dict(reversed(list(ORDER.items())))),
+                client.post(constants.CALCULATE_ENDPOINT, json={**ORDER, "delivery_distance": ORDER["delivery_distance"] + 1}),
+            )
+            assert [response.json() for response in responses] == [{"delivery_fee": 710}] * 3
+            assert request_flights.coalesced - before == 2
+
+            invalid = await asyncio.gather(*(client.post(constants.CALCULATE_ENDPOINT, json={"cart_value": 0}) for _ in range(3)))
+            assert [response.status_code for response in invalid] == [422] * 3
+            assert invalid[0].json() == invalid[2].json()
+            assert invalid[0].json()["detail"][0]["loc"] == ["body", "cart_value"]
+
+    asyncio.run(run())
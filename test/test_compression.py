@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+import json
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import constants
+from app.compression import SUPPORTED_ENCODINGS, ZSTD_AVAILABLE, CompressionMiddleware, negotiate
+from app.main import app
+
+client = TestClient(app)
+
+order = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+def test_negotiate():
+    assert negotiate(b"gzip") == "gzip"
+    assert negotiate(b"gzip, deflate, br") == "gzip"
+    assert negotiate(b"GZIP;q=0.5") == "gzip"
+    assert negotiate(b"*") == SUPPORTED_ENCODINGS[0]
+    assert negotiate(b"gzip;q=0.5, zstd") == ("zstd" if ZSTD_AVAILABLE else "gzip")
+    assert negotiate(b"zstd;q=0.5, gzip") == "gzip"
+
+    assert negotiate(b"identity") is None
+    assert negotiate(b"br, deflate") is None
+    assert negotiate(b"gzip;q=0") is None
+    assert negotiate(b"*, gzip;q=0") == ("zstd" if ZSTD_AVAILABLE else None)
+    assert negotiate(b"gzip;q=invalid") is None
+    assert negotiate(b"") is None
+
+
+def test_small_responses_are_not_compressed():
+    response = client.post(constants.CALCULATE_ENDPOINT, json=order, headers={"accept-encoding": "gzip"})
+    assert response.json() == {"delivery_fee": 710}
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(response.content))
+
+
+def test_batch_response_is_compressed():
+    orders = [{**order, "delivery_distance": distance} for distance in range(1, 2_000)]
+    plain = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders, headers={"accept-encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+
+    # The test client decodes the response, the raw stream is the compressed body.
+    compressed = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders, headers={"accept-encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.headers["vary"] == "Accept-Encoding"
+    assert compressed.json() == plain.json()
+    assert int(compressed.headers["content-length"]) < len(plain.content) / 5
+
+
+def call(asgi_app, path: str, chunks: list, accept_encoding: bytes) -> list:
+    """
+    Calls the ASGI app directly, with each chunk of the request body in its own message.
+
+    :return: Messages sent by the app
+    """
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"accept-encoding", accept_encoding)],
+        "client": ("127.0.0.1", 50000),
+        "server": ("test", 80),
+    }
+    messages = []
+    requests = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks)} for i, chunk in enumerate(chunks, 1)]
+
+    async def receive():
+        if requests:
+            return requests.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi_app(scope, receive, send))
+    return messages
+
+
+def test_stream_chunks_are_flushed():
+    lines = b"\n".join(json.dumps({**order, "delivery_distance": distance}).encode() for distance in range(1, 100))
+    start, *bodies = call(app, constants.STREAM_CALCULATE_ENDPOINT, [lines + b"\n", lines], b"gzip")
+
+    headers = dict(start["headers"])
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+
+    # Every chunk decodes to whole result lines as soon as it arrives.
+    decompressor = zlib.decompressobj(31)
+    results = []
+    for body in bodies:
+        decoded = decompressor.decompress(body["body"])
+        assert decoded == b"" or decoded.endswith(b"\n")
+        results += decoded.splitlines()
+    assert decompressor.eof
+    assert len(bodies) > 2
+    _, *plain = call(app, constants.STREAM_CALCULATE_ENDPOINT, [lines + b"\n", lines], b"identity")
+    assert results == b"".join(body["body"] for body in plain).splitlines()
+    assert len(results) == 198
+
+
+def test_encoded_responses_are_not_compressed_again():
+    body = gzip.compress(b"x" * 10_000)
+
+    async def encoded_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-encoding", b"gzip")]})
+        await send({"type": "http.response.body", "body": body})
+
+    start, message = call(CompressionMiddleware(encoded_app), "/", [b""], b"gzip")
+    assert start["headers"] == [(b"content-encoding", b"gzip")]
+    assert message["body"] == body
+
+
+def test_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    orders = [order] * 1_000
+
+    response = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders, headers={"accept-encoding": "zstd"})
+    assert response.headers["content-encoding"] == "zstd"
+    start, message = call(app, constants.BATCH_CALCULATE_ENDPOINT, [json.dumps(orders).encode()], b"zstd")
+    assert json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(message["body"]))["results"][0] == {"delivery_fee": 710}
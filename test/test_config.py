@@ -0,0 +1,248 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config, constants, main
+from app.config import ConfigWatcher, FeeConfig, load_fee_config, save_fee_config
+from app.main import app
+from app.schedule import FeeSchedule, get_fee_schedule, set_fee_schedule
+
+client = TestClient(app)
+
+CONFIG_TOKEN = "test-token"
+
+admin_client = TestClient(app, headers={"Authorization": f"Bearer {CONFIG_TOKEN}"})
+
+
+async def local_app(scope, receive, send):
+    await app({**scope, "client": ("127.0.0.1", 50000)}, receive, send)
+
+
+local_client = TestClient(local_app)
+
+order = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+@pytest.fixture(autouse=True)
+def restore_fee_schedule():
+    schedule = get_fee_schedule()
+    yield
+    set_fee_schedule(schedule)
+
+
+@pytest.fixture(autouse=True)
+def config_token(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "CONFIG_TOKEN", CONFIG_TOKEN)
+    monkeypatch.setattr(main, "config_watcher", ConfigWatcher(str(tmp_path / "fees.json")))
+
+
+def test_config_defaults_to_constants():
+    schedule = FeeConfig().schedule()
+    default = FeeSchedule.from_constants()
+
+    assert FeeConfig.from_schedule(schedule) == FeeConfig()
+    for values in ((790, 2235, 4, datetime(2024, 1, 15, 13)), (790, 2235, 14, datetime(2024, 1, 19, 16))):
+        assert schedule.calculate(*values) == default.calculate(*values)
+
+
+def test_load_and_save_config(tmp_path):
+    path = str(tmp_path / "fees.json")
+    save_fee_config(path, FeeConfig(base_delivery_fee=250))
+
+    schedule = load_fee_config(path)
+    assert schedule.base_delivery_fee == 250
+    assert schedule.max_fee == constants.MAX_FEE
+    assert os.listdir(tmp_path) == ["fees.json"]
+
+
+@pytest.mark.parametrize("content", ['{"base_delivery_fee": -1}', '{"rush_delivery_day": 7}', '{"unknown": 1}', "{"])
+def test_load_invalid_config(tmp_path, content):
+    path = tmp_path / "fees.json"
+    path.write_text(content)
+
+    with pytest.raises(ValueError):
+        load_fee_config(str(path))
+
+
+@pytest.mark.parametrize("values", [
+    {"additional_fee": 0},
+    {"additional_item_surcharge": 0},
+    {"max_fee": constants.MAX_CONFIG_FEE + 1},
+    {"rush_multiplier_bps": 1},
+    {"rush_multiplier_bps": constants.MAX_CONFIG_RUSH_MULTIPLIER_BPS + 1},
+    {"small_order_threshold": constants.MAX_CONFIG_VALUE + 1},
+    {"rush_windows": [{"weekday": 0, "start": "07:00", "end": "09:00", "multiplier_bps": 1}]},
+])
+def test_config_rejects_values_outside_limits(values):
+    assert admin_client.put(constants.CONFIG_ENDPOINT, json=values).status_code == 422
+    assert get_fee_schedule() is not None
+    assert client.post(constants.CALCULATE_ENDPOINT, json=order).json() == {"delivery_fee": 710}
+
+
+@pytest.mark.parametrize("values", [
+    {"additional_fee": 1, "additional_item_surcharge": 1},
+    {"max_fee": constants.MAX_CONFIG_FEE, "rush_multiplier_bps": constants.MIN_CONFIG_RUSH_MULTIPLIER_BPS},
+    {"max_fee": constants.MAX_CONFIG_FEE, "additional_fee": 1, "additional_fee_distance": constants.MAX_CONFIG_VALUE},
+    {"max_fee": 0, "rush_multiplier_bps": constants.MAX_CONFIG_RUSH_MULTIPLIER_BPS},
+    {"small_order_threshold": constants.MAX_CONFIG_VALUE, "free_delivery_threshold": constants.MAX_CONFIG_VALUE},
+])
+def test_endpoints_with_config_at_limits(values):
+    schedule = FeeConfig(**values).schedule()
+    set_fee_schedule(schedule)
+    orders = [
+        {**order, "delivery_distance": distance, "number_of_items": items, "time": time}
+        for distance in (1, 2235, 10 ** 6, 10 ** 12)
+        for items in (1, 14, 10 ** 6)
+        for time in ("2024-01-15T13:00:00Z", "2024-01-19T16:00:00Z")
+    ]
+    expected = [
+        schedule.calculate(o["cart_value"], o["delivery_distance"], o["number_of_items"], datetime.fromisoformat(o["time"][:-1]))
+        for o in orders
+    ]
+
+    assert [client.post(constants.CALCULATE_ENDPOINT, json=o).json()["delivery_fee"] for o in orders] == expected
+    results = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders).json()["results"]
+    assert [result["delivery_fee"] for result in results] == expected
+    stream = client.post(constants.STREAM_CALCULATE_ENDPOINT, content="\n".join(json.dumps(o) for o in orders))
+    assert [json.loads(line)["delivery_fee"] for line in stream.text.splitlines()] == expected
+
+    matrix = client.post(constants.MATRIX_CALCULATE_ENDPOINT, json={
+        "cart": {"cart_value": order["cart_value"], "number_of_items": 14, "time": "2024-01-19T16:00:00Z"},
+        "delivery_distances": [1, 2235, 10 ** 6, 10 ** 12],
+    }).json()
+    assert matrix["delivery_fees"] == expected[3::6]
+    assert client.get(constants.METRICS_ENDPOINT).status_code == 200
+
+
+def test_watcher_reloads_changed_file(tmp_path):
+    path = tmp_path / "fees.json"
+    path.write_text(json.dumps({"base_delivery_fee": 250}))
+    watcher = ConfigWatcher(str(path))
+
+    assert watcher.reload()
+    assert get_fee_schedule().base_delivery_fee == 250
+    assert not watcher.reload()
+
+    path.write_text(json.dumps({"base_delivery_fee": 300}))
+    os.utime(path, ns=(0, 0))
+    assert watcher.reload()
+    assert get_fee_schedule().base_delivery_fee == 300
+
+    # A replaced file is reloaded even if it has the same modification time and size.
+    save_fee_config(str(path), FeeConfig(base_delivery_fee=350))
+    os.utime(path, ns=(0, 0))
+    assert watcher.reload()
+    save_fee_config(str(path), FeeConfig(base_delivery_fee=360))
+    os.utime(path, ns=(0, 0))
+    assert watcher.reload()
+    assert get_fee_schedule().base_delivery_fee == 360
+    assert not watcher.reload()
+
+    # An invalid file keeps the current schedule.
+    path.write_text(json.dumps({"base_delivery_fee": "free"}))
+    os.utime(path, ns=(1, 1))
+    assert not watcher.reload()
+    assert get_fee_schedule().base_delivery_fee == 360
+
+
+def test_rush_window_times_with_utc_offset_are_invalid(tmp_path):
+    window = {"weekday": 4, "start": "15:00+02:00", "end": "19:00", "multiplier_bps": 12_000}
+    assert admin_client.put(constants.CONFIG_ENDPOINT, json={"rush_windows": [window]}).status_code == 422
+
+    path = tmp_path / "fees.json"
+    path.write_text(json.dumps({"rush_windows": [window]}))
+    watcher = ConfigWatcher(str(path))
+    assert not watcher.reload()
+    assert get_fee_schedule().rush_windows is None
+
+
+def test_watcher_keeps_polling_after_errors(tmp_path, monkeypatch):
+    path = tmp_path / "fees.json"
+    path.write_text(json.dumps({"base_delivery_fee": 250}))
+    watcher = ConfigWatcher(str(path), interval=0.001)
+    reload = watcher.reload
+    calls = []
+
+    def failing_reload(force: bool = False) -> bool:
+        calls.append(force)
+        if len(calls) == 1:
+            raise RuntimeError("unexpected")
+        return reload(force)
+
+    monkeypatch.setattr(watcher, "reload", failing_reload)
+
+    async def watch():
+        task = asyncio.create_task(watcher.watch())
+        try:
+            for _ in range(1_000):
+                if len(calls) >= 3 or task.done():
+                    break
+                await asyncio.sleep(0.001)
+            assert not task.done()
+        finally:
+            task.cancel()
+
+    asyncio.run(watch())
+    assert len(calls) >= 3
+    assert get_fee_schedule().base_delivery_fee == 250
+
+
+def test_swap_does_not_affect_schedule_in_use():
+    schedule = get_fee_schedule()
+    set_fee_schedule(FeeConfig(base_delivery_fee=250).schedule())
+
+    assert schedule.calculate(790, 2235, 4, datetime(2024, 1, 15, 13)) == 710
+    assert get_fee_schedule().calculate(790, 2235, 4, datetime(2024, 1, 15, 13)) == 760
+
+
+def test_config_endpoint():
+    assert admin_client.get(constants.CONFIG_ENDPOINT).json() == FeeConfig().model_dump()
+
+    response = admin_client.put(constants.CONFIG_ENDPOINT, json={"base_delivery_fee": 250})
+    assert response.status_code == 200
+    assert response.json()["base_delivery_fee"] == 250
+    assert admin_client.get(constants.CONFIG_ENDPOINT).json()["base_delivery_fee"] == 250
+    assert client.post(constants.CALCULATE_ENDPOINT, json=order).json() == {"delivery_fee": 760}
+
+    assert admin_client.put(constants.CONFIG_ENDPOINT, json={"max_fee": -1}).status_code == 422
+
+
+def test_config_endpoint_writes_config_file(monkeypatch, tmp_path):
+    path = tmp_path / "fees.json"
+
+    assert admin_client.put(constants.CONFIG_ENDPOINT, json={"base_delivery_fee": 250}).status_code == 200
+    assert json.loads(path.read_text())["base_delivery_fee"] == 250
+    assert get_fee_schedule().base_delivery_fee == 250
+
+    # Without a configuration file only one worker would change, so the change is rejected.
+    monkeypatch.setattr(main, "config_watcher", None)
+    response = admin_client.put(constants.CONFIG_ENDPOINT, json={"base_delivery_fee": 300})
+    assert response.status_code == 409
+    assert "FEE_CONFIG_PATH" in response.json()["detail"]
+    assert get_fee_schedule().base_delivery_fee == 250
+
+
+def test_config_endpoint_requires_token(monkeypatch):
+    # Requests without the token are rejected before the body is validated, also from localhost.
+    for headers in ({}, {"Authorization": "Bearer wrong-token"}, {"Authorization": CONFIG_TOKEN}):
+        response = local_client.put(constants.CONFIG_ENDPOINT, json={"base_delivery_fee": 0}, headers=headers)
+        assert response.status_code == 401
+        assert response.headers["www-authenticate"] == "Bearer"
+        assert local_client.put(constants.CONFIG_ENDPOINT, json={"max_fee": -1}, headers=headers).status_code == 401
+
+    # Without a configured token, changes are disabled.
+    monkeypatch.setattr(main, "CONFIG_TOKEN", "")
+    assert admin_client.put(constants.CONFIG_ENDPOINT, json={"base_delivery_fee": 0}).status_code == 403
+    assert admin_client.put(constants.CONFIG_ENDPOINT, headers={"Authorization": "Bearer "}).status_code == 403
+
+    assert get_fee_schedule().base_delivery_fee == constants.BASE_DELIVERY_FEE
+    assert config.config_watcher is None
@@ -0,0 +1,104 @@
+import json
+from datetime import datetime
+
+from fastapi import Body, FastAPI
+from fastapi.testclient import TestClient
+from hypothesis import HealthCheck, given, settings, strategies as st
+from pydantic import TypeAdapter
+
+from app import constants
+from app.fastpath import parse_datetime
+from app.main import app
+from app.order import Order
+
+client = TestClient(app)
+
+# Reference endpoint that validates the request body into an Order with FastAPI.
+reference_app = FastAPI()
+
+
+@reference_app.post(constants.CALCULATE_ENDPOINT)
+def reference_delivery_fee(order: Order = Body()):
+    return {
+        "delivery_fee": order.calculate_delivery_fee()
+    }
+
+
+reference_client = TestClient(reference_app)
+
+
+def assert_same_response(**kwargs):
+    response = client.post(constants.CALCULATE_ENDPOINT, **kwargs)
+    expected = reference_client.post(constants.CALCULATE_ENDPOINT, **kwargs)
+
+    assert response.status_code == expected.status_code
+    assert response.json() == expected.json()
+    assert response.headers["content-type"] == expected.headers["content-type"]
+
+
+def test_parse_datetime():
+    adapter = TypeAdapter(datetime)
+
+    for value in (
+        "2024-01-15T13:00:00Z",
+        "2024-01-15 13:00:00",
+        "2024-01-19T15:00:00.000001+02:00",
+        "2024-01-19T19:00:00.5-11:30",
+        "2024-02-29T00:00:00Z",
+    ):
+        assert parse_datetime(value) == adapter.validate_python(value)
+        assert parse_datetime(value).utcoffset() == adapter.validate_python(value).utcoffset()
+
+    # Unsupported or invalid values are left for the Order validation.
+    for value in ("2024-01-15", "2024-02-30T00:00:00Z", "2024-01-15T24:00:00Z", "2024-01-15T13:00:00+02:60", "1705323600",
+                  "\u0662\u0660\u0662\u0664-01-15T13:00:00Z"):
+        assert parse_datetime(value) is None
+
+
+def test_fast_path_matches_order_validation():
+    order = {
+        "cart_value": 790,
+        "delivery_distance": 2235,
+        "number_of_items": 4,
+        "time": "2024-01-15T13:00:00Z",
+    }
+
+    assert_same_response(json=order)
+    assert_same_response(json={**order, "time": "2024-01-19T16:00:00+02:00"})
+    # Values that the fast path leaves for the Order validation.
+    assert_same_response(json={**order, "cart_value": "790"})
+    assert_same_response(json={**order, "cart_value": 790.0})
+    assert_same_response(json={**order, "cart_value": True})
+    assert_same_response(json={**order, "time": 1705323600})
+    assert_same_response(json={**order, "delivery_distance": 10 ** 30})
+    # Invalid requests
+    assert_same_response(json={**order, "cart_value": 0})
+    assert_same_response(json={**order, "time": "2024-02-30T00:00:00Z"})
+    assert_same_response(json={**order, "time": "\u0662\u0660\u0662\u0664-01-15T13:00:00Z"})
+    assert_same_response(json=[order])
+    assert_same_response(json=None)
+    assert_same_response(content=b"")
+    assert_same_response(content=b'{"cart_value": 790,')
+    assert_same_response(content=json.dumps(order), headers={"content-type": "text/plain"})
+    assert_same_response(content=json.dumps(order), headers={"content-type": "application/vnd.api+json"})
+
+
+json_values = st.one_of(
+    st.none(),
+    st.booleans(),
+    st.integers(min_value=-10, max_value=2 ** 70),
+    st.floats(allow_nan=False, allow_infinity=False),
+    st.text(max_size=5),
+    st.datetimes().map(lambda t: t.isoformat()),
+)
+
+
+@settings(max_examples=200, deadline=None, suppress_health_check=[HealthCheck.too_slow])
+@given(st.fixed_dictionaries({}, optional={
+    "cart_value": json_values,
+    "delivery_distance": json_values,
+    "number_of_items": json_values,
+    "time": json_values,
+}))
+def test_fast_path_matches_order_validation_property(order):
+    assert_same_response(json=order)
@@ -0,0 +1,180 @@
+import json
+from datetime import datetime, time, timedelta, timezone
+
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from app import constants
+from app.config import FeeConfig
+from app.history import FeeHistory, NoScheduleError, load_fee_history
+from app.rush import RushWindow
+from app.schedule import FeeSchedule
+from app.vectorized import calculate_history_fees, calculate_schedule_fees
+
+HELSINKI_RUSH = FeeConfig(
+    base_delivery_fee=250,
+    rush_windows=[
+        RushWindow(weekday=4, start=time(15), end=time(19), multiplier_bps=12_000, timezone="Europe/Helsinki"),
+        RushWindow(weekday=5, start=time(22), end=time(1), multiplier_bps=15_000, timezone="Europe/Helsinki"),
+    ],
+).schedule()
+
+WALL_CLOCK_RUSH = FeeConfig(
+    max_fee=2_000,
+    small_order_threshold=1_500,
+    rush_windows=[
+        RushWindow(weekday=0, start=time(11), end=time(13, 30), multiplier_bps=11_000),
+        RushWindow(weekday=6, start=time(20), end=time(2), multiplier_bps=8_000),
+    ],
+).schedule()
+
+history = FeeHistory([
+    (datetime(2024, 1, 1, tzinfo=timezone.utc), FeeSchedule.from_constants()),
+    (datetime(2024, 2, 1, tzinfo=timezone(timedelta(hours=2))), WALL_CLOCK_RUSH),
+    (datetime(2024, 3, 1, 12, tzinfo=timezone.utc), HELSINKI_RUSH),
+])
+
+positive_ints = st.one_of(
+    st.integers(min_value=1, max_value=3 * constants.FREE_DELIVERY_THRESHOLD),
+    st.integers(min_value=1, max_value=2 ** 62),
+)
+
+timezones = st.one_of(
+    st.none(),
+    st.integers(min_value=-14 * 60, max_value=14 * 60).map(lambda minutes: timezone(timedelta(minutes=minutes))),
+)
+
+# Order times around the effective times are sampled explicitly, as random datetimes rarely hit them exactly.
+boundary_times = st.builds(
+    lambda effective_from, delta: effective_from + timedelta(microseconds=delta),
+    st.sampled_from(history.effective_from[1:]),
+    st.sampled_from([-1, 0, 1]),
+)
+
+times = st.one_of(
+    st.builds(
+        lambda t, tz: t.replace(tzinfo=tz),
+        st.datetimes(min_value=datetime(2024, 1, 2), max_value=datetime(2024, 6, 1)),
+        timezones,
+    ),
+    boundary_times,
+)
+
+orders = st.tuples(positive_ints, positive_ints, positive_ints, times)
+
+
+def test_schedule_at():
+    assert history.schedule_at(datetime(2024, 1, 15, 13)) is history.schedules[0]
+    assert history.schedule_at(datetime(2024, 1, 31, 21, 59, 59, 999_999)) is history.schedules[0]
+    assert history.schedule_at(datetime(2024, 1, 31, 22)) is history.schedules[1]
+    assert history.schedule_at(datetime(2024, 3, 1, 12, 59, tzinfo=timezone(timedelta(hours=1)))) is history.schedules[1]
+    assert history.schedule_at(datetime(2024, 3, 1, 12)) is history.schedules[2]
+    assert history.schedule_at(datetime(2030, 1, 1)) is history.schedules[2]
+
+    with pytest.raises(NoScheduleError, match="No fee schedule in force at 2023-12-31T23:59:59"):
+        history.schedule_at(datetime(2023, 12, 31, 23, 59, 59))
+
+
+def test_calculate():
+    assert history.calculate(790, 2235, 4, datetime(2024, 1, 15, 13)) == 710
+    assert history.calculate(790, 2235, 4, datetime(2024, 3, 14, 13)) == 760
+    assert history.breakdown(790, 2235, 4, datetime(2024, 3, 15, 13)).rush_multiplier_bps == 12_000
+
+
+def test_invalid_history():
+    with pytest.raises(ValueError, match="at least one"):
+        FeeHistory([])
+    with pytest.raises(ValueError, match="timezone"):
+        FeeHistory([(datetime(2024, 1, 1), FeeSchedule.from_constants())])
+    with pytest.raises(ValueError, match="Several fee schedules take effect"):
+        FeeHistory([
+            (datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2))), FeeSchedule.from_constants()),
+            (datetime(2024, 1, 1, tzinfo=timezone.utc), FeeSchedule.from_constants()),
+        ])
+
+
+def test_load_fee_history(tmp_path):
+    path = tmp_path / "history.json"
+    path.write_text(json.dumps([
+        {"effective_from": "2024-03-01T00:00:00+02:00", "base_delivery_fee": 250},
+        {"effective_from": "2024-01-01T00:00:00Z"},
+    ]))
+
+    loaded = load_fee_history(str(path))
+    assert loaded.effective_from == [datetime(2024, 1, 1, tzinfo=timezone.utc), datetime(2024, 2, 29, 22, tzinfo=timezone.utc)]
+    assert [schedule.base_delivery_fee for schedule in loaded.schedules] == [constants.BASE_DELIVERY_FEE, 250]
+
+
+@pytest.mark.parametrize("content", [
+    "[]",
+    '[{"base_delivery_fee": 250}]',
+    '[{"effective_from": "2024-01-01T00:00:00"}]',
+    '[{"effective_from": "2024-01-01T00:00:00Z", "unknown": 1}]',
+    '[{"effective_from": "2024-01-01T00:00:00Z"}, {"effective_from": "2024-01-01T02:00:00+02:00"}]',
+])
+def test_load_invalid_fee_history(tmp_path, content):
+    path = tmp_path / "history.json"
+    path.write_text(content)
+
+    with pytest.raises(ValueError):
+        load_fee_history(str(path))
+
+
+@settings(max_examples=200)
+@given(st.lists(orders, min_size=1, max_size=50))
+def test_history_fees_equal_history_calculate(order_list):
+    columns = list(zip(*order_list))
+    fees = calculate_history_fees(history, *columns)
+
+    assert fees.tolist() == [history.calculate(*order) for order in order_list]
+
+
+@settings(max_examples=100)
+@given(st.lists(orders, min_size=1, max_size=50), st.sampled_from(history.schedules))
+def test_schedule_fees_equal_schedule_calculate(order_list, schedule):
+    fees = calculate_schedule_fees(schedule, *zip(*order_list))
+
+    assert fees.tolist() == [schedule.calculate(*order) for order in order_list]
+
+
+def test_history_fees_of_datetime64_times():
+    # datetime64 order times are UTC, like order times without timezone information.
+    order_times = [datetime(2024, 1, 31, 21, 59), datetime(2024, 1, 31, 22), datetime(2024, 3, 1, 11, 59), datetime(2024, 3, 1, 13)]
+    values = ([790] * 4, [2235] * 4, [14] * 4)
+
+    fees = calculate_history_fees(history, *values, np.array(order_times, dtype="datetime64[s]"))
+    assert fees.tolist() == calculate_history_fees(history, *values, order_times).tolist()
+    assert fees.tolist() == [history.calculate(790, 2235, 14, t) for t in order_times]
+    assert calculate_history_fees(history, [], [], [], np.array([], dtype="datetime64[us]")).tolist() == []
+
+    with pytest.raises(NoScheduleError, match="2023-12-31T23:00:00"):
+        calculate_history_fees(history, *values, np.array([datetime(2023, 12, 31, 23)] * 4, dtype="datetime64[us]"))
+
+
+schedules_at_limits = [
+    FeeConfig(max_fee=constants.MAX_CONFIG_FEE, additional_fee=1, rush_multiplier_bps=constants.MIN_CONFIG_RUSH_MULTIPLIER_BPS).schedule(),
+    FeeConfig(max_fee=constants.MAX_CONFIG_FEE, additional_fee=1, additional_fee_distance=constants.MAX_CONFIG_VALUE).schedule(),
+    FeeConfig(
+        additional_item_surcharge=1,
+        bulk_fee_threshold=constants.MAX_CONFIG_VALUE,
+        free_delivery_threshold=constants.MAX_CONFIG_VALUE,
+        small_order_threshold=constants.MAX_CONFIG_VALUE,
+    ).schedule(),
+]
+
+
+@pytest.mark.parametrize("schedule", schedules_at_limits)
+def test_schedule_fees_at_config_limits(schedule):
+    # Inputs are clipped where the fee of each schedule has saturated, not at a fixed value.
+    large = [constants.MAX_CONFIG_VALUE - 1, constants.MAX_CONFIG_VALUE, constants.MAX_CONFIG_VALUE + 1, 2 ** 41, 2 ** 62, 2 ** 70]
+    order_list = [
+        (cart_value, delivery_distance, number_of_items, order_time)
+        for cart_value in [790] + large
+        for delivery_distance in [2235] + large
+        for number_of_items in [4] + large
+        for order_time in (datetime(2024, 1, 15, 13), datetime(2024, 1, 19, 16))
+    ]
+    fees = calculate_schedule_fees(schedule, *zip(*order_list))
+
+    assert fees.tolist() == [schedule.calculate(*order) for order in order_list]
@@ -1,3 +1,8 @@
+import json
+import os
+import subprocess
+import sys
+
 from fastapi.testclient import TestClient
 
 from app import constants
@@ -256,3 +261,279 @@ def test_calculate_fee_endpoint_errors():
             },
         ],
     }
+
+
+def test_calculate_fee_endpoint_breakdown():
+    order = {
+        "cart_value": 790,
+        "delivery_distance": 2235,
+        "number_of_items": 4,
+        "time": "2024-01-15T13:00:00Z",
+    }
+
+    for query in ("?breakdown=true", "?breakdown=1"):
+        response = client.post(constants.CALCULATE_ENDPOINT + query, json=order)
+        assert response.status_code == 200
+        assert response.json() == {
+            "delivery_fee": 710,
+            "breakdown": {
+                "free_delivery": False,
+                "distance_fee": 500,
+                "item_surcharge": 0,
+                "small_order_surcharge": 210,
+                "bulk_fee": 0,
+                "rush_multiplier_bps": 0,
+                "rush_fee": 0,
+                "max_fee_applied": False,
+                "max_fee_reduction": 0,
+            },
+        }
+
+    for query in ("", "?breakdown=false", "?other=true"):
+        assert client.post(constants.CALCULATE_ENDPOINT + query, json=order).json() == {"delivery_fee": 710}
+
+    response = client.post(constants.CALCULATE_ENDPOINT + "?breakdown=true", json={**order, "cart_value": 0})
+    assert response.status_code == 422
+    assert response.json() == client.post(constants.CALCULATE_ENDPOINT, json={**order, "cart_value": 0}).json()
+
+
+def test_batch_calculate_fee_endpoint_successful():
+    orders = [
+        {
+            "cart_value": constants.SMALL_ORDER_THRESHOLD,
+            "delivery_distance": constants.BASE_DELIVERY_FEE_DISTANCE,
+            "number_of_items": constants.ADDITIONAL_ITEM_LIMIT - 1,
+            "time": "2024-01-15T13:00:00Z",
+        },
+        {
+            "cart_value": constants.FREE_DELIVERY_THRESHOLD,
+            "delivery_distance": constants.BASE_DELIVERY_FEE_DISTANCE,
+            "number_of_items": constants.ADDITIONAL_ITEM_LIMIT - 1,
+            "time": "2024-01-15T13:00:00Z",
+        },
+        {
+            "cart_value": 790,
+            "delivery_distance": 2235,
+            "number_of_items": 4,
+            "time": "2024-01-15T13:00:00Z",
+        },
+    ]
+    response = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders)
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [
+            {"delivery_fee": constants.BASE_DELIVERY_FEE},
+            {"delivery_fee": 0},
+            {"delivery_fee": 710},
+        ],
+    }
+
+    # Batch results must match the single order endpoint.
+    for order, result in zip(orders, response.json()["results"]):
+        assert client.post(constants.CALCULATE_ENDPOINT, json=order).json() == result
+
+    # Large batch calculated in the threadpool
+    response = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=orders * constants.BATCH_THREADPOOL_THRESHOLD)
+    assert response.status_code == 200
+    assert response.json()["results"][-3:] == [
+        {"delivery_fee": constants.BASE_DELIVERY_FEE},
+        {"delivery_fee": 0},
+        {"delivery_fee": 710},
+    ]
+
+    # Empty batch
+    response = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=[])
+    assert response.status_code == 200
+    assert response.json() == {"results": []}
+
+
+def test_batch_calculate_fee_endpoint_errors():
+    # Invalid orders are reported per item, valid orders are still calculated.
+    response = client.post(
+        constants.BATCH_CALCULATE_ENDPOINT,
+        json=[
+            {
+                "cart_value": 0,
+                "delivery_distance": 2235,
+                "number_of_items": 4,
+                "time": "2024-01-15T13:00:00Z",
+            },
+            {
+                "cart_value": 790,
+                "delivery_distance": 2235,
+                "number_of_items": 4,
+                "time": "2024-01-15T13:00:00Z",
+            },
+            "not an order",
+        ],
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [
+            {
+                "detail": [
+                    {
+                        "type": "greater_than",
+                        "loc": [
+                            "cart_value",
+                        ],
+                        "msg": "Input should be greater than 0",
+                        "input": 0,
+                        "ctx": {
+                            "gt": 0,
+                        },
+                    },
+                ],
+            },
+            {
+                "delivery_fee": 710,
+            },
+            {
+                "detail": [
+                    {
+                        "type": "model_type",
+                        "loc": [],
+                        "msg": "Input should be a valid dictionary or instance of Order",
+                        "input": "not an order",
+                        "ctx": {
+                            "class_name": "Order",
+                        },
+                    },
+                ],
+            },
+        ],
+    }
+
+    # Request body that is not a list fails the whole batch.
+    response = client.post(constants.BATCH_CALCULATE_ENDPOINT, json={"cart_value": 790})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "list_type"
+
+    # Batch over the maximum size fails the whole batch.
+    response = client.post(constants.BATCH_CALCULATE_ENDPOINT, json=[{}] * (constants.MAX_BATCH_SIZE + 1))
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "too_long"
+
+
+def test_stream_calculate_fee_endpoint():
+    order = (
+        b'{"cart_value": 790, "delivery_distance": 2235, "number_of_items": 4, "time": "2024-01-15T13:00:00Z"}'
+    )
+
+    def chunks():
+        # Lines are split across chunks, and empty lines are skipped.
+        yield order + b"\n" + order[:20]
+        yield order[20:] + b"\n\n"
+        yield b'{"cart_value": 0, "delivery_distance": 2235, "number_of_items": 4, "time": "2024-01-15T13:00:00Z"}\n'
+        yield b"not json\n"
+        # Too long line is reported, and the stream continues after it.
+        yield b"x" * constants.MAX_STREAM_LINE_LENGTH
+        yield b"x" * 10 + b"\n"
+        yield order
+
+    response = client.post(constants.STREAM_CALCULATE_ENDPOINT, content=chunks())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert results == [
+        {"delivery_fee": 710},
+        {"delivery_fee": 710},
+        {
+            "detail": [
+                {
+                    "type": "greater_than",
+                    "loc": ["cart_value"],
+                    "msg": "Input should be greater than 0",
+                    "input": 0,
+                    "ctx": {"gt": 0},
+                },
+            ],
+        },
+        {
+            "detail": [
+                {
+                    "type": "json_invalid",
+                    "loc": [],
+                    "msg": "Invalid JSON: expected ident at line 1 column 2",
+                    "input": "not json",
+                    "ctx": {"error": "expected ident at line 1 column 2"},
+                },
+            ],
+        },
+        {
+            "detail": [
+                {
+                    "type": "line_too_long",
+                    "loc": [],
+                    "msg": f"Line should have at most {constants.MAX_STREAM_LINE_LENGTH} bytes",
+                },
+            ],
+        },
+        {"delivery_fee": 710},
+    ]
+
+    # Empty stream
+    response = client.post(constants.STREAM_CALCULATE_ENDPOINT, content=b"")
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+def test_matrix_calculate_fee_endpoint():
+    cart = {"cart_value": 790, "number_of_items": 4, "time": "2024-01-15T13:00:00Z"}
+    rush_hour_cart = {**cart, "time": "2024-01-19T16:00:00Z"}
+
+    response = client.post(constants.MATRIX_CALCULATE_ENDPOINT, json={"cart": cart, "delivery_distances": [1, 2235, 10_000]})
+    assert response.status_code == 200
+    assert response.json() == {"delivery_fees": [410, 710, constants.MAX_FEE]}
+
+    response = client.post(
+        constants.MATRIX_CALCULATE_ENDPOINT,
+        json={"carts": [cart, rush_hour_cart], "delivery_distances": [1, 2235]},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"delivery_fees": [[410, 710], [492, 852]]}
+
+    for body, loc in (
+        ({"cart": cart, "carts": [cart], "delivery_distances": [1]}, ["body"]),
+        ({"delivery_distances": [1]}, ["body"]),
+        ({"cart": cart, "delivery_distances": []}, ["body", "delivery_distances"]),
+        ({"cart": cart, "delivery_distances": [0]}, ["body", "delivery_distances", 0]),
+        ({"carts": [cart] * (constants.MAX_MATRIX_CARTS + 1), "delivery_distances": [1]}, ["body", "carts"]),
+        ({"cart": cart, "delivery_distances": [1] * (constants.MAX_MATRIX_DISTANCES + 1)}, ["body", "delivery_distances"]),
+    ):
+        response = client.post(constants.MATRIX_CALCULATE_ENDPOINT, json=body)
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"] == loc
+
+
+def test_health_endpoint():
+    response = client.get(constants.HEALTH_ENDPOINT)
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_openapi_documentation():
+    schema = client.get("/openapi.json").json()
+
+    order_content = schema["paths"][constants.CALCULATE_ENDPOINT]["post"]["requestBody"]["content"]["application/json"]
+    assert set(order_content["examples"]) == {"normal", "free", "max", "wolt_example"}
+    assert "200" in schema["paths"][constants.CALCULATE_ENDPOINT]["post"]["responses"]
+    assert schema["paths"][constants.CALCULATE_ENDPOINT]["post"]["parameters"][0]["name"] == constants.BREAKDOWN_PARAMETER
+    batch_content = schema["paths"][constants.BATCH_CALCULATE_ENDPOINT]["post"]["requestBody"]["content"]["application/json"]
+    assert "batch" in batch_content["examples"]
+    assert "application/x-ndjson" in schema["paths"][constants.STREAM_CALCULATE_ENDPOINT]["post"]["requestBody"]["content"]
+
+
+def test_documentation_is_lazy_and_can_be_disabled():
+    script = """
+import sys
+from fastapi.testclient import TestClient
+from app.main import app
+assert "app.docs" not in sys.modules
+print(TestClient(app).get("/openapi.json").status_code, TestClient(app).get("/docs").status_code)
+"""
+    for docs, status in (("1", "200 200"), ("0", "404 404")):
+        env = {**os.environ, "DOCS_ENABLED": docs}
+        output = subprocess.run([sys.executable, "-c", script], env=env, check=True, capture_output=True, text=True).stdout
+        assert output.strip() == status
@@ -0,0 +1,106 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from app import constants, metrics
+from app.main import app
+from app.schedule import FeeSchedule
+
+client = TestClient(app)
+
+
+def metric_value(text: str, sample: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.split(" ")[1])
+
+    return 0
+
+
+def test_metrics_endpoint():
+    before = client.get(constants.METRICS_ENDPOINT).text
+
+    # Max fee with every rule applied during rush hour
+    client.post(
+        constants.CALCULATE_ENDPOINT,
+        json={
+            "cart_value": 790,
+            "delivery_distance": 2235,
+            "number_of_items": 14,
+            "time": "2024-01-19T16:00:00Z",
+        },
+    )
+    # Free delivery
+    client.post(
+        constants.CALCULATE_ENDPOINT,
+        json={
+            "cart_value": constants.FREE_DELIVERY_THRESHOLD,
+            "delivery_distance": 2235,
+            "number_of_items": 4,
+            "time": "2024-01-15T13:00:00Z",
+        },
+    )
+    client.post(constants.CALCULATE_ENDPOINT, json={"cart_value": 0})
+    client.post(constants.BATCH_CALCULATE_ENDPOINT, json=[{"cart_value": 0}])
+
+    response = client.get(constants.METRICS_ENDPOINT)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    after = response.text
+
+    def increase(sample: str) -> float:
+        return metric_value(after, sample) - metric_value(before, sample)
+
+    assert increase("feecalc_request_duration_seconds_count") == 2
+    assert increase("feecalc_validation_failures_total") == 2
+    assert increase("fee_calculations_total") == 2
+    assert increase('fee_distance_tier_total{tier="3"}') == 1
+    for rule in ("free_delivery", "item_surcharge", "bulk_fee", "small_order_surcharge", "rush_multiplier", "max_fee"):
+        assert increase(f'fee_rule_hits_total{{rule="{rule}"}}') == 1
+    assert "fee_quote_cache_hits_total" in after
+
+
+def test_max_fee_hits_count_capped_fees_only():
+    schedule = FeeSchedule.from_constants()
+    order_time = datetime(2024, 1, 15, 13)
+    before = metrics.rule_hits.values.get("max_fee", 0)
+
+    # A fee of exactly the maximum fee is not capped, one distance step more is.
+    assert schedule.calculate(1_000, 7_500, 4, order_time) == schedule.calculate(1_000, 7_501, 4, order_time) == schedule.max_fee
+    metrics.observe_fee(schedule, 1_000, 7_500, 4, order_time, schedule.max_fee)
+    assert metrics.rule_hits.values.get("max_fee", 0) == before
+    metrics.observe_fee(schedule, 1_000, 7_501, 4, order_time, schedule.max_fee)
+    assert metrics.rule_hits.values.get("max_fee", 0) == before + 1
+
+
+def test_metrics_disabled():
+    metrics.enabled = False
+    try:
+        before = client.get(constants.METRICS_ENDPOINT).text
+        client.post(
+            constants.CALCULATE_ENDPOINT,
+            json={
+                "cart_value": 790,
+                "delivery_distance": 2235,
+                "number_of_items": 4,
+                "time": "2024-01-15T13:00:00Z",
+            },
+        )
+        assert client.get(constants.METRICS_ENDPOINT).text == before
+    finally:
+        metrics.enabled = True
+
+
+def test_histogram():
+    histogram = metrics.Histogram("test_seconds", "Test histogram.", (0.1, 1.0))
+    histogram.observe(0.1)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    assert list(histogram.collect())[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1.0"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.6",
+        "test_seconds_count 3",
+    ]
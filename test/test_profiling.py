@@ -0,0 +1,82 @@
+import pstats
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import constants, metrics, profiling
+from app.main import app
+
+client = TestClient(app)
+
+ORDER = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+@pytest.fixture(autouse=True)
+def reset_profiling():
+    yield
+    profiling.configure(rate=0.0, header=False, timing=True, directory="")
+
+
+def stage_count(stage: str) -> int:
+    return sum(metrics.stage_durations[stage].counts)
+
+
+def test_profiling_off_by_default():
+    response = client.post(constants.CALCULATE_ENDPOINT, json=ORDER, headers={constants.PROFILE_HEADER: "1"})
+
+    assert not profiling.enabled
+    assert response.json() == {"delivery_fee": 710}
+    assert "server-timing" not in response.headers
+
+
+def test_profiling_header():
+    profiling.configure(header=True)
+    before = stage_count("calculate")
+
+    assert "server-timing" not in client.post(constants.CALCULATE_ENDPOINT, json=ORDER).headers
+    response = client.post(constants.CALCULATE_ENDPOINT, json=ORDER, headers={constants.PROFILE_HEADER: "1"})
+
+    assert response.json() == {"delivery_fee": 710}
+    stages = [entry.split(";dur=") for entry in response.headers["server-timing"].split(", ")]
+    assert [stage for stage, _ in stages] == [*metrics.PROFILE_STAGES, "total"]
+    assert all(float(duration) >= 0 for _, duration in stages)
+    assert stage_count("calculate") == before + 1
+
+
+def test_profiling_sample_rate():
+    profiling.configure(rate=1.0, timing=False)
+    before = stage_count("serialize")
+
+    response = client.post(constants.CALCULATE_ENDPOINT, json=ORDER)
+
+    assert response.json() == {"delivery_fee": 710}
+    assert "server-timing" not in response.headers
+    assert stage_count("serialize") == before + 1
+
+
+def test_profiling_validation_failure():
+    expected = client.post(constants.CALCULATE_ENDPOINT, json={"cart_value": 0})
+    profiling.configure(rate=1.0)
+    before = stage_count("decode")
+
+    response = client.post(constants.CALCULATE_ENDPOINT, json={"cart_value": 0})
+
+    assert response.status_code == 422
+    assert response.json() == expected.json()
+    assert stage_count("decode") == before + 1
+
+
+def test_profiling_traces(tmp_path):
+    profiling.configure(rate=1.0, directory=str(tmp_path))
+
+    client.post(constants.CALCULATE_ENDPOINT, json=ORDER)
+
+    traces = list(tmp_path.glob("feecalc-*.prof"))
+    assert len(traces) == 1
+    functions = {function for _, _, function in pstats.Stats(str(traces[0])).stats}
+    assert "validate_order" in functions
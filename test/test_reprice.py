@@ -0,0 +1,128 @@
+import csv
+from datetime import datetime, timezone
+
+import pytest
+
+from app import constants
+from app.order import Order
+from app.reprice import main, price_order, reprice
+from app.schedule import FeeSchedule
+
+ORDERS = [
+    ["790", "2235", "4", "2024-01-15T13:00:00Z", "first"],
+    [str(constants.FREE_DELIVERY_THRESHOLD), "2235", "4", "2024-01-15T13:00:00Z", "free"],
+    ["790", "2235", "14", f"2024-01-19T{constants.RUSH_DELIVERY_START}:00:00+02:00", "rush"],
+    ["0", "2235", "4", "2024-01-15T13:00:00Z", "invalid"],
+    ["790", "2235", "4", "not a time", "invalid time"],
+    ["790", "2235", "4"],
+]
+
+
+def write_orders(path, orders):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["cart_value", "delivery_distance", "number_of_items", "time", "note"])
+        writer.writerows(orders)
+
+
+def expected_fee(row):
+    order = Order(cart_value=row[0], delivery_distance=row[1], number_of_items=row[2], time=row[3])
+    return str(order.calculate_delivery_fee())
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_reprice_csv(tmp_path, workers):
+    write_orders(tmp_path / "orders.csv", ORDERS * 5)
+
+    rows, invalid = reprice(str(tmp_path / "orders.csv"), str(tmp_path / "repriced.csv"), workers=workers, chunk_size=4)
+    assert rows == 30
+    assert invalid == 15
+
+    with open(tmp_path / "repriced.csv", newline="") as file:
+        output = list(csv.reader(file))
+
+    assert output[0] == ["cart_value", "delivery_distance", "number_of_items", "time", "note", "delivery_fee", "error"]
+    assert len(output) == 31
+    for row in output[1::6]:
+        assert row[:5] == ORDERS[0]
+        assert row[5:] == [expected_fee(ORDERS[0]), ""]
+    for row in output[2::6]:
+        assert row[5:] == ["0", ""]
+    for row in output[3::6]:
+        assert row[5:] == [expected_fee(ORDERS[2]), ""]
+    for row in output[4::6]:
+        assert row[5:] == ["", "cart_value: Input should be greater than 0"]
+    for row in output[5::6]:
+        assert row[5] == ""
+        assert row[6].startswith("time: Input should be a valid datetime")
+    for row in output[6::6]:
+        assert row[3:] == ["", "Row should have 5 columns, has 3"]
+
+
+def test_reprice_cli(tmp_path, capsys):
+    write_orders(tmp_path / "orders.csv", ORDERS[:1])
+
+    assert main([str(tmp_path / "orders.csv"), str(tmp_path / "repriced.csv"), "--workers", "1"]) == 0
+    assert "Repriced 1 rows (0 invalid)" in capsys.readouterr().err
+
+    with open(tmp_path / "invalid.csv", "w") as file:
+        file.write("cart_value,time\n")
+
+    assert main([str(tmp_path / "invalid.csv"), str(tmp_path / "repriced.csv")]) == 1
+    assert "missing columns: delivery_distance, number_of_items" in capsys.readouterr().err
+
+    (tmp_path / "empty.csv").write_text("")
+    assert main([str(tmp_path / "empty.csv"), str(tmp_path / "repriced.csv"), "--workers", "1"]) == 1
+    assert "empty.csv is empty" in capsys.readouterr().err
+
+
+def test_reprice_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    times = [datetime(2024, 1, 15, 13, tzinfo=timezone.utc), datetime(2024, 1, 19, constants.RUSH_DELIVERY_START, tzinfo=timezone.utc)]
+    pq.write_table(
+        pa.table({
+            "cart_value": [790, 0],
+            "delivery_distance": [2235, 2235],
+            "number_of_items": [4, 14],
+            "time": times,
+        }),
+        tmp_path / "orders.parquet",
+    )
+
+    rows, invalid = reprice(str(tmp_path / "orders.parquet"), str(tmp_path / "repriced.parquet"), workers=2, chunk_size=1)
+    assert (rows, invalid) == (2, 1)
+
+    output = pq.read_table(tmp_path / "repriced.parquet").to_pydict()
+    assert output["delivery_fee"] == [710, None]
+    assert output["error"] == [None, "cart_value: Input should be greater than 0"]
+    assert output["time"] == times
+
+
+def test_reprice_with_history(tmp_path, capsys):
+    (tmp_path / "history.json").write_text(
+        '[{"effective_from": "2024-01-01T00:00:00Z"}, {"effective_from": "2024-02-01T00:00:00Z", "base_delivery_fee": 250}]'
+    )
+    write_orders(tmp_path / "orders.csv", [
+        ["790", "2235", "4", "2024-01-31T23:59:59Z", "january"],
+        ["790", "2235", "4", "2024-02-01T01:00:00+01:00", "february"],
+        ["790", "2235", "4", "2023-12-31T12:00:00Z", "before history"],
+    ])
+
+    assert main([str(tmp_path / "orders.csv"), str(tmp_path / "audited.csv"), "--history", str(tmp_path / "history.json"), "--workers", "1"]) == 0
+    assert "Repriced 3 rows (1 invalid)" in capsys.readouterr().err
+
+    with open(tmp_path / "audited.csv", newline="") as file:
+        output = list(csv.reader(file))
+
+    assert output[1][5:] == ["710", ""]
+    assert output[2][5:] == ["760", ""]
+    assert output[3][5] == ""
+    assert output[3][6].startswith("time: No fee schedule in force at 2023-12-31T12:00:00+00:00")
+
+
+def test_price_order_rejects_non_ascii_digits():
+    fee, error = price_order(FeeSchedule.from_constants(), "790", "2235", "4", "٢٠٢٤-01-15T13:00:00Z")
+    assert fee is None
+    assert error.startswith("time: ")
@@ -0,0 +1,139 @@
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+from hypothesis import given, strategies as st
+from pydantic import ValidationError
+
+from app import constants
+from app.config import FeeConfig
+from app.rush import RushCalendar, RushWindow
+from app.tables import FeeTables
+
+calendar = RushCalendar.single_window(
+    constants.RUSH_DELIVERY_DAY, constants.RUSH_DELIVERY_START, constants.RUSH_DELIVERY_END, constants.RUSH_MULTIPLIER_BPS,
+)
+rush_day = datetime(2024, 1, 15) + timedelta(days=constants.RUSH_DELIVERY_DAY)
+
+
+def single_window_multiplier(order_time: datetime) -> int:
+    """
+    Rush hour check of the single rush window constants, as calculated before the rush calendar.
+    """
+    if order_time.weekday() == constants.RUSH_DELIVERY_DAY and \
+            time(constants.RUSH_DELIVERY_START, 0) <= order_time.time() <= time(constants.RUSH_DELIVERY_END, 0):
+        return constants.RUSH_MULTIPLIER_BPS
+
+    return 0
+
+
+@given(
+    order_time=st.datetimes(min_value=datetime(2000, 1, 1), max_value=datetime(2100, 1, 1)),
+    offset_hours=st.none() | st.integers(min_value=-12, max_value=14),
+)
+def test_single_window_matches_rush_hour_constants(order_time, offset_hours):
+    if offset_hours is not None:
+        order_time = order_time.replace(tzinfo=timezone(timedelta(hours=offset_hours)))
+
+    assert calendar.multiplier_bps(order_time) == single_window_multiplier(order_time)
+
+
+def test_single_window_boundaries():
+    start = rush_day + timedelta(hours=constants.RUSH_DELIVERY_START)
+    end = rush_day + timedelta(hours=constants.RUSH_DELIVERY_END)
+
+    for order_time in (start - timedelta(microseconds=1), start, end, end + timedelta(microseconds=1)):
+        assert calendar.multiplier_bps(order_time) == single_window_multiplier(order_time)
+    assert calendar.multiplier_bps(start) == constants.RUSH_MULTIPLIER_BPS
+    assert calendar.multiplier_bps(end + timedelta(microseconds=1)) == 0
+
+
+def test_multiple_windows():
+    calendar = RushCalendar([
+        RushWindow(weekday=0, start=time(7), end=time(9), multiplier_bps=11_000),
+        RushWindow(weekday=0, start=time(9, 0, 0, 1), end=time(10), multiplier_bps=13_000),
+        RushWindow(weekday=0, start=time(17), end=time(19, 30), multiplier_bps=15_000),
+        RushWindow(weekday=6, start=time(22), end=time(2), multiplier_bps=12_500),
+        RushWindow(weekday=3, start=time(0), end=time.max, multiplier_bps=10_500),
+    ])
+    monday = datetime(2024, 1, 15)
+
+    assert calendar.multiplier_bps(monday + timedelta(hours=6, minutes=59)) == 0
+    assert calendar.multiplier_bps(monday + timedelta(hours=9)) == 11_000
+    assert calendar.multiplier_bps(monday + timedelta(hours=9, microseconds=1)) == 13_000
+    assert calendar.multiplier_bps(monday + timedelta(hours=19, minutes=30)) == 15_000
+    assert calendar.multiplier_bps(monday + timedelta(hours=19, minutes=31)) == 0
+    # Sunday night window continues on Monday morning.
+    assert calendar.multiplier_bps(monday + timedelta(days=6, hours=23)) == 12_500
+    assert calendar.multiplier_bps(monday + timedelta(hours=1)) == 12_500
+    assert calendar.multiplier_bps(monday + timedelta(hours=2, seconds=1)) == 0
+    # Whole day windows.
+    assert calendar.multiplier_bps(monday + timedelta(days=3)) == 10_500
+    assert calendar.multiplier_bps(monday + timedelta(days=4) - timedelta(microseconds=1)) == 10_500
+    assert calendar.multiplier_bps(monday + timedelta(days=4)) == 0
+    assert calendar.min_multiplier_bps == 10_500
+
+
+def test_timezone_windows():
+    calendar = RushCalendar([
+        RushWindow(weekday=4, start=time(15), end=time(19), multiplier_bps=12_000, timezone="Europe/Helsinki"),
+        RushWindow(weekday=4, start=time(15), end=time(16), multiplier_bps=15_000, timezone="America/New_York"),
+    ])
+
+    # Helsinki is UTC+2 in winter and UTC+3 in summer.
+    assert calendar.multiplier_bps(datetime(2024, 1, 19, 13, 30, tzinfo=timezone.utc)) == 12_000
+    assert calendar.multiplier_bps(datetime(2024, 1, 19, 12, 59, tzinfo=timezone.utc)) == 0
+    assert calendar.multiplier_bps(datetime(2024, 6, 14, 12, 30, tzinfo=timezone.utc)) == 12_000
+    assert calendar.multiplier_bps(datetime(2024, 6, 14, 16, 30, tzinfo=timezone.utc)) == 0
+    # Order times without timezone information are taken as UTC.
+    assert calendar.multiplier_bps(datetime(2024, 1, 19, 13, 30)) == 12_000
+    # Order times with another offset are converted.
+    assert calendar.multiplier_bps(datetime(2024, 1, 19, 14, 30, tzinfo=timezone(timedelta(hours=1)))) == 12_000
+    # New York 15:30 is 20:30 UTC, 22:30 in Helsinki.
+    assert calendar.multiplier_bps(datetime(2024, 1, 19, 20, 30, tzinfo=timezone.utc)) == 15_000
+    assert calendar.wall_clock_days is None
+
+
+def test_invalid_windows():
+    with pytest.raises(ValueError):
+        RushCalendar([
+            RushWindow(weekday=0, start=time(7), end=time(9), multiplier_bps=11_000),
+            RushWindow(weekday=0, start=time(9), end=time(10), multiplier_bps=11_000),
+        ])
+    with pytest.raises(ValueError):
+        RushCalendar([
+            RushWindow(weekday=6, start=time(22), end=time(2), multiplier_bps=11_000),
+            RushWindow(weekday=0, start=time(1), end=time(3), multiplier_bps=11_000),
+        ])
+    with pytest.raises(ValidationError):
+        RushWindow(weekday=0, start=time(7), end=time(9), multiplier_bps=11_000, timezone="Europe/Nowhere")
+    for start, end in (("15:00+02:00", "19:00"), ("15:00", "19:00Z")):
+        with pytest.raises(ValidationError, match="UTC offset"):
+            FeeConfig(rush_windows=[{"weekday": 4, "start": start, "end": end, "multiplier_bps": 12_000}])
+    with pytest.raises(ValidationError):
+        FeeConfig(rush_windows=[
+            {"weekday": 0, "start": "07:00", "end": "09:00", "multiplier_bps": 11_000},
+            {"weekday": 0, "start": "08:00", "end": "10:00", "multiplier_bps": 11_000},
+        ])
+
+
+def test_schedule_with_rush_windows():
+    config = FeeConfig(rush_windows=[
+        {"weekday": 0, "start": "07:00", "end": "09:00", "multiplier_bps": 15_000},
+        {"weekday": 4, "start": "15:00", "end": "19:00", "multiplier_bps": 5_000, "timezone": "Europe/Helsinki"},
+    ])
+    schedule = config.schedule()
+    tables = FeeTables(schedule)
+    values = (790, 2235, 4)
+
+    for order_time, fee in (
+        (datetime(2024, 1, 15, 8), 1065),
+        (datetime(2024, 1, 15, 10), 710),
+        (datetime(2024, 1, 19, 14, tzinfo=timezone.utc), 355),
+        (datetime(2024, 1, 19, 16, tzinfo=timezone.utc), 355),
+        (datetime(2024, 1, 19, 18, tzinfo=timezone.utc), 710),
+    ):
+        assert schedule.calculate(*values, order_time) == fee
+        assert tables.calculate(*values, order_time) == fee
+
+    assert FeeConfig.from_schedule(schedule) == config
+    assert FeeConfig.model_validate_json(config.model_dump_json()) == config
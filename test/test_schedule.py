@@ -0,0 +1,149 @@
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+
+from hypothesis import given, strategies as st
+
+from app import constants
+from app.config import FeeConfig
+from app.order import Order
+from app.tables import FeeTables
+from app.schedule import FeeSchedule
+
+not_rush_hour_date = datetime(2024, 1, 20, 12)
+rush_hour_date = datetime(2024, 1, 19, constants.RUSH_DELIVERY_START)
+fee_schedule = FeeSchedule.from_constants()
+
+
+def test_schedule_from_constants():
+    schedule = FeeSchedule.from_constants()
+
+    assert schedule.base_delivery_fee == constants.BASE_DELIVERY_FEE
+    assert schedule.max_fee == constants.MAX_FEE
+    assert schedule.rush_start.hour == constants.RUSH_DELIVERY_START
+    assert schedule.rush_end.hour == constants.RUSH_DELIVERY_END
+    assert not hasattr(schedule, "__dict__")
+
+
+def test_calculate_matches_order():
+    for cart_value in (1, constants.SMALL_ORDER_THRESHOLD - 1, constants.SMALL_ORDER_THRESHOLD, constants.FREE_DELIVERY_THRESHOLD):
+        for delivery_distance in (1, constants.BASE_DELIVERY_FEE_DISTANCE, constants.BASE_DELIVERY_FEE_DISTANCE + 1, 100_000):
+            for number_of_items in (1, constants.ADDITIONAL_ITEM_LIMIT, constants.BULK_FEE_THRESHOLD + 1, 1_000):
+                for order_time in (not_rush_hour_date, rush_hour_date):
+                    order = Order(
+                        cart_value=cart_value,
+                        delivery_distance=delivery_distance,
+                        number_of_items=number_of_items,
+                        time=order_time,
+                    )
+
+                    assert fee_schedule.calculate(cart_value, delivery_distance, number_of_items, order_time) == \
+                        order.calculate_delivery_fee()
+
+
+def test_custom_schedule():
+    schedule = FeeSchedule(
+        base_delivery_fee=100,
+        base_delivery_fee_distance=500,
+        additional_fee=50,
+        additional_fee_distance=100,
+        additional_item_limit=3,
+        additional_item_surcharge=10,
+        max_fee=1_000,
+        rush_multiplier_bps=20_000,
+        rush_delivery_day=0,
+        rush_delivery_start=8,
+        rush_delivery_end=10,
+        free_delivery_threshold=5_000,
+        small_order_threshold=500,
+        bulk_fee_threshold=5,
+        bulk_fee=70,
+    )
+
+    assert schedule.calculate_distance_fee(500) == 100
+    assert schedule.calculate_distance_fee(501) == 150
+    assert schedule.calculate_item_count_surcharge_fee(3) == 10
+    assert schedule.calculate_bulk_fee(6) == 70
+    assert schedule.calculate_small_order_surcharge_fee(400) == 100
+    # Monday rush hour: (100 + 2 * 10 + 100) * 2
+    assert schedule.calculate(400, 500, 4, datetime(2024, 1, 15, 9)) == 440
+    assert schedule.calculate(5_000, 500, 4, datetime(2024, 1, 15, 9)) == 0
+    assert schedule.calculate(1, 100_000, 1, datetime(2024, 1, 15, 9)) == 1_000
+
+
+def test_rush_multiplier_rounds_half_up():
+    schedule = FeeConfig(rush_multiplier_bps=11_000).schedule()
+
+    assert schedule.apply_rush_multiplier(4, 11_000) == 4  # 4.4
+    assert schedule.apply_rush_multiplier(5, 11_000) == 6  # 5.5
+    assert schedule.apply_rush_multiplier(6, 11_000) == 7  # 6.6
+    assert schedule.calculate_rush_hour_fees(5, rush_hour_date) == 6
+    assert schedule.calculate_rush_hour_fees(5, not_rush_hour_date) == 5
+
+
+@given(
+    cart_value=st.integers(min_value=1, max_value=constants.FREE_DELIVERY_THRESHOLD - 1),
+    delivery_distance=st.integers(min_value=1, max_value=20_000),
+    number_of_items=st.integers(min_value=1, max_value=50),
+    rush_multiplier_bps=st.integers(min_value=constants.MIN_CONFIG_RUSH_MULTIPLIER_BPS, max_value=constants.MAX_CONFIG_RUSH_MULTIPLIER_BPS),
+)
+def test_rush_hour_fee_is_exact_integer(cart_value, delivery_distance, number_of_items, rush_multiplier_bps):
+    schedule = FeeConfig(rush_multiplier_bps=rush_multiplier_bps).schedule()
+    tables = FeeTables(schedule)
+
+    fee = (
+        schedule.calculate_distance_fee(delivery_distance)
+        + schedule.calculate_item_count_surcharge_fee(number_of_items)
+        + schedule.calculate_small_order_surcharge_fee(cart_value)
+        + schedule.calculate_bulk_fee(number_of_items)
+    )
+    multiplier = Decimal(rush_multiplier_bps) / Decimal(constants.BASIS_POINTS)
+    expected = min(int((fee * multiplier).quantize(Decimal(1), rounding=ROUND_HALF_UP)), constants.MAX_FEE)
+
+    rush_hour_fee = schedule.calculate(cart_value, delivery_distance, number_of_items, rush_hour_date)
+    assert rush_hour_fee == expected
+    assert type(rush_hour_fee) is int
+    assert tables.calculate(cart_value, delivery_distance, number_of_items, rush_hour_date) == expected
+
+
+@given(
+    cart_value=st.integers(min_value=1, max_value=constants.FREE_DELIVERY_THRESHOLD + 1),
+    delivery_distance=st.integers(min_value=1, max_value=20_000),
+    number_of_items=st.integers(min_value=1, max_value=50),
+    order_time=st.sampled_from((not_rush_hour_date, rush_hour_date)),
+)
+def test_breakdown_matches_calculate(cart_value, delivery_distance, number_of_items, order_time):
+    breakdown = fee_schedule.breakdown(cart_value, delivery_distance, number_of_items, order_time)
+
+    assert breakdown.delivery_fee == fee_schedule.calculate(cart_value, delivery_distance, number_of_items, order_time)
+    assert breakdown.free_delivery == fee_schedule.free_delivery(cart_value)
+    if breakdown.free_delivery:
+        assert breakdown.to_dict() == dict.fromkeys(breakdown.to_dict(), 0) | {"free_delivery": True, "max_fee_applied": False}
+        return
+
+    assert breakdown.distance_fee == fee_schedule.calculate_distance_fee(delivery_distance)
+    assert breakdown.item_surcharge == fee_schedule.calculate_item_count_surcharge_fee(number_of_items)
+    assert breakdown.small_order_surcharge == fee_schedule.calculate_small_order_surcharge_fee(cart_value)
+    assert breakdown.bulk_fee == fee_schedule.calculate_bulk_fee(number_of_items)
+    assert breakdown.rush_multiplier_bps == (constants.RUSH_MULTIPLIER_BPS if order_time == rush_hour_date else 0)
+    assert breakdown.max_fee_applied == (breakdown.max_fee_reduction > 0)
+    assert breakdown.distance_fee + breakdown.item_surcharge + breakdown.small_order_surcharge + breakdown.bulk_fee \
+        + breakdown.rush_fee - breakdown.max_fee_reduction == breakdown.delivery_fee
+
+
+def test_breakdown():
+    breakdown = fee_schedule.breakdown(790, 2235, 14, rush_hour_date)
+
+    assert breakdown == Order(cart_value=790, delivery_distance=2235, number_of_items=14, time=rush_hour_date).calculate_fee_breakdown()
+    assert breakdown.to_dict() == {
+        "free_delivery": False,
+        "distance_fee": 500,
+        "item_surcharge": 500,
+        "small_order_surcharge": 210,
+        "bulk_fee": constants.BULK_FEE,
+        "rush_multiplier_bps": constants.RUSH_MULTIPLIER_BPS,
+        "rush_fee": 266,
+        "max_fee_applied": True,
+        "max_fee_reduction": 96,
+    }
+    assert breakdown.delivery_fee == constants.MAX_FEE
+    assert not hasattr(breakdown, "__dict__")
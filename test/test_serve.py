@@ -0,0 +1,111 @@
+import json
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app import constants, serve
+
+order = {
+    "cart_value": 790,
+    "delivery_distance": 2235,
+    "number_of_items": 4,
+    "time": "2024-01-15T13:00:00Z",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_worker_config():
+    args = serve.parse_args(["--max-requests", "1000", "--max-requests-jitter", "100", "--graceful-timeout", "5"])
+    config = serve.worker_config(args)
+
+    assert 1_000 <= config.limit_max_requests <= 1_100
+    assert config.timeout_graceful_shutdown == 5
+    assert config.loop == serve.event_loop()
+    assert config.http == serve.http_protocol()
+    assert serve.worker_config(serve.parse_args([])).limit_max_requests is None
+
+    args = serve.parse_args(["--keep-alive-timeout", "75", "--limit-concurrency", "500"])
+    config = serve.worker_config(args)
+    assert (config.timeout_keep_alive, config.limit_concurrency) == (75, 500)
+    config = serve.worker_config(serve.parse_args([]))
+    assert (config.timeout_keep_alive, config.limit_concurrency) == (serve.DEFAULT_KEEP_ALIVE_TIMEOUT, None)
+
+
+def test_reuse_port_sockets_share_address():
+    first = serve.bind_socket("127.0.0.1", 0, reuse_port=True)
+    second = serve.bind_socket("127.0.0.1", first.getsockname()[1], reuse_port=True)
+    assert first.getsockname() == second.getsockname()
+    first.close()
+    second.close()
+
+
+def wait_until_ready(port: int):
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}{constants.HEALTH_ENDPOINT}")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+
+def test_pipelined_requests_and_keep_alive_timeout():
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--port", str(port), "--workers", "1", "--keep-alive-timeout", "1", "--log-level", "warning"],
+    )
+    try:
+        wait_until_ready(port)
+        body = json.dumps(order).encode()
+        request = (
+            f"POST {constants.CALCULATE_ENDPOINT} HTTP/1.1\r\nHost: test\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+        ).encode() + body
+
+        with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+            # Three pipelined requests in one write are answered in order on the same connection.
+            sock.sendall(request * 3)
+            received = b""
+            while received.count(b'{"delivery_fee":710}') < 3:
+                received += sock.recv(65536)
+            assert received.count(b"HTTP/1.1 200 OK") == 3
+
+            # The idle connection is closed after the keep-alive timeout.
+            start = time.monotonic()
+            assert sock.recv(65536) == b""
+            assert time.monotonic() - start < 5
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
+
+
+def test_workers_are_recycled_and_shut_down_gracefully():
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "app.serve", "--port", str(port), "--workers", "2", "--max-requests", "3", "--log-level", "warning"],
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            for _ in range(100):
+                try:
+                    client.get(constants.HEALTH_ENDPOINT)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+
+            # Requests keep succeeding while the workers restart after every few requests, also the ones on
+            # connections that a stopping worker accepted just before it stopped accepting.
+            for _ in range(20):
+                response = client.post(constants.CALCULATE_ENDPOINT, json=order, headers={"Connection": "close"})
+                assert response.json() == {"delivery_fee": 710}
+    finally:
+        server.send_signal(signal.SIGTERM)
+        assert server.wait(timeout=30) == 0
@@ -0,0 +1,130 @@
+import multiprocessing
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import constants
+from app.config import FeeConfig
+from app.schedule import FeeSchedule
+from app.shared_cache import SharedQuoteCache, schedule_fingerprint
+
+not_rush_hour_date = datetime(2024, 1, 20, 12)
+rush_hour_date = datetime(2024, 1, 19, constants.RUSH_DELIVERY_START)
+fee_schedule = FeeSchedule.from_constants()
+
+
+def test_shared_cache_hits_and_misses(tmp_path):
+    cache = SharedQuoteCache(str(tmp_path / "quotes"), slots=16, ttl=60)
+    values = (790, 2235, 4, not_rush_hour_date)
+
+    assert cache.calculate(fee_schedule, *values) == fee_schedule.calculate(*values)
+    assert cache.calculate(fee_schedule, *values) == fee_schedule.calculate(*values)
+    assert cache.info() == {"hits": 1, "misses": 1, "maxsize": 16, "currsize": 1}
+
+    # Orders with the same normalized values share the cache entry.
+    assert cache.calculate(fee_schedule, 790, 2236, 4, datetime(2024, 1, 21, 9)) == fee_schedule.calculate(*values)
+    assert cache.hits == 2
+
+    # Rush hour and bulk fee orders are different entries.
+    assert cache.calculate(fee_schedule, 790, 2235, 4, rush_hour_date) == fee_schedule.calculate(790, 2235, 4, rush_hour_date)
+    assert cache.calculate(fee_schedule, 790, 2235, 20, rush_hour_date) == fee_schedule.calculate(790, 2235, 20, rush_hour_date)
+    assert cache.misses == 3
+
+    # Free delivery and values too large for the table are not cached.
+    assert cache.calculate(fee_schedule, constants.FREE_DELIVERY_THRESHOLD, 2235, 4, not_rush_hour_date) == 0
+    assert cache.calculate(fee_schedule, 790, 2 ** 80, 4, not_rush_hour_date) == constants.MAX_FEE
+    assert len(cache) == 3
+
+    # Another process opening the file sees the same quotes.
+    other = SharedQuoteCache(str(tmp_path / "quotes"), slots=16, ttl=60)
+    assert other.calculate(fee_schedule, *values) == fee_schedule.calculate(*values)
+    assert other.info() == {"hits": 1, "misses": 0, "maxsize": 16, "currsize": 3}
+
+    cache.clear()
+    assert cache.info() == {"hits": 0, "misses": 0, "maxsize": 16, "currsize": 0}
+    assert len(other) == 0
+
+
+def test_shared_cache_eviction_and_expiry(tmp_path):
+    # A single bucket, so that every quote competes for the same slots.
+    cache = SharedQuoteCache(str(tmp_path / "quotes"), slots=4, ttl=60)
+
+    for distance in range(1_000, 6_000, 1_000):
+        cache.calculate(fee_schedule, 790, distance, 1, not_rush_hour_date)
+    assert len(cache) == 4
+
+    # Oldest quote (1000 m) was evicted.
+    cache.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    assert cache.hits == 0
+    cache.calculate(fee_schedule, 790, 5_000, 1, not_rush_hour_date)
+    assert cache.hits == 1
+
+    expiring = SharedQuoteCache(str(tmp_path / "expiring"), slots=4, ttl=-1)
+    expiring.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    expiring.calculate(fee_schedule, 790, 1_000, 1, not_rush_hour_date)
+    assert expiring.info() == {"hits": 0, "misses": 2, "maxsize": 4, "currsize": 0}
+
+
+def test_shared_cache_fee_schedule_change(tmp_path):
+    cache = SharedQuoteCache(str(tmp_path / "quotes"), slots=16, ttl=60)
+    values = (790, 2235, 4, not_rush_hour_date)
+    changed = FeeConfig(base_delivery_fee=300).schedule()
+
+    assert cache.calculate(fee_schedule, *values) == 710
+    # A new schedule with the same rules shares the quotes, changed rules do not.
+    assert cache.calculate(FeeSchedule.from_constants(), *values) == 710
+    assert cache.hits == 1
+    assert cache.calculate(changed, *values) == 810
+    assert cache.calculate(fee_schedule, *values) == 710
+    assert cache.info()["currsize"] == 2
+
+    assert schedule_fingerprint(fee_schedule) == schedule_fingerprint(FeeSchedule.from_constants())
+    assert schedule_fingerprint(fee_schedule) != schedule_fingerprint(changed)
+    assert schedule_fingerprint(fee_schedule) != schedule_fingerprint(FeeConfig(rush_multiplier_bps=15_000).schedule())
+
+
+def test_shared_cache_file_layout(tmp_path):
+    SharedQuoteCache(str(tmp_path / "quotes"), slots=16)
+
+    with pytest.raises(ValueError):
+        SharedQuoteCache(str(tmp_path / "quotes"), slots=32)
+    with pytest.raises(ValueError):
+        SharedQuoteCache(str(tmp_path / "other"), slots=12)
+
+
+def price_orders(path: str, seed: int, rush_multiplier_bps: int) -> tuple:
+    """
+    Prices random orders through the shared cache in a separate process.
+
+    :return: Number of fees that differ from the fee schedule, and the number of cache hits
+    """
+    schedule = FeeConfig(rush_multiplier_bps=rush_multiplier_bps).schedule()
+    cache = SharedQuoteCache(path, slots=64, ttl=60)
+    rng = random.Random(seed)
+    mismatches = 0
+
+    for _ in range(5_000):
+        values = (
+            rng.randint(1, 1_200),
+            rng.randint(1, 4_000),
+            rng.randint(1, 16),
+            rush_hour_date + timedelta(hours=rng.choice((0, 5))),
+        )
+        if cache.calculate(schedule, *values) != schedule.calculate(*values):
+            mismatches += 1
+
+    return mismatches, cache.hits
+
+
+def test_shared_cache_concurrent_processes(tmp_path):
+    path = str(tmp_path / "quotes")
+    SharedQuoteCache(path, slots=64)
+    # Processes with two different fee schedules write to the same small table at the same time.
+    arguments = [(path, seed, 12_000 if seed % 2 else 15_000) for seed in range(4)]
+
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        results = pool.starmap(price_orders, arguments)
+
+    assert [mismatches for mismatches, _ in results] == [0, 0, 0, 0]
+    assert all(hits > 0 for _, hits in results)
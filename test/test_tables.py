@@ -0,0 +1,97 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import constants, schedule as schedule_module, tables as tables_module
+from app.config import FeeConfig
+from app.main import app
+from app.order import Order
+from app.schedule import FeeSchedule, get_fee_schedule, set_fee_schedule
+from app.tables import FeeTables, build_tables, price, tables_for
+
+not_rush_hour_date = datetime(2024, 1, 20, 12)
+rush_hour_date = datetime(2024, 1, 19, constants.RUSH_DELIVERY_START)
+fee_schedule = FeeSchedule.from_constants()
+
+
+def assert_same_fee(tables: FeeTables, schedule: FeeSchedule, *values):
+    fee = tables.calculate(*values)
+    expected = schedule.calculate(*values)
+    assert fee == expected
+    assert type(fee) is type(expected)
+
+
+def test_tables_match_delivery_fee_on_full_grid():
+    tables = FeeTables(fee_schedule)
+
+    # Every distance and item count up to past the saturation points.
+    for order_time in (not_rush_hour_date, rush_hour_date):
+        for delivery_distance in range(1, tables.max_distance + 100):
+            for number_of_items in range(1, tables.max_items + 5):
+                assert_same_fee(tables, fee_schedule, constants.SMALL_ORDER_THRESHOLD, delivery_distance, number_of_items, order_time)
+
+        # Every cart value up to past the free delivery threshold.
+        for cart_value in range(1, constants.FREE_DELIVERY_THRESHOLD + 100):
+            assert_same_fee(tables, fee_schedule, cart_value, constants.BASE_DELIVERY_FEE_DISTANCE, 1, order_time)
+
+    # Inputs far past the saturation points are clamped.
+    assert_same_fee(tables, fee_schedule, 1, 10 ** 30, 10 ** 30, rush_hour_date)
+
+    order = Order(cart_value=790, delivery_distance=2235, number_of_items=4, time=not_rush_hour_date)
+    assert tables.calculate(790, 2235, 4, not_rush_hour_date) == order.calculate_delivery_fee() == 710
+
+
+def test_tables_with_rush_multiplier_below_one():
+    schedule = FeeConfig(rush_multiplier_bps=5_000).schedule()
+    tables = FeeTables(schedule)
+
+    for delivery_distance in range(1, tables.max_distance + 100, 7):
+        for number_of_items in range(1, tables.max_items + 5):
+            assert_same_fee(tables, schedule, 1, delivery_distance, number_of_items, rush_hour_date)
+
+
+def test_tables_size():
+    tables = FeeTables(fee_schedule)
+
+    assert fee_schedule.calculate_distance_fee(tables.max_distance) >= constants.MAX_FEE
+    assert fee_schedule.calculate_distance_fee(tables.max_distance - 1) < constants.MAX_FEE
+    assert tables.nbytes == 8 * (tables.max_distance + tables.max_items + constants.SMALL_ORDER_THRESHOLD + 3)
+
+
+def test_tables_too_large():
+    schedule = FeeConfig(additional_fee=1, additional_fee_distance=1_000_000).schedule()
+    with pytest.raises(ValueError, match="entries"):
+        FeeTables(schedule)
+
+    # Schedules built without a configuration can have fee steps of 0, the tables would never end.
+    values = FeeConfig.from_schedule(fee_schedule).model_dump(exclude={"rush_windows"})
+    with pytest.raises(ValueError, match="positive"):
+        FeeTables(FeeSchedule(**{**values, "additional_item_surcharge": 0}))
+
+
+def test_tables_are_built_when_schedule_is_activated(monkeypatch):
+    monkeypatch.setattr(schedule_module, "_schedule_listeners", [build_tables])
+    monkeypatch.setattr(tables_module, "FEE_LOOKUP_TABLES", True)
+    client = TestClient(app)
+    order = {"cart_value": 790, "delivery_distance": 2235, "number_of_items": 4, "time": "2024-01-15T13:00:00Z"}
+    previous = get_fee_schedule()
+
+    try:
+        schedule = FeeConfig(base_delivery_fee=250).schedule()
+        set_fee_schedule(schedule)
+        assert tables_for(schedule).schedule is schedule
+        # Calculations with a schedule that is no longer active do not build tables.
+        assert tables_for(previous) is None
+        assert client.post(constants.CALCULATE_ENDPOINT, json=order).json() == {"delivery_fee": 760}
+        assert price(schedule, 790, 2235, 4, datetime(2024, 1, 15, 13)) == 760
+        assert price(previous, 790, 2235, 4, datetime(2024, 1, 15, 13)) == previous.calculate(790, 2235, 4, datetime(2024, 1, 15, 13))
+
+        # Schedules with too large tables are calculated without them.
+        schedule = FeeConfig(additional_fee=1, additional_fee_distance=1_000_000).schedule()
+        set_fee_schedule(schedule)
+        assert tables_for(schedule) is None
+        response = client.post(constants.CALCULATE_ENDPOINT, json={**order, "delivery_distance": 10 ** 12})
+        assert response.json() == {"delivery_fee": schedule.calculate(790, 10 ** 12, 4, datetime(2024, 1, 15, 13))}
+    finally:
+        set_fee_schedule(previous)
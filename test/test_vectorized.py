@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from hypothesis import given, settings, strategies as st
+
+from app import constants
+from app.config import FeeConfig
+from app.order import Order
+from app.schedule import FeeSchedule, get_fee_schedule, set_fee_schedule
+from app.vectorized import calculate_delivery_fees, calculate_fee_matrix, to_datetime64
+
+positive_ints = st.one_of(
+    st.integers(min_value=1, max_value=3 * constants.FREE_DELIVERY_THRESHOLD),
+    st.integers(min_value=1, max_value=2 ** 62),
+)
+
+timezones = st.one_of(
+    st.none(),
+    st.integers(min_value=-14 * 60, max_value=14 * 60).map(lambda minutes: timezone(timedelta(minutes=minutes))),
+)
+
+# Rush hour boundaries are sampled explicitly, as random datetimes rarely hit them exactly.
+rush_hour_times = st.builds(
+    lambda day, hour, delta: datetime(2024, 1, day, hour) + timedelta(microseconds=delta),
+    st.integers(min_value=15, max_value=21),
+    st.sampled_from([constants.RUSH_DELIVERY_START, constants.RUSH_DELIVERY_END]),
+    st.sampled_from([-1, 0, 1]),
+)
+
+times = st.builds(
+    lambda t, tz: t.replace(tzinfo=tz),
+    st.one_of(st.datetimes(min_value=datetime(1970, 1, 1), max_value=datetime(2100, 1, 1)), rush_hour_times),
+    timezones,
+)
+
+orders = st.builds(
+    Order,
+    cart_value=positive_ints,
+    delivery_distance=positive_ints,
+    number_of_items=positive_ints,
+    time=times,
+)
+
+
+@settings(max_examples=200)
+@given(st.lists(orders, min_size=1, max_size=50))
+def test_vectorized_fees_equal_order_fees(order_list):
+    fees = calculate_delivery_fees(
+        [order.cart_value for order in order_list],
+        [order.delivery_distance for order in order_list],
+        [order.number_of_items for order in order_list],
+        [order.time for order in order_list],
+    )
+
+    for order, fee in zip(order_list, fees):
+        expected = order.calculate_delivery_fee()
+        assert fee == expected
+        assert np.float64(fee).tobytes() == np.float64(expected).tobytes()
+
+
+def test_vectorized_fees_with_datetime64():
+    # Assignment example, free delivery, max fee and rush hour.
+    fees = calculate_delivery_fees(
+        np.array([790, constants.FREE_DELIVERY_THRESHOLD, constants.SMALL_ORDER_THRESHOLD, constants.SMALL_ORDER_THRESHOLD]),
+        np.array([2235, constants.BASE_DELIVERY_FEE_DISTANCE, 100_000, constants.BASE_DELIVERY_FEE_DISTANCE]),
+        np.array([4, 1, 1, 1]),
+        to_datetime64([
+            datetime(2024, 1, 15, 13),
+            datetime(2024, 1, 15, 13),
+            datetime(2024, 1, 15, 13),
+            datetime(2024, 1, 19, constants.RUSH_DELIVERY_START, tzinfo=timezone.utc),
+        ]),
+    )
+
+    assert fees.tolist() == [
+        710,
+        0,
+        constants.MAX_FEE,
+        constants.BASE_DELIVERY_FEE * constants.RUSH_MULTIPLIER,
+    ]
+    assert fees.dtype == np.int64
+
+
+schedules = st.sampled_from([
+    FeeSchedule.from_constants(),
+    FeeConfig(rush_windows=[
+        {"weekday": 0, "start": "07:00", "end": "09:00", "multiplier_bps": 15_000},
+        {"weekday": 4, "start": "15:00", "end": "19:00", "multiplier_bps": 5_000, "timezone": "Europe/Helsinki"},
+    ]).schedule(),
+])
+
+carts = st.tuples(positive_ints, positive_ints, times)
+
+
+@settings(max_examples=200)
+@given(schedules, st.lists(carts, min_size=1, max_size=10), st.lists(positive_ints, min_size=1, max_size=20))
+def test_fee_matrix_equals_schedule_fees(schedule, cart_list, distances):
+    fees = calculate_fee_matrix(schedule, cart_list, distances)
+
+    assert fees.shape == (len(cart_list), len(distances))
+    assert fees.dtype == np.int64
+    for (cart_value, number_of_items, order_time), row in zip(cart_list, fees.tolist()):
+        assert row == [schedule.calculate(cart_value, distance, number_of_items, order_time) for distance in distances]
+
+
+def test_fee_matrix():
+    schedule = FeeSchedule.from_constants()
+    fees = calculate_fee_matrix(
+        schedule,
+        [
+            (790, 4, datetime(2024, 1, 15, 13)),
+            (790, 14, datetime(2024, 1, 19, constants.RUSH_DELIVERY_START)),
+            (constants.FREE_DELIVERY_THRESHOLD, 4, datetime(2024, 1, 15, 13)),
+        ],
+        [1, 2235, 2 ** 80],
+    )
+
+    assert fees.tolist() == [
+        [410, 710, constants.MAX_FEE],
+        [1236, constants.MAX_FEE, constants.MAX_FEE],
+        [0, 0, 0],
+    ]
+
+
+def test_vectorized_fees_use_active_schedule():
+    previous = get_fee_schedule()
+    try:
+        set_fee_schedule(FeeConfig(base_delivery_fee=250).schedule())
+        assert calculate_delivery_fees([790], [2235], [4], [datetime(2024, 1, 15, 13)]).tolist() == [760]
+    finally:
+        set_fee_schedule(previous)
@@ -0,0 +1,173 @@
+import math
+import random
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from hypothesis import given, settings, strategies as st
+
+from app import constants
+from app.geo import delivery_distance, haversine_distance
+from app.main import app
+from app.schedule import get_fee_schedule
+from app.venues import VenueIndex, haversine_distances, main, write_venue_file
+
+client = TestClient(app)
+
+DEGREE = constants.EARTH_RADIUS * math.pi / 180
+CART = {"cart_value": 790, "number_of_items": 4, "time": "2024-01-15T13:00:00Z"}
+ORDER_TIME = datetime(2024, 1, 15, 13, tzinfo=timezone.utc)
+
+
+def random_venues(seed: int = 0) -> list:
+    rng = random.Random(seed)
+    venues = [(f"world-{i}", rng.uniform(-90, 90), rng.uniform(-180, 180)) for i in range(2_000)]
+    # A city, venues around the antimeridian and around the poles.
+    venues += [(f"city-{i}", rng.uniform(60.0, 60.4), rng.uniform(24.6, 25.2)) for i in range(3_000)]
+    venues += [(f"date-line-{i}", rng.uniform(-1, 1), rng.choice((-1, 1)) * rng.uniform(179.5, 180)) for i in range(500)]
+    venues += [(f"pole-{i}", rng.choice((-1, 1)) * rng.uniform(89.8, 90), rng.uniform(-180, 180)) for i in range(500)]
+    return venues
+
+
+@pytest.fixture(scope="module")
+def venue_file(tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp("venues") / "venues.bin")
+    write_venue_file(path, random_venues())
+    return path
+
+
+def test_haversine_distance():
+    assert haversine_distance(60.17, 24.94, 60.17, 24.94) == 0
+    assert haversine_distance(0, 0, 1, 0) == pytest.approx(DEGREE)
+    assert haversine_distance(0, 179.5, 0, -179.5) == pytest.approx(DEGREE)
+    assert haversine_distance(90, 0, -90, 0) == pytest.approx(180 * DEGREE)
+    assert haversine_distance(60.1699, 24.9384, 59.4370, 24.7536) == pytest.approx(82_000, rel=0.01)
+
+    assert delivery_distance(0) == 1
+    assert delivery_distance(1_000) == 1_000
+    assert delivery_distance(1_000.001) == 1_001
+
+
+@settings(max_examples=50)
+@given(st.lists(st.tuples(st.floats(-90, 90), st.floats(-180, 180)), min_size=2, max_size=20))
+def test_vectorized_haversine_distances(locations):
+    (latitude, longitude), *others = locations
+    distances = haversine_distances(latitude, longitude, np.array([lat for lat, _ in others]), np.array([lon for _, lon in others]))
+
+    for (other_latitude, other_longitude), distance in zip(others, distances.tolist()):
+        assert distance == pytest.approx(haversine_distance(latitude, longitude, other_latitude, other_longitude), abs=1e-6)
+
+
+def test_venue_file(venue_file):
+    venues = random_venues()
+    index = VenueIndex(venue_file)
+    assert len(index) == len(venues)
+
+    for venue_id, latitude, longitude in venues[::100]:
+        venue = index.find(venue_id)
+        assert index.ids[venue].decode() == venue_id
+        assert (index.latitudes[venue], index.longitudes[venue]) == (latitude, longitude)
+    assert index.find("missing") is None
+    assert index.find("x" * 100) is None
+
+
+@pytest.mark.parametrize("latitude, longitude, radius", [
+    (60.2, 24.9, 2_000),
+    (60.2, 24.9, constants.MAX_NEARBY_RADIUS),
+    (0, 179.9, constants.MAX_NEARBY_RADIUS),
+    (0.5, -179.99, 20_000),
+    (89.9, 10, constants.MAX_NEARBY_RADIUS),
+    (-89.99, -170, 5_000),
+    (10, 10, 1),
+])
+def test_venues_within_radius(venue_file, latitude, longitude, radius):
+    index = VenueIndex(venue_file)
+    venues, distances = index.within(latitude, longitude, radius)
+
+    # Same venues as calculating the distance to every venue.
+    all_distances = index.distances(latitude, longitude, np.arange(len(index)))
+    assert sorted(venues.tolist()) == np.flatnonzero(all_distances <= radius).tolist()
+    assert distances.tolist() == all_distances[venues].tolist()
+    assert distances.tolist() == sorted(distances.tolist())
+
+
+def test_invalid_venue_files(tmp_path):
+    with pytest.raises(ValueError):
+        write_venue_file(str(tmp_path / "venues.bin"), [("a", 0, 0), ("a", 1, 1)])
+    with pytest.raises(ValueError):
+        write_venue_file(str(tmp_path / "venues.bin"), [("a", 91, 0)])
+
+    (tmp_path / "other.bin").write_bytes(b"x" * 100)
+    with pytest.raises(ValueError):
+        VenueIndex(str(tmp_path / "other.bin"))
+
+    write_venue_file(str(tmp_path / "empty.bin"), [])
+    empty = VenueIndex(str(tmp_path / "empty.bin"))
+    assert len(empty) == 0
+    assert [array.tolist() for array in empty.within(0, 0, 1_000)] == [[], []]
+
+
+def test_venue_file_from_csv(tmp_path, capsys):
+    (tmp_path / "venues.csv").write_text("id,latitude,longitude\nkamppi,60.1690,24.9327\nkallio,60.1841,24.9494\n")
+    assert main([str(tmp_path / "venues.csv"), str(tmp_path / "venues.bin")]) == 0
+    assert "2 venues" in capsys.readouterr().out
+
+    index = VenueIndex(str(tmp_path / "venues.bin"))
+    venues, _ = index.within(60.17, 24.93, 1_000)
+    assert [venue_id.decode() for venue_id in index.ids[venues].tolist()] == ["kamppi"]
+
+
+def test_location_endpoint(venue_file, monkeypatch):
+    customer = {"latitude": 60.17, "longitude": 24.94}
+    venue = {"latitude": 60.17 + 2_234.5 / DEGREE, "longitude": 24.94}
+
+    response = client.post(constants.LOCATION_CALCULATE_ENDPOINT, json={**CART, "customer_location": customer, "venue_location": venue})
+    assert response.status_code == 200
+    assert response.json() == {"delivery_fee": 710, "delivery_distance": 2235}
+
+    # Venue IDs need a venue file.
+    monkeypatch.setattr(constants, "VENUE_FILE_PATH", "")
+    response = client.post(constants.LOCATION_CALCULATE_ENDPOINT, json={**CART, "customer_location": customer, "venue_id": "city-1"})
+    assert response.status_code == 503
+
+    monkeypatch.setattr(constants, "VENUE_FILE_PATH", venue_file)
+    index = VenueIndex(venue_file)
+    position = index.find("city-1")
+    distance = delivery_distance(haversine_distance(60.17, 24.94, index.latitudes[position], index.longitudes[position]))
+    response = client.post(constants.LOCATION_CALCULATE_ENDPOINT, json={**CART, "customer_location": customer, "venue_id": "city-1"})
+    assert response.json() == {
+        "delivery_fee": get_fee_schedule().calculate(790, distance, 4, ORDER_TIME),
+        "delivery_distance": distance,
+    }
+
+    for body, error_type, loc in (
+        ({**CART, "customer_location": customer, "venue_id": "missing"}, "venue_not_found", ["body", "venue_id"]),
+        ({**CART, "customer_location": customer}, "value_error", ["body"]),
+        ({**CART, "customer_location": customer, "venue_location": venue, "venue_id": "city-1"}, "value_error", ["body"]),
+        ({**CART, "customer_location": {"latitude": 91, "longitude": 0}, "venue_id": "city-1"}, "less_than_equal", ["body", "customer_location", "latitude"]),
+    ):
+        response = client.post(constants.LOCATION_CALCULATE_ENDPOINT, json=body)
+        assert response.status_code == 422
+        assert (response.json()["detail"][0]["type"], response.json()["detail"][0]["loc"]) == (error_type, loc)
+
+
+def test_nearby_endpoint(venue_file, monkeypatch):
+    monkeypatch.setattr(constants, "VENUE_FILE_PATH", venue_file)
+    index = VenueIndex(venue_file)
+    body = {"cart": CART, "customer_location": {"latitude": 60.2, "longitude": 24.9}, "radius": 3_000}
+
+    response = client.post(constants.NEARBY_CALCULATE_ENDPOINT, json=body)
+    assert response.status_code == 200
+    result = response.json()
+    venues, distances = index.within(60.2, 24.9, 3_000)
+    assert len(result["venue_ids"]) == len(venues) > 0
+    assert result["venue_ids"] == [venue_id.decode() for venue_id in index.ids[venues].tolist()]
+    assert result["delivery_distances"] == distances.tolist()
+    assert result["delivery_fees"] == [get_fee_schedule().calculate(790, distance, 4, ORDER_TIME) for distance in distances.tolist()]
+
+    response = client.post(constants.NEARBY_CALCULATE_ENDPOINT, json={**body, "customer_location": {"latitude": 30, "longitude": 30}, "radius": 1})
+    assert response.json() == {"venue_ids": [], "delivery_distances": [], "delivery_fees": []}
+
+    response = client.post(constants.NEARBY_CALCULATE_ENDPOINT, json={**body, "radius": constants.MAX_NEARBY_RADIUS + 1})
+    assert response.status_code == 422